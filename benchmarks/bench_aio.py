@@ -0,0 +1,61 @@
+"""
+Event-loop latency while ``fhir_converter.aio`` converts a sustained stream of records, against converting
+directly on the event loop.
+
+    python -m benchmarks.bench_aio --records 2000 --workers 4
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.samples import make_inputs
+from fhir_converter.aio import AsyncConverter
+from fhir_converter.registry import get_converter
+
+TICK = 0.001
+
+
+async def measure_lag(stop, lags):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def run(mode, inputs, document_type, workers):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.ensure_future(measure_lag(stop, lags))
+    started = time.perf_counter()
+    if mode == "on-loop":
+        converter = get_converter(document_type)
+        for input_json in inputs:
+            converter(input_json)
+            await asyncio.sleep(0)
+    else:
+        async with AsyncConverter(max_workers=workers, processes=mode == "processes") as converter:
+            async for _ in converter.convert_stream(inputs, document_type):
+                pass
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    lags.sort()
+    return len(inputs) / elapsed, lags[len(lags) // 2], lags[int(len(lags) * 0.99)], lags[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--document-type", default="op_consult")
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.document_type, args.records)
+    print(f"{'mode':<12}{'records/s':>10}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for mode in ("on-loop", "threads", "processes"):
+        rate, p50, p99, worst = asyncio.run(run(mode, inputs, args.document_type, args.workers))
+        print(f"{mode:<12}{rate:>10.1f}{p50 * 1000:>12.2f}{p99 * 1000:>12.2f}{worst * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
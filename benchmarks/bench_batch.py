@@ -0,0 +1,39 @@
+"""
+Throughput of ``convert_batch`` from 1 to N worker processes.
+
+    python -m benchmarks.bench_batch --records 2000 --max-workers 8
+"""
+import argparse
+import os
+import time
+
+from benchmarks.samples import make_inputs, sample_inputs
+from fhir_converter.batch import convert_batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--document-type", choices=sorted(sample_inputs), default=None)
+    args = parser.parse_args()
+
+    document_types = [args.document_type] if args.document_type else sorted(sample_inputs)
+    print(f"{'document_type':<20}{'workers':>8}{'records/s':>12}{'speedup':>10}{'errors':>8}")
+    for document_type in document_types:
+        inputs = make_inputs(document_type, args.records)
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            started = time.perf_counter()
+            errors = sum(
+                not result.ok
+                for result in convert_batch(inputs, document_type, workers=workers, chunksize=args.chunksize)
+            )
+            rate = args.records / (time.perf_counter() - started)
+            baseline = baseline or rate
+            print(f"{document_type:<20}{workers:>8}{rate:>12.1f}{rate / baseline:>10.2f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Diagnostic report with many observations given as row dicts against the same observations given as columns
+(dict of lists, and NumPy arrays when NumPy is installed).
+
+    python -m benchmarks.bench_columnar --observations 10000 --repeat 5
+"""
+import argparse
+import time
+
+from benchmarks.samples import with_observations
+from fhir_converter.diagnostic_report import build_diagnostic_report_bundle, create_diagnostic_report
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def as_columns(input_json, arrays=False):
+    rows = input_json["observations"]
+    columns = {name: [row[name] for row in rows] for name in rows[0]}
+    if arrays:
+        for name in ("observation_value", "ref_low", "ref_high"):
+            columns[name] = numpy.array(columns[name], dtype=float)
+    return {**input_json, "observations": columns}
+
+
+def measure(convert, input_json, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        convert(input_json)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--observations", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = with_observations(args.observations)
+    inputs = {"rows": rows, "columns": as_columns(rows)}
+    if numpy is not None:
+        inputs["numpy columns"] = as_columns(rows, arrays=True)
+
+    print(f"{args.observations} observations, best of {args.repeat}")
+    print(f"{'input':<16}{'build ms':>10}{'create ms':>11}")
+    for label, input_json in inputs.items():
+        build = measure(build_diagnostic_report_bundle, input_json, args.repeat)
+        create = measure(create_diagnostic_report, input_json, args.repeat)
+        print(f"{label:<16}{build:>10.1f}{create:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compression ratio and throughput of the output sinks per document type, for a stream of bundles (NDJSON into one
+sink) and for bundles compressed one by one (one file / message each), where a trained zstd dictionary matters.
+The last rows compare streaming a bundle into a sink with ``write_bundle`` against serializing it first.
+
+    python -m benchmarks.bench_compression --bundles 400
+"""
+import argparse
+import io
+import time
+
+from benchmarks.samples import make_inputs
+from fhir_converter import sinks
+from fhir_converter.registry import get_converter
+from fhir_converter.serializer import write_bundle
+
+MB = 1024 * 1024
+
+
+def codecs(dictionaries):
+    yield "gzip-1", "gzip", 1, None
+    yield "gzip-6", "gzip", 6, None
+    if sinks.zstandard is not None:
+        yield "zstd-1", "zstd", 1, None
+        yield "zstd-3", "zstd", 3, None
+        yield "zstd-9", "zstd", 9, None
+        if dictionaries is not None:
+            yield "zstd-3+dict", "zstd", 3, dictionaries
+
+
+def compress(bundles, compression, level, dictionary, per_bundle):
+    out = io.BytesIO()
+    started = time.perf_counter()
+    if per_bundle:
+        for bundle in bundles:
+            with sinks.open_sink(out, compression, level, dictionary) as sink:
+                sink.write(bundle)
+    else:
+        with sinks.open_sink(out, compression, level, dictionary) as sink:
+            for bundle in bundles:
+                sink.write(bundle)
+                sink.write(b"\n")
+    return time.perf_counter() - started, len(out.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bundles", type=int, default=300, help="bundles per document type")
+    args = parser.parse_args()
+    if sinks.zstandard is None:
+        print('zstandard is not installed, only gzip is measured (pip install "fhir_converter[zstd]")')
+
+    print(f"{'document_type':<20}{'mode':<12}{'codec':<14}{'ratio':>8}{'MB/s':>9}{'bytes/bundle':>14}")
+    for document_type in ("prescription", "diagnostic_report", "op_consult", "discharge_summary"):
+        converter = get_converter(document_type)
+        inputs = make_inputs(document_type, args.bundles * 2)
+        bundles = [converter(input_json, "bytes") for input_json in inputs]
+        # train on the first half, measure on the second one
+        training, bundles = bundles[:args.bundles], bundles[args.bundles:]
+        dictionary = None
+        if sinks.zstandard is not None:
+            dictionary = sinks.as_dictionary(sinks.train_dictionary(training, 16 * 1024))
+        size = sum(len(bundle) for bundle in bundles)
+        for per_bundle in (False, True):
+            mode = "per-bundle" if per_bundle else "stream"
+            for label, compression, level, codec_dictionary in codecs(dictionary):
+                if codec_dictionary is not None and not per_bundle:
+                    continue
+                seconds, compressed = compress(bundles, compression, level, codec_dictionary, per_bundle)
+                print(
+                    f"{document_type:<20}{mode:<12}{label:<14}{size / compressed:>8.1f}"
+                    f"{size / seconds / MB:>9.1f}{compressed / len(bundles):>14.0f}"
+                )
+
+    print()
+    print(f"{'path (diagnostic_report, gzip-6)':<40}{'ms/bundle':>10}")
+    inputs = make_inputs("diagnostic_report", args.bundles)
+    converter = get_converter("diagnostic_report")
+    for label in ("serialize, then compress", "write_bundle into sink"):
+        out = io.BytesIO()
+        started = time.perf_counter()
+        with sinks.open_sink(out, "gzip") as sink:
+            for input_json in inputs:
+                if label == "write_bundle into sink":
+                    write_bundle(sink, "diagnostic_report", input_json, indent=None)
+                else:
+                    sink.write(converter(input_json, "bytes"))
+                sink.write(b"\n")
+        print(f"{label:<40}{(time.perf_counter() - started) / len(inputs) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Cost of resource id generation per id mode, alone and as part of a full conversion.
+
+    python -m benchmarks.bench_ids --repeat 100000
+"""
+import argparse
+import timeit
+
+from benchmarks.samples import sample_inputs
+from fhir_converter.ids import id_mode, id_modes, id_scope, new_id
+from fhir_converter.registry import get_converter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=100000)
+    parser.add_argument("--conversions", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'mode':<16}{'ns/id':>10}")
+    for mode in id_modes:
+        with id_mode(mode), id_scope("prescription", sample_inputs["prescription"]):
+            seconds = timeit.timeit(new_id, number=args.repeat)
+        print(f"{mode:<16}{seconds / args.repeat * 1e9:>10.0f}")
+
+    print()
+    print(f"{'document_type':<20}{'mode':<16}{'us/bundle':>10}")
+    for document_type, input_json in sample_inputs.items():
+        converter = get_converter(document_type)
+        for mode in id_modes:
+            with id_mode(mode):
+                seconds = timeit.timeit(lambda: converter(input_json, "bytes"), number=args.conversions)
+            print(f"{document_type:<20}{mode:<16}{seconds / args.conversions * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Peak memory of converting diagnostic reports with large imaging attachments: base64 text in the input and a
+string result, against a file path streamed with ``write_bundle``.
+
+    python -m benchmarks.bench_imaging --sizes 20 50 100
+"""
+import argparse
+import base64
+import copy
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.samples import diagnostic_report_input
+from fhir_converter.diagnostic_report import create_diagnostic_report
+from fhir_converter.serializer import write_bundle
+
+MB = 1024 * 1024
+
+
+def traced(function):
+    tracemalloc.start()
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100], help="image sizes in MB")
+    args = parser.parse_args()
+
+    print(f"{'image MB':>9}  {'mode':<28}{'seconds':>9}{'peak MB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            image_path = os.path.join(directory, "image.bin")
+            with open(image_path, "wb") as fp:
+                for _ in range(size):
+                    fp.write(os.urandom(MB))
+            output_path = os.path.join(directory, "bundle.json")
+
+            def in_memory():
+                input_json = copy.deepcopy(diagnostic_report_input)
+                with open(image_path, "rb") as fp:
+                    input_json["imaging"]["data"] = base64.b64encode(fp.read()).decode("ascii")
+                with open(output_path, "w") as fp:
+                    fp.write(create_diagnostic_report(input_json))
+
+            def streamed():
+                input_json = copy.deepcopy(diagnostic_report_input)
+                input_json["imaging"] = {"type": "image/jpeg", "path": image_path}
+                with open(output_path, "w") as fp:
+                    write_bundle(fp, "diagnostic_report", input_json)
+
+            for label, function in (("base64 str + create_*", in_memory), ("path + write_bundle", streamed)):
+                elapsed, peak = traced(function)
+                print(f"{size:>9}  {label:<28}{elapsed:>9.2f}{peak / MB:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
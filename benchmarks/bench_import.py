@@ -0,0 +1,54 @@
+"""
+Cold-start import cost per converter, measured with ``python -X importtime`` in fresh interpreters.
+
+    python -m benchmarks.bench_import --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+targets = [
+    "fhir_converter",
+    "fhir_converter.prescription",
+    "fhir_converter.diagnostic_report",
+    "fhir_converter.op_consult",
+    "fhir_converter.discharge_summary",
+]
+
+
+def import_time(module):
+    """Total self time (ms) and number of modules imported by ``import module`` in a new interpreter."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    modules = fhir_modules = 0
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        modules += 1
+        fhir_modules += name.strip().startswith("fhir.resources")
+    return total_us / 1000, modules, fhir_modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'module':<36}{'median ms':>10}{'modules':>9}{'fhir.resources':>16}")
+    for module in targets:
+        samples = [import_time(module) for _ in range(args.runs)]
+        median = statistics.median(sample[0] for sample in samples)
+        _, modules, fhir_modules = samples[-1]
+        print(f"{module:<36}{median:>10.1f}{modules:>9}{fhir_modules:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Serialization cost of each output format against the historical ``bundle.json(indent=2)`` path.
+
+    python -m benchmarks.bench_output --repeat 500
+"""
+import argparse
+import timeit
+
+from benchmarks.samples import sample_inputs
+from fhir_converter import serializer
+from fhir_converter.registry import get_bundle_builder
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'document_type':<20}{'path':<24}{'us/bundle':>12}{'bytes':>10}")
+    for document_type, input_json in sample_inputs.items():
+        bundle = get_bundle_builder(document_type)(input_json)
+        seconds = timeit.timeit(lambda: bundle.json(indent=2), number=args.repeat)
+        size = len(bundle.json(indent=2).encode("utf-8"))
+        print(f"{document_type:<20}{'bundle.json(indent=2)':<24}{seconds / args.repeat * 1e6:>12.1f}{size:>10}")
+        for backend in serializer.json_backends:
+            serializer.set_json_backend(backend)
+            for output in serializer.output_formats:
+                seconds = timeit.timeit(lambda: serializer.serialize_bundle(bundle, output), number=args.repeat)
+                result = serializer.serialize_bundle(bundle, output)
+                size = len(result.encode("utf-8") if isinstance(result, str) else result) \
+                    if not isinstance(result, dict) else 0
+                label = f"{backend}/{output}"
+                print(f"{document_type:<20}{label:<24}{seconds / args.repeat * 1e6:>12.1f}{size:>10}")
+        serializer.set_json_backend(serializer.json_backends[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Packing the documents of one patient: standalone bundles (one conversion per document) against ``pack_documents``
+as one combined bundle and as separate bundles sharing the participants, for patients with 50+ documents.
+
+    python -m benchmarks.bench_packing --documents 50 --documents 200
+"""
+import argparse
+import copy
+import datetime
+import time
+
+from benchmarks.samples import sample_inputs
+from fhir_converter.packing import pack_documents
+from fhir_converter.registry import get_converter
+from fhir_converter.serializer import loads
+
+document_types = ("prescription", "diagnostic_report", "op_consult", "discharge_summary")
+
+
+def patient_documents(count):
+    """``count`` documents of one patient and practitioner, cycling through the document types."""
+    patient = sample_inputs["op_consult"]["patient"]
+    practitioner = sample_inputs["op_consult"]["practitioner"]
+    documents = []
+    for number in range(count):
+        document_type = document_types[number % len(document_types)]
+        input_json = copy.deepcopy(sample_inputs[document_type])
+        input_json["patient"] = dict(patient)
+        if "practitioner" in input_json:
+            input_json["practitioner"] = dict(practitioner)
+        # one visit a week: the dated resources differ, the participants and undated resources repeat
+        date = (datetime.date(2023, 1, 1) + datetime.timedelta(weeks=number)).isoformat()
+        if document_type == "prescription":
+            input_json["prescription_date"] = date
+        elif document_type == "diagnostic_report":
+            input_json["report_date"] = date
+        elif document_type == "op_consult":
+            input_json["date"] = date
+        else:
+            input_json["meta"] = dict(input_json["meta"], discharge_date=date)
+        documents.append((document_type, input_json))
+    return documents
+
+
+def measure(pack, documents):
+    started = time.perf_counter()
+    bundles = pack(documents)
+    seconds = time.perf_counter() - started
+    size = sum(len(bundle) for bundle in bundles)
+    entries = sum(len(loads(bundle)["entry"]) for bundle in bundles)
+    return seconds, size, entries
+
+
+def standalone(documents):
+    return [get_converter(document_type)(input_json, "bytes") for document_type, input_json in documents]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, action="append", help="documents per patient, default 50, 100, 200")
+    args = parser.parse_args()
+
+    cases = {
+        "standalone": standalone,
+        "packed, separate": lambda documents: pack_documents(documents, combined=False, output="bytes"),
+        "packed, combined": lambda documents: [pack_documents(documents, output="bytes")],
+    }
+    # import the converters before measuring
+    standalone(patient_documents(len(document_types)))
+    print(f"{'documents':>10}  {'mode':<20}{'ms':>10}{'KiB':>10}{'entries':>10}")
+    for count in args.documents or (50, 100, 200):
+        documents = patient_documents(count)
+        for label, pack in cases.items():
+            seconds, size, entries = measure(pack, documents)
+            print(f"{count:>10}  {label:<20}{seconds * 1000:>10.1f}{size / 1024:>10.1f}{entries:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Load generator for ``fhir_converter.serve``: latency percentiles and requests/sec against in-process calls.
+
+    python -m benchmarks.bench_serve --requests 2000 --concurrency 8 --workers 4
+"""
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.samples import make_inputs
+from fhir_converter.registry import get_converter
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def report(label, latencies, elapsed):
+    p50 = percentile(latencies, 0.50) * 1000
+    p99 = percentile(latencies, 0.99) * 1000
+    print(f"{label:<12}{p50:>10.2f}{p99:>10.2f}{len(latencies) / elapsed:>12.1f}")
+
+
+def run_in_process(document_type, bodies):
+    converter = get_converter(document_type)
+    latencies = []
+    started = time.perf_counter()
+    for body in bodies:
+        request_started = time.perf_counter()
+        converter(json.loads(body), "bytes")
+        latencies.append(time.perf_counter() - request_started)
+    return latencies, time.perf_counter() - started
+
+
+def run_server(port, document_type, bodies, concurrency):
+    latencies = []
+    lock = threading.Lock()
+    queue = iter(bodies)
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        local = []
+        while True:
+            with lock:
+                body = next(queue, None)
+            if body is None:
+                break
+            request_started = time.perf_counter()
+            connection.request("POST", f"/convert/{document_type}", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            local.append(time.perf_counter() - request_started)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def wait_for_server(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("conversion server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--document-type", default="diagnostic_report")
+    args = parser.parse_args()
+
+    bodies = [json.dumps(input_json) for input_json in make_inputs(args.document_type, args.requests)]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "fhir_converter.serve", "--port", str(args.port), "--workers", str(args.workers)]
+    )
+    try:
+        wait_for_server(args.port)
+        print(f"{'mode':<12}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>12}")
+        report("in-process", *run_in_process(args.document_type, bodies))
+        report("server", *run_server(args.port, args.document_type, bodies, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
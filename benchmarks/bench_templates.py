@@ -0,0 +1,52 @@
+"""
+Per-bundle time and allocations with the shared constant fragments of ``fhir_converter.templates`` against
+rebuilding them for every bundle (templates cleared before each conversion).
+
+    python -m benchmarks.bench_templates --repeat 500
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.samples import sample_inputs
+from fhir_converter import templates
+from fhir_converter.registry import get_bundle_builder
+
+
+def measure(build, input_json, repeat, cold):
+    elapsed = 0.0
+    for _ in range(repeat):
+        if cold:
+            templates.clear()
+        started = time.perf_counter()
+        build(input_json)
+        elapsed += time.perf_counter() - started
+
+    tracemalloc.start()
+    if cold:
+        templates.clear()
+    before = tracemalloc.take_snapshot()
+    bundle = build(input_json)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del bundle
+    return elapsed / repeat * 1e6, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'document_type':<20}{'fragments':<12}{'us/bundle':>10}{'allocs':>10}")
+    for document_type, input_json in sample_inputs.items():
+        build = get_bundle_builder(document_type)
+        for cold in (True, False):
+            micros, blocks = measure(build, input_json, args.repeat, cold)
+            label = "rebuilt" if cold else "shared"
+            print(f"{document_type:<20}{label:<12}{micros:>10.1f}{blocks:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Terminology index build / open time and text -> code lookup latency, cold (LRU cache cleared) and cached, for exact
+terms and for free text containing a term.
+
+Without ``--terms`` a synthetic vocabulary of ``--size`` terms is generated; pass a real value set, RF2 description
+file or code/term table to measure with it:
+
+    python -m benchmarks.bench_terminology --size 300000
+    python -m benchmarks.bench_terminology --terms sct2_Description_Snapshot-en_INT.txt
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from fhir_converter.terminology import TerminologyIndex, load_terms
+
+words = (
+    "acute chronic left right upper lower severe mild recurrent primary secondary congenital bilateral "
+    "pain fever cough rash swelling fracture infection ulcer lesion disorder syndrome deficiency injury "
+    "chest abdomen head knee hip lung liver kidney heart skin bone joint muscle nerve artery vein "
+    "bacterial viral fungal allergic traumatic diabetic hypertensive obstructive inflammatory malignant"
+).split()
+
+
+def synthetic_terms(size, seed=7):
+    generator = random.Random(seed)
+    return [(str(100000 + number), " ".join(generator.sample(words, generator.randint(2, 5)))) for number in range(size)]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.median(samples) * 1e6,
+        samples[int(len(samples) * 0.99) - 1] * 1e6,
+    )
+
+
+def measure(index, texts, cached):
+    samples = []
+    if cached:
+        for text in texts:
+            index.lookup(text)
+    else:
+        index.lookup.cache_clear()
+    for text in texts:
+        started = time.perf_counter()
+        index.lookup(text)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--terms", help="value set / RF2 / code-term file, a synthetic vocabulary otherwise")
+    parser.add_argument("--size", type=int, default=200000, help="synthetic vocabulary size")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    terms = list(load_terms(args.terms)) if args.terms else synthetic_terms(args.size)
+    started = time.perf_counter()
+    index = TerminologyIndex.build(terms)
+    build = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "terms.idx")
+        index.save(path)
+        started = time.perf_counter()
+        mapped = TerminologyIndex.open(path)
+        opened = time.perf_counter() - started
+        print(f"{len(index)} terms, build {build:.2f}s, file {os.path.getsize(path) / 2 ** 20:.1f} MiB, "
+              f"open {opened * 1000:.2f}ms")
+
+        generator = random.Random(11)
+        sample = [term for _, term in generator.sample(terms, min(args.lookups, len(terms)))]
+        texts = {
+            "exact term": sample,
+            "free text": [f"Patient presents with {term} since two days, no other complaints" for term in sample],
+        }
+        print(f"{'index':<10}{'text':<12}{'cache':<8}{'p50 us':>9}{'p99 us':>9}")
+        for label, lookup_index in (("memory", index), ("mmap", mapped)):
+            for kind, kind_texts in texts.items():
+                for cached in (False, True):
+                    p50, p99 = measure(lookup_index, kind_texts, cached)
+                    print(f"{label:<10}{kind:<12}{'warm' if cached else 'cold':<8}{p50:>9.1f}{p99:>9.1f}")
+        mapped.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Upload throughput against a local stand-in FHIR server: one POST per resource (a new connection each, one at a time)
+against ``FhirClient.upload`` with transactions over pooled keep-alive connections.
+
+    python -m benchmarks.bench_upload --documents 200 --latency 0.005 --max-entries 100 --connections 8
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+from benchmarks.bench_packing import patient_documents
+from fhir_converter.packing import pack_documents
+from fhir_converter.serializer import loads
+from fhir_converter.upload import FHIR_JSON, FhirClient
+from tests.fhir_server import LocalFhirServer
+
+
+def single_posts(url, bundles):
+    posted = 0
+    for bundle in bundles:
+        for entry in loads(bundle)["entry"]:
+            resource = entry["resource"]
+            if "resourceType" not in resource:
+                continue
+            request = urllib.request.Request(f"{url}/{resource['resourceType']}", data=json.dumps(resource).encode(),
+                                             headers={"Content-Type": FHIR_JSON}, method="POST")
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            posted += 1
+    return posted, posted, posted
+
+
+def transactions(url, bundles, max_entries, connections):
+    with FhirClient(url, max_connections=connections) as client:
+        posted = sum(outcome.ok for outcome in client.upload(bundles, max_entries=max_entries))
+        return posted, client.requests, client.connects
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds the server takes per request")
+    parser.add_argument("--max-entries", type=int, default=100)
+    parser.add_argument("--connections", type=int, default=8)
+    args = parser.parse_args()
+
+    bundles = pack_documents(patient_documents(args.documents), combined=False, output="bytes")
+    server = LocalFhirServer(latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cases = {
+        "single posts": lambda: single_posts(server.url, bundles),
+        "transactions, 1 connection": lambda: transactions(server.url, bundles, args.max_entries, 1),
+        f"transactions, {args.connections} connections":
+            lambda: transactions(server.url, bundles, args.max_entries, args.connections),
+    }
+    print(f"{'mode':<32}{'s':>8}{'resources/s':>14}{'requests':>10}{'connects':>10}")
+    try:
+        for label, run in cases.items():
+            started = time.perf_counter()
+            posted, requests, connects = run()
+            seconds = time.perf_counter() - started
+            print(f"{label:<32}{seconds:>8.2f}{posted / seconds:>14.1f}{requests:>10}{connects:>10}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import copy
+
+prescription_input = {
+    "patient": {
+        "name": "John Doe",
+        "patient_id": "somepatientid",
+        "gender": "male",
+    },
+    "practitioner": {
+        "name": "Dr. Smith",
+        "practitioner_id": "somepractitionerid",
+    },
+    "prescription_date": "2021-10-10",
+    "medications": [
+        {
+            "medication_name": "Aspirin",
+            "dosage_instruction": "Take 1 tablet daily with food.",
+        },
+        {
+            "medication_name": "Metformin",
+            "dosage_instruction": "Take 500 mg twice a day before meals.",
+        },
+    ],
+}
+
+diagnostic_report_input = {
+    "patient": {
+        "name": "Rahul Mehra",
+        "patient_id": "P987654321",
+        "gender": "male",
+    },
+    "practitioner": {
+        "name": "Dr. Rakesh Sharma",
+        "practitioner_id": "PR123456789",
+        "gender": "male",
+    },
+    "performer": {
+        "name": "Path Labs Pvt. Ltd.",
+        "organization_id": "PL98765",
+    },
+    "report_date": "2023-02-20",
+    "request": {
+        "service_name": "Comprehensive Metabolic Panel",
+        "request_date": "2023-02-18",
+    },
+    "report_name": "Comprehensive Metabolic Panel Report",
+    "report_title": "CMP",
+    "conclusion": "Liver function tests within normal limits.",
+    "observations": [
+        {
+            "observation_name": "Glucose",
+            "observation_value": "120",
+            "observation_unit": "mg/dL",
+            "ref_low": "70",
+            "ref_high": "100",
+        },
+        {
+            "observation_name": "ALT",
+            "observation_value": "30",
+            "observation_unit": "U/L",
+            "ref_low": "7",
+            "ref_high": "56",
+        },
+    ],
+    "imaging": {
+        "type": "image/jpeg",
+        "data": "dGhpcyBpcyBhIHNhbXBsZSBiYXNlNjQgZW5jb2RlZCBmaWxl",
+    },
+}
+
+op_consult_input = {
+    "patient": {
+        "name": "Aman Kumar",
+        "gender": "male",
+        "patient_id": "P123456789",
+    },
+    "practitioner": {
+        "name": "Dr. Anita Desai",
+        "gender": "female",
+        "practitioner_id": "PR987654321",
+    },
+    "date": "2023-01-15",
+    "ChiefComplaints": "Persistent cough and fever for 5 days",
+    "PhysicalExamination": "Temperature of 38.5°C, clear lungs on auscultation",
+    "Allergies": "No known allergies",
+    "MedicalHistory": "Diagnosed with asthma in childhood",
+    "FamilyHistory": "Mother has a history of hypertension",
+    "InvestigationAdvice": "Complete blood count, Chest X-ray",
+    "Medications": "Paracetamol 500mg every 8 hours for 5 days",
+    "FollowUp": "Return in one week or sooner if symptoms worsen",
+    "Procedure": "Nebulization with salbutamol",
+    "Referral": "Consult with a pulmonologist if no improvement",
+    "OtherObservations": "Patient is a non-smoker",
+    "DocumentReference": "Refer to attached X-ray report",
+}
+
+discharge_summary_input = {
+    "patient": {
+        "patient_id": "1234567890",
+        "name": "Aman",
+        "gender": "male",
+    },
+    "section": {
+        "chief_complaints": "Persistent cough and fever for the past 7 days.",
+        "physical_examination": "Temperature of 38.5°C, Normal breathing sounds.",
+        "allergies": "No known allergies.",
+        "medical_history": "Diagnosed with asthma in 2010.",
+        "family_history": "Father has a history of hypertension.",
+        "investigation_advice": "Recommended chest X-ray and blood tests.",
+        "medications": "Paracetamol 500mg, twice a day for 5 days.",
+        "follow_up": "Follow-up visit scheduled in 1 week.",
+        "procedure": "Nebulization with Salbutamol.",
+        "referral": "Referred to a pulmonologist for further evaluation.",
+        "other_observations": "Patient advised to maintain hydration and rest.",
+        "document_reference": "Refer to attached chest X-ray report.",
+    },
+    "meta": {
+        "discharge_date": "2020-07-09T15:32:26.605+05:30",
+        "status": "final",
+    },
+}
+
+sample_inputs = {
+    "prescription": prescription_input,
+    "diagnostic_report": diagnostic_report_input,
+    "op_consult": op_consult_input,
+    "discharge_summary": discharge_summary_input,
+}
+
+
+def make_inputs(document_type, count):
+    """``count`` copies of the sample input for ``document_type`` with distinct patient ids."""
+    inputs = []
+    for i in range(count):
+        input_json = copy.deepcopy(sample_inputs[document_type])
+        input_json["patient"]["patient_id"] = f"{input_json['patient']['patient_id']}-{i}"
+        inputs.append(input_json)
+    return inputs
+
+
+def with_observations(count):
+    """Diagnostic report input with ``count`` observations."""
+    input_json = copy.deepcopy(diagnostic_report_input)
+    input_json["observations"] = [
+        {
+            "observation_name": f"Analyte {i}",
+            "observation_value": str(50 + i % 100),
+            "observation_unit": "mg/dL",
+            "ref_low": "40",
+            "ref_high": "160",
+        }
+        for i in range(count)
+    ]
+    return input_json
+
+
+def with_medications(count):
+    """Prescription input with ``count`` medications."""
+    input_json = copy.deepcopy(prescription_input)
+    input_json["medications"] = [
+        {
+            "medication_name": f"Medication {i}",
+            "dosage_instruction": "Take 1 tablet twice a day after meals.",
+        }
+        for i in range(count)
+    ]
+    return input_json
+
+
+def with_section_text(document_type, length):
+    """Discharge summary or OP consult input whose every section text is ``length`` characters long."""
+    text = ("Patient reports persistent cough and fever. " * (length // 44 + 1))[:length]
+    if document_type == "discharge_summary":
+        input_json = copy.deepcopy(discharge_summary_input)
+        input_json["section"] = {key: text for key in input_json["section"]}
+    else:
+        input_json = copy.deepcopy(op_consult_input)
+        for key, value in op_consult_input.items():
+            if isinstance(value, str) and key != "date":
+                input_json[key] = text
+    return input_json
+
+
+def with_sections(count):
+    """Discharge summary input with the first ``count`` of its twelve sections filled, the others empty."""
+    input_json = copy.deepcopy(discharge_summary_input)
+    input_json["section"] = {
+        key: text if position < count else None
+        for position, (key, text) in enumerate(discharge_summary_input["section"].items())
+    }
+    return input_json
+
+
+def with_imaging(size):
+    """Diagnostic report input with a base64 imaging payload of ``size`` characters."""
+    input_json = copy.deepcopy(diagnostic_report_input)
+    input_json["imaging"]["data"] = ("QUJD" * (size // 4 + 1))[:size]
+    return input_json
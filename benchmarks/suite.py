@@ -0,0 +1,122 @@
+"""
+Converter benchmark suite with payload-scaling scenarios.
+
+Every scenario converts one input repeatedly and reports time per bundle, bundles/sec, output size and the peak
+memory of a single conversion. Results are written as JSON so they can be compared across releases:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --scenario observations --scenario imaging --quick
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from importlib import metadata
+
+from benchmarks import samples
+from fhir_converter import __version__, serializer
+from fhir_converter.registry import get_converter
+
+KB = 1024
+MB = 1024 * KB
+
+# scenario -> (document type, parameter name, parameter values, input factory)
+scenarios = {
+    "observations": ("diagnostic_report", "observations", [1, 10, 100, 1000], samples.with_observations),
+    "medications": ("prescription", "medications", [1, 10, 100, 1000], samples.with_medications),
+    "discharge_section_text": (
+        "discharge_summary",
+        "text_length",
+        [100, 10 * KB, 100 * KB, 1 * MB],
+        lambda length: samples.with_section_text("discharge_summary", length),
+    ),
+    "op_consult_section_text": (
+        "op_consult",
+        "text_length",
+        [100, 10 * KB, 100 * KB, 1 * MB],
+        lambda length: samples.with_section_text("op_consult", length),
+    ),
+    "discharge_sections": ("discharge_summary", "sections", [1, 2, 6, 12], samples.with_sections),
+    "imaging": ("diagnostic_report", "imaging_bytes", [1 * KB, 1 * MB, 10 * MB, 50 * MB], samples.with_imaging),
+}
+
+
+def run_case(converter, input_json, output, min_time, min_repeat):
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_repeat or time.perf_counter() - started < min_time:
+        case_started = time.perf_counter()
+        result = converter(input_json, output)
+        timings.append(time.perf_counter() - case_started)
+    size = len(result.encode("utf-8")) if isinstance(result, str) else len(result)
+    del result
+
+    tracemalloc.start()
+    converter(input_json, output)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = statistics.median(timings)
+    return {
+        "repeat": len(timings),
+        "seconds_per_bundle": seconds,
+        "bundles_per_second": 1 / seconds if seconds else None,
+        "output_bytes": size,
+        "peak_memory_bytes": peak,
+    }
+
+
+def environment():
+    try:
+        fhir_resources_version = metadata.version("fhir.resources")
+    except metadata.PackageNotFoundError:
+        fhir_resources_version = None
+    return {
+        "fhir_converter": __version__,
+        "fhir.resources": fhir_resources_version,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "json_backend": serializer.get_json_backend(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios), help="default: all")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--format", default="json", choices=[f for f in serializer.output_formats if f != "dict"])
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent per case")
+    parser.add_argument("--min-repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="only the two smallest values of every scenario")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenario or scenarios:
+        document_type, parameter, values, make_input = scenarios[name]
+        converter = get_converter(document_type)
+        for value in values[:2] if args.quick else values:
+            case = run_case(converter, make_input(value), args.format, args.min_time, args.min_repeat)
+            case.update({"scenario": name, "document_type": document_type, parameter: value})
+            results.append(case)
+            print(
+                f"{name:<26}{parameter}={value:<10}{case['seconds_per_bundle'] * 1000:>10.2f} ms"
+                f"{case['bundles_per_second']:>10.1f}/s{case['peak_memory_bytes'] / MB:>10.2f} MB peak",
+                file=sys.stderr,
+            )
+
+    report = {"environment": environment(), "output_format": args.format, "results": results}
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,26 @@
-from fhir_converter.discharge_summary import create_fhir_bundle_discharge_summary
-from fhir_converter.prescription import create_prescription
-from fhir_converter.diagnostic_report import create_diagnostic_report
-from fhir_converter.op_consult import create_opconsult_record
\ No newline at end of file
+import importlib
+
+__version__ = "0.0.5"
+
+# converters are imported on first attribute access, each one pulls in a large set of fhir.resources models
+_lazy_attributes = {
+    "create_fhir_bundle_discharge_summary": "fhir_converter.discharge_summary",
+    "create_prescription": "fhir_converter.prescription",
+    "create_diagnostic_report": "fhir_converter.diagnostic_report",
+    "create_opconsult_record": "fhir_converter.op_consult",
+}
+
+__all__ = list(_lazy_attributes)
+
+
+def __getattr__(name):
+    module_name = _lazy_attributes.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
@@ -0,0 +1,209 @@
+"""
+asyncio API: conversions run on a managed thread or process pool so the event loop stays responsive.
+
+    from fhir_converter import aio
+
+    bundle = await aio.create_prescription(input_json)
+
+    async with aio.AsyncConverter(max_workers=4, processes=True) as converter:
+        async for result in converter.convert_stream(records(), "diagnostic_report", max_concurrency=16):
+            ...
+"""
+import asyncio
+import collections
+import contextvars
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Iterable, Optional, Union
+
+from fhir_converter.batch import BatchResult
+from fhir_converter.registry import get_converter
+
+
+def _convert(document_type, input_json, output):
+    return get_converter(document_type)(input_json, output)
+
+
+class AsyncConverter:
+    """
+    Owns the executor the conversions are offloaded to, use it as an async context manager or call ``aclose``.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, processes: bool = False):
+        """
+        :param max_workers: pool size, defaults to ``os.cpu_count()``
+        :param processes: convert in worker processes instead of threads, conversions then do not compete with the
+            event loop for the GIL but inputs and results are pickled
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.processes = processes
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    async def convert(self, document_type: str, input_json: dict, output: str = "json"):
+        """
+        :param document_type: one of ``registry.document_converters``
+        :param input_json: converter input
+        :param output: one of ``serializer.output_formats``
+        :return: the serialized FHIR bundle, conversion errors are raised
+        """
+        call = functools.partial(_convert, document_type, input_json, output)
+        if not self.processes:
+            # threads see the caller's id mode, resource pool, ... like a direct call would
+            call = functools.partial(contextvars.copy_context().run, call)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def _convert_result(self, index, document_type, input_json, output):
+        try:
+            return BatchResult(index, await self.convert(document_type, input_json, output))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return BatchResult(index, error_type=type(e).__name__, error=str(e))
+
+    async def convert_stream(
+        self,
+        input_jsons: Union[AsyncIterable[dict], Iterable[dict]],
+        document_type: str,
+        output: str = "json",
+        max_concurrency: Optional[int] = None,
+        ordered: bool = True,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Convert a stream of inputs with bounded concurrency.
+
+        The next input is only pulled from ``input_jsons`` when fewer than ``max_concurrency`` conversions are in
+        flight, so a slow consumer slows down the producer. Finished conversions are yielded while waiting for the
+        next input, a slow producer does not hold them back. Closing the generator or cancelling the consuming task
+        cancels the conversions that have not started yet.
+
+        :param input_jsons: async or sync iterable of converter inputs
+        :param document_type: one of ``registry.document_converters``
+        :param output: one of ``serializer.output_formats``
+        :param max_concurrency: conversions in flight, defaults to twice the pool size
+        :param ordered: yield results in input order, otherwise as they complete
+        :return: async iterator of ``BatchResult``, conversion errors are returned as results
+        """
+        get_converter(document_type)
+        max_concurrency = max_concurrency or 2 * self.max_workers
+        inputs = _aiter(input_jsons)
+        pending = collections.deque()
+        # task pulling the next input, raced against the conversions in flight
+        fetch = None
+        exhausted = False
+        try:
+            index = 0
+            while True:
+                for result in self._ready_results(pending, ordered):
+                    yield result
+                if fetch is None and not exhausted and len(pending) < max_concurrency:
+                    fetch = asyncio.ensure_future(inputs.__anext__())
+                if fetch is None and not pending:
+                    break
+
+                waiting = set(pending) if not ordered else {pending[0]} if pending else set()
+                if fetch is not None:
+                    waiting.add(fetch)
+                await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if fetch is not None and fetch.done():
+                    try:
+                        input_json = fetch.result()
+                    except StopAsyncIteration:
+                        exhausted = True
+                    else:
+                        pending.append(
+                            asyncio.ensure_future(self._convert_result(index, document_type, input_json, output))
+                        )
+                        index += 1
+                    fetch = None
+        finally:
+            if fetch is not None:
+                fetch.cancel()
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _ready_results(pending, ordered):
+        """
+        Remove the finished conversions that can be yielded from ``pending``.
+        :return: their results, in input order
+        """
+        if ordered:
+            ready = []
+            while pending and pending[0].done():
+                ready.append(pending.popleft().result())
+            return ready
+        done = [task for task in pending if task.done()]
+        for task in done:
+            pending.remove(task)
+        return sorted((task.result() for task in done), key=lambda result: result.index)
+
+    async def aclose(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, functools.partial(executor.shutdown, True))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+async def _aiter(iterable):
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+_default_converter = None
+
+
+def default_converter() -> AsyncConverter:
+    """
+    :return: the thread pool backed converter used by the module level functions
+    """
+    global _default_converter
+    if _default_converter is None:
+        _default_converter = AsyncConverter()
+    return _default_converter
+
+
+async def convert(document_type: str, input_json: dict, output: str = "json"):
+    return await default_converter().convert(document_type, input_json, output)
+
+
+def convert_stream(
+    input_jsons,
+    document_type: str,
+    output: str = "json",
+    max_concurrency: Optional[int] = None,
+    ordered: bool = True,
+) -> AsyncIterator[BatchResult]:
+    return default_converter().convert_stream(input_jsons, document_type, output, max_concurrency, ordered)
+
+
+async def create_prescription(input_json: dict, output: str = "json"):
+    return await convert("prescription", input_json, output)
+
+
+async def create_diagnostic_report(input_json: dict, output: str = "json"):
+    return await convert("diagnostic_report", input_json, output)
+
+
+async def create_opconsult_record(input_json: dict, output: str = "json"):
+    return await convert("op_consult", input_json, output)
+
+
+async def create_fhir_bundle_discharge_summary(input_json: dict, output: str = "json"):
+    return await convert("discharge_summary", input_json, output)
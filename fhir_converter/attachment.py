@@ -0,0 +1,108 @@
+import base64
+import os
+from typing import Iterator
+
+# multiple of 3 so that every chunk encodes without padding
+CHUNK_SIZE = 3 * 256 * 1024
+
+
+class Base64Source:
+    """
+    Binary attachment content that is read and base64-encoded chunk by chunk while the bundle is serialized.
+
+    ``source`` is a file path, a binary file object or a bytes-like buffer (``bytes``, ``memoryview``, ``mmap``).
+    """
+
+    def __init__(self, source, chunk_size: int = CHUNK_SIZE):
+        if chunk_size % 3:
+            raise ValueError("chunk_size must be a multiple of 3")
+        self.source = source
+        self.chunk_size = chunk_size
+        self._start = None
+        if isinstance(source, (str, os.PathLike)):
+            self.kind = "path"
+        else:
+            try:
+                memoryview(source).release()
+                self.kind = "buffer"
+            except TypeError:
+                self.kind = "file"
+                # remember where the content starts so that it can be encoded more than once
+                if getattr(source, "seekable", lambda: False)():
+                    self._start = source.tell()
+
+    def iter_base64(self) -> Iterator[str]:
+        """
+        :return: iterator of base64 text chunks, their concatenation is the encoded content
+        """
+        if self.kind == "path":
+            with open(self.source, "rb") as fp:
+                yield from self._iter_file(fp)
+        elif self.kind == "file":
+            if self._start is not None:
+                self.source.seek(self._start)
+            yield from self._iter_file(self.source)
+        else:
+            with memoryview(self.source) as buffer, buffer.cast("B") as view:
+                for offset in range(0, len(view), self.chunk_size):
+                    yield base64.b64encode(view[offset:offset + self.chunk_size]).decode("ascii")
+
+    def read_base64(self) -> str:
+        """
+        :return: the whole encoded content
+        """
+        return "".join(self.iter_base64())
+
+    def _iter_file(self, fp):
+        pending = b""
+        while True:
+            chunk = fp.read(self.chunk_size)
+            if not chunk:
+                break
+            # raw and buffered reads may return fewer bytes than asked for, only encode whole 3 byte groups
+            chunk = pending + chunk
+            usable = len(chunk) - len(chunk) % 3
+            pending = chunk[usable:]
+            if usable:
+                yield base64.b64encode(chunk[:usable]).decode("ascii")
+        if pending:
+            yield base64.b64encode(pending).decode("ascii")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.source!r})"
+
+
+def attachment_data(attachment_info: dict):
+    """
+    ``Attachment.data`` for converter input: ``data`` holds base64 text, ``path`` a file path and ``file`` a binary
+    file object or buffer. Files and buffers are only read while the bundle is serialized.
+    :param attachment_info: e.g. ``input_json["imaging"]``
+    :return: base64 ``str`` or ``Base64Source``
+    """
+    if attachment_info.get("path") is not None:
+        return Base64Source(attachment_info["path"])
+    if attachment_info.get("file") is not None:
+        return Base64Source(attachment_info["file"])
+    return attachment_info.get("data")
+
+
+def reads_source(attachment_info) -> bool:
+    """
+    :return: whether the attachment data is read from a file or buffer (a ``Base64Source``), not given inline
+    """
+    return isinstance(attachment_info, dict) and (
+        attachment_info.get("path") is not None or attachment_info.get("file") is not None
+    )
+
+
+def find_sources(resource: dict) -> list:
+    """
+    Locate the ``Base64Source`` values of a serialized resource (``Media.content.data``).
+    :param resource: resource dict, e.g. ``entry["resource"]``
+    :return: list of ``(attachment dict, source)``
+    """
+    sources = []
+    for value in resource.values():
+        if isinstance(value, dict) and isinstance(value.get("data"), Base64Source):
+            sources.append((value, value["data"]))
+    return sources
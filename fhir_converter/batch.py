@@ -0,0 +1,121 @@
+import contextlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Iterable, Iterator, NamedTuple, Optional, Union
+
+from fhir_converter.ids import id_mode as use_id_mode
+from fhir_converter.registry import document_converters, get_converter, infer_document_type
+from fhir_converter.serializer import loads
+
+
+class BatchResult(NamedTuple):
+    index: int
+    output: Any = None
+    error_type: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error_type is None
+
+
+def _convert_chunk(document_type, output, id_mode, start, chunk):
+    converter = get_converter(document_type) if document_type else None
+    results = []
+    with use_id_mode(id_mode) if id_mode else contextlib.nullcontext():
+        for index, input_json in enumerate(chunk, start):
+            try:
+                if isinstance(input_json, (str, bytes)):
+                    input_json = loads(input_json)
+                convert = converter or get_converter(infer_document_type(input_json))
+                results.append(BatchResult(index, convert(input_json, output)))
+            except Exception as e:
+                # errors travel back as strings, exceptions raised by pydantic are not always picklable
+                results.append(BatchResult(index, error_type=type(e).__name__, error=str(e)))
+    return results
+
+
+def _init_worker(document_type):
+    # import the converter (and its fhir.resources models) once per worker, not per chunk
+    for name in [document_type] if document_type else document_converters:
+        get_converter(name)
+
+
+def _iter_chunks(input_jsons, chunksize):
+    start, chunk = 0, []
+    for index, input_json in enumerate(input_jsons):
+        chunk.append(input_json)
+        if len(chunk) == chunksize:
+            yield start, chunk
+            start, chunk = index + 1, []
+    if chunk:
+        yield start, chunk
+
+
+def convert_batch(
+    input_jsons: Iterable[Union[dict, str, bytes]],
+    document_type: Optional[str],
+    workers: Optional[int] = None,
+    chunksize: int = 16,
+    ordered: bool = True,
+    output: str = "json",
+    id_mode: Optional[str] = None,
+) -> Iterator[BatchResult]:
+    """
+    Convert many converter inputs on a process pool.
+
+    Inputs are consumed lazily and dispatched in chunks of ``chunksize``; at most ``2 * workers`` chunks
+    are in flight at a time. A record that fails to convert yields a result with ``error_type``/``error``
+    set instead of aborting the batch.
+
+    :param input_jsons: iterable of converter input dicts or their JSON text, parsed in the workers
+    :param document_type: one of ``registry.document_converters``, ``None`` infers it for every input
+    :param workers: number of worker processes, defaults to ``os.cpu_count()``; ``1`` converts in-process
+    :param chunksize: number of records sent to a worker at once
+    :param ordered: yield results in input order, otherwise as chunks complete
+    :param output: one of ``serializer.output_formats``
+    :param id_mode: one of ``ids.id_modes``, defaults to the mode set with ``ids.set_id_mode``
+    :return: iterator of ``BatchResult``
+    """
+    if document_type:
+        get_converter(document_type)
+    workers = workers or os.cpu_count() or 1
+    chunks = _iter_chunks(input_jsons, chunksize)
+
+    if workers == 1:
+        for start, chunk in chunks:
+            yield from _convert_chunk(document_type, output, id_mode, start, chunk)
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(document_type,)
+    )
+    pending = set()
+    completed = {}
+    next_index = 0
+    try:
+        exhausted = False
+        while not exhausted or pending:
+            while not exhausted and len(pending) < 2 * workers:
+                try:
+                    start, chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(_convert_chunk, document_type, output, id_mode, start, chunk))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results = future.result()
+                if not ordered:
+                    yield from results
+                    continue
+                completed[results[0].index] = results
+            while next_index in completed:
+                results = completed.pop(next_index)
+                yield from results
+                next_index += len(results)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,247 @@
+"""
+Opt-in result cache in front of the converters.
+
+Entries are keyed on a canonical hash of the input JSON, the document type, the output format, the id mode, the
+content of the active terminology index and the converter version. With the default ``random`` id mode a hit returns
+the bundle generated the first time, ids included, not a bundle with fresh ids; use the ``deterministic`` id mode when
+cached and freshly converted bundles have to be identical.
+
+Conversions whose output does not only depend on the key bypass the cache: those with an active
+``pool.ResourcePool`` (participant ids come from the pool) and imaging read from a file or buffer (the input holds
+the path or object, not the content).
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fhir_converter import __version__
+from fhir_converter.attachment import reads_source
+from fhir_converter.ids import get_id_mode, input_digest
+from fhir_converter.pool import active_pool
+from fhir_converter.registry import get_converter
+from fhir_converter.terminology import active_index
+
+
+class MemoryCache:
+    """
+    In-process LRU cache bounded by the total size of the stored values.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = None):
+        """
+        :param max_bytes: least recently used entries are evicted above this size
+        :param ttl: seconds an entry stays valid, ``None`` keeps entries until evicted
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class SqliteCache:
+    """
+    On-disk cache in a sqlite database, can be shared by several processes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024, ttl: Optional[float] = None):
+        """
+        :param path: database file, created when missing
+        :param max_bytes: least recently used entries are evicted above this size
+        :param ttl: seconds an entry stays valid, ``None`` keeps entries until evicted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS bundles ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires REAL, accessed REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS bundles_accessed ON bundles (accessed)")
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM bundles").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires FROM bundles WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                self._connection.execute("DELETE FROM bundles WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE bundles SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO bundles (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires, now),
+                )
+                connection.execute("DELETE FROM bundles WHERE expires IS NOT NULL AND expires < ?", (now,))
+                size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM bundles").fetchone()[0]
+                if size > self.max_bytes:
+                    evicted = 0
+                    for stale_key, stale_size in connection.execute(
+                        "SELECT key, size FROM bundles ORDER BY accessed"
+                    ).fetchall():
+                        if size <= self.max_bytes:
+                            break
+                        connection.execute("DELETE FROM bundles WHERE key = ?", (stale_key,))
+                        size -= stale_size
+                        evicted += 1
+                    self.evictions += evicted
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM bundles")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM bundles").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+class ConversionCache:
+    """
+    Converts through a cache backend, counting hits, misses and bypassed conversions.
+
+        cache = ConversionCache(MemoryCache(max_bytes=64 * 1024 * 1024, ttl=3600))
+        bundle = cache.convert("prescription", input_json)
+    """
+
+    def __init__(self, backend=None):
+        """
+        :param backend: ``MemoryCache`` (default) or ``SqliteCache``
+        """
+        self.backend = backend if backend is not None else MemoryCache()
+        # guards the counters, the backends guard their own store
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def key(self, document_type: str, input_json: dict, output: str = "json") -> str:
+        index = active_index()
+        digest = hashlib.sha256(input_digest(document_type, input_json).encode("ascii"))
+        digest.update(f"\0{output}\0{get_id_mode()}\0{index.digest if index else ''}\0{__version__}".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def cacheable(input_json: dict) -> bool:
+        """
+        :return: whether the bundle of ``input_json`` depends on the key only, see the module docstring
+        """
+        return active_pool() is None and not reads_source(input_json.get("imaging"))
+
+    def convert(self, document_type: str, input_json: dict, output: str = "json"):
+        """
+        Return the cached bundle for ``input_json`` or convert and store it.
+        :param document_type: one of ``registry.document_converters``
+        :param input_json: converter input
+        :param output: one of ``serializer.output_formats``
+        :return: the serialized FHIR bundle
+        """
+        if not self.cacheable(input_json):
+            with self._lock:
+                self.bypassed += 1
+            return get_converter(document_type)(input_json, output)
+
+        key = self.key(document_type, input_json, output)
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return _decode(value, output)
+
+        with self._lock:
+            self.misses += 1
+        # dicts are stored as compact JSON
+        result = get_converter(document_type)(input_json, "bytes" if output == "dict" else output)
+        self.backend.set(key, result.encode("utf-8") if isinstance(result, str) else result)
+        return json.loads(result) if output == "dict" else result
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, bypassed = self.hits, self.misses, self.bypassed
+        return {
+            "hits": hits,
+            "misses": misses,
+            "bypassed": bypassed,
+            "evictions": self.backend.evictions,
+            "entries": len(self.backend),
+            "bytes": self.backend.size,
+        }
+
+
+def _decode(value, output):
+    if output == "bytes":
+        return value
+    if output == "dict":
+        return json.loads(value)
+    return value.decode("utf-8")
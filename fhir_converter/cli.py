@@ -0,0 +1,284 @@
+"""
+``fhir-convert``: bulk conversion from the command line.
+
+    fhir-convert inputs/ --output bundles.ndjson.gz --checkpoint run.checkpoint
+    fhir-convert records.jsonl --type prescription --output-dir bundles/ --compress zstd --dictionary bundles.dict
+    cat records.jsonl | fhir-convert - --output - > bundles.ndjson
+
+Inputs are directories of ``*.json`` files (one input each, in file name order), JSONL files (optionally ``.gz`` or
+``.zst``) or
+``-`` for JSONL on stdin. The document type is inferred for every input unless ``--type`` is given. Inputs are
+converted on all cores; inputs that fail are reported as JSON lines on stderr (or ``--errors``) without stopping the
+run.
+
+With ``--checkpoint`` the progress is saved every ``--checkpoint-interval`` seconds and when the run stops, and
+``--resume`` continues an interrupted run after the last checkpointed input. NDJSON output and ``--errors`` lines
+written after that checkpoint are truncated away, compressed output is written as one gzip member / zstd frame per
+checkpoint so it can be truncated the same way. The checkpoint belongs to one run: resuming with other inputs, output,
+compression, ``--type``, ``--id-mode`` or ``--pretty`` is refused.
+"""
+import argparse
+import itertools
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from fhir_converter.batch import convert_batch
+from fhir_converter.ids import id_modes
+from fhir_converter.registry import document_converters
+from fhir_converter.sinks import compression_for, compressions, extensions, load_dictionary, open_sink, open_source
+
+CHECKPOINT_VERSION = 2
+
+
+def iter_inputs(sources: List[str]) -> Iterator[Tuple[Optional[str], bytes]]:
+    """
+    :return: iterator of ``(name, input JSON)``, the name is the file stem for directory inputs and ``None`` for lines
+    """
+    for source in sources:
+        if source == "-":
+            yield from ((None, line) for line in sys.stdin.buffer if line.strip())
+        elif os.path.isdir(source):
+            for file_name in sorted(os.listdir(source)):
+                if file_name.endswith(".json"):
+                    with open(os.path.join(source, file_name), "rb") as fp:
+                        yield file_name[:-len(".json")], fp.read()
+        else:
+            with open_source(source) as fp:
+                yield from ((None, line) for line in fp if line.strip())
+
+
+class NdjsonWriter:
+    """
+    One bundle per line. ``checkpoint`` makes everything written so far durable and returns the file offset a resumed
+    run truncates to.
+    """
+
+    def __init__(self, path: str, compression: str, level=None, dictionary=None, offset: Optional[int] = None):
+        if path == "-":
+            self._raw = sys.stdout.buffer
+        elif offset is None:
+            self._raw = open(path, "wb")
+        else:
+            self._raw = open(path, "r+b")
+            self._raw.truncate(offset)
+            self._raw.seek(offset)
+        self.path = path
+        self._sink = open_sink(self._raw, compression, level, dictionary)
+
+    def write(self, index: int, name: Optional[str], data: bytes):
+        self._sink.write(data)
+        self._sink.write(b"\n")
+
+    def checkpoint(self) -> Optional[int]:
+        self._sink.end_frame()
+        if self.path == "-":
+            return None
+        os.fsync(self._raw.fileno())
+        return self._raw.tell()
+
+    def close(self):
+        self.checkpoint()
+        self._sink.close()
+        if self.path != "-":
+            self._raw.close()
+
+
+class DirectoryWriter:
+    """
+    One file per bundle, named after the input file or the input position.
+    """
+
+    def __init__(self, path: str, compression: str, level=None, dictionary=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self.dictionary = dictionary
+
+    def write(self, index: int, name: Optional[str], data: bytes):
+        file_name = f"{name or f'{index:08d}'}.json{extensions.get(self.compression, '')}"
+        with open_sink(os.path.join(self.path, file_name), self.compression, self.level, self.dictionary) as sink:
+            sink.write(data)
+
+    def checkpoint(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def write_checkpoint(path: str, state: dict):
+    # write and rename, a crash leaves either the previous or the new checkpoint
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as fp:
+        json.dump(state, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temporary, path)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="fhir-convert", description="Convert inputs to ABDM FHIR bundles")
+    parser.add_argument("inputs", nargs="+", help="directories of *.json files, JSONL files or - for stdin")
+    parser.add_argument("--type", choices=sorted(document_converters), help="document type, inferred otherwise")
+    destination = parser.add_mutually_exclusive_group(required=True)
+    destination.add_argument("--output", help="NDJSON output file, - for stdout")
+    destination.add_argument("--output-dir", help="directory receiving one bundle file per input")
+    parser.add_argument("--compress", choices=compressions, help="defaults to the output extension (.gz, .zst)")
+    parser.add_argument("--level", type=int, help="compression level")
+    parser.add_argument("--dictionary", help="zstd dictionary file, see sinks.train_dictionary")
+    parser.add_argument("--pretty", action="store_true", help="indented JSON in per-file outputs")
+    parser.add_argument("--errors", help="JSONL file receiving the failed inputs, stderr by default")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--id-mode", choices=id_modes)
+    parser.add_argument("--checkpoint", help="checkpoint file, enables resuming")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="seconds between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue after the last checkpoint")
+    parser.add_argument("--quiet", action="store_true", help="no progress on stderr")
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+    if args.checkpoint and args.output == "-":
+        parser.error("--checkpoint requires an output file or directory")
+    if args.compress is None:
+        args.compress = compression_for(args.output or "")
+    if args.dictionary and args.compress != "zstd":
+        parser.error("--dictionary requires zstd compression")
+    return args
+
+
+def _interrupt(signum):
+    if signum == signal.SIGINT:
+        raise KeyboardInterrupt
+    sys.exit(143)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # SIGINT / SIGTERM leave through the finally blocks (final checkpoint, worker shutdown), but not while a record
+    # is written and counted: the checkpoint offset and the completed count must describe the same records
+    guard = {"writing": False, "signal": None}
+
+    def on_signal(signum, frame):
+        if guard["writing"]:
+            guard["signal"] = signum
+        else:
+            _interrupt(signum)
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    dictionary = load_dictionary(args.dictionary) if args.dictionary else None
+    run = {
+        "version": CHECKPOINT_VERSION,
+        "inputs": [source if source == "-" else os.path.abspath(source) for source in args.inputs],
+        "type": args.type,
+        "output": args.output and (args.output if args.output == "-" else os.path.abspath(args.output)),
+        "output_dir": args.output_dir and os.path.abspath(args.output_dir),
+        "compress": args.compress,
+        "id_mode": args.id_mode,
+        "pretty": args.pretty,
+    }
+    state = {**run, "completed": 0, "failed": 0, "offset": None, "errors_offset": None, "finished": False}
+    if args.resume:
+        previous = read_checkpoint(args.checkpoint)
+        if previous is not None:
+            if any(previous.get(key) != value for key, value in run.items()):
+                print(f"fhir-convert: {args.checkpoint} belongs to a different run", file=sys.stderr)
+                return 2
+            state = previous
+
+    if args.output:
+        resume_offset = state["offset"] if state["completed"] else None
+        writer = NdjsonWriter(args.output, args.compress, args.level, dictionary, resume_offset)
+    else:
+        writer = DirectoryWriter(args.output_dir, args.compress, args.level, dictionary)
+    if not args.errors:
+        errors = sys.stderr
+    elif state["completed"] and state["errors_offset"] is not None:
+        # failures reported after the checkpoint are converted and reported again
+        errors = open(args.errors, "r+", encoding="utf-8")
+        errors.truncate(state["errors_offset"])
+        errors.seek(state["errors_offset"])
+    else:
+        errors = open(args.errors, "a" if args.resume else "w", encoding="utf-8")
+
+    skip = state["completed"]
+    names = deque()
+
+    def inputs():
+        for name, data in itertools.islice(iter_inputs(args.inputs), skip, None):
+            names.append(name)
+            yield data
+
+    def save():
+        if guard["writing"]:
+            # a record failed half-way, the previous checkpoint stays: resuming truncates the output to its offset
+            return
+        offset = writer.checkpoint()
+        if errors is not sys.stderr:
+            errors.flush()
+            os.fsync(errors.fileno())
+        if args.checkpoint:
+            state["offset"] = offset
+            if errors is not sys.stderr:
+                state["errors_offset"] = errors.tell()
+            write_checkpoint(args.checkpoint, state)
+
+    output = "bytes" if args.output or not args.pretty else "json"
+    started = last_checkpoint = time.monotonic()
+    try:
+        for result in convert_batch(inputs(), args.type, args.workers, args.chunksize, True, output, args.id_mode):
+            index = skip + result.index
+            name = names.popleft()
+            guard["writing"] = True
+            if result.ok:
+                data = result.output
+                writer.write(index, name, data.encode("utf-8") if isinstance(data, str) else data)
+            else:
+                state["failed"] += 1
+                record = {"index": index, "name": name, "error_type": result.error_type, "error": result.error}
+                errors.write(json.dumps(record) + "\n")
+            state["completed"] = index + 1
+            guard["writing"] = False
+            if guard["signal"] is not None:
+                _interrupt(guard["signal"])
+
+            now = time.monotonic()
+            if now - last_checkpoint >= args.checkpoint_interval:
+                save()
+                last_checkpoint = now
+                if not args.quiet:
+                    rate = (state["completed"] - skip) / (now - started)
+                    print(
+                        f"fhir-convert: {state['completed']} converted, {state['failed']} failed, {rate:.0f}/s",
+                        file=sys.stderr,
+                    )
+        state["finished"] = True
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        save()
+        writer.close()
+        if errors is not sys.stderr:
+            errors.close()
+    if not args.quiet:
+        print(f"fhir-convert: {state['completed']} converted, {state['failed']} failed", file=sys.stderr)
+    return 1 if state["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
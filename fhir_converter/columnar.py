@@ -0,0 +1,105 @@
+"""
+Columnar converter input, e.g. ``observations`` as columns instead of a list of row dicts:
+
+    input_json["observations"] = {
+        "observation_name": ["Glucose", "ALT"],
+        "observation_value": numpy.array([120, 30]),
+        "observation_unit": ["mg/dL", "U/L"],
+        "ref_low": ["70", "7"],
+        "ref_high": ["100", "56"],
+    }
+
+A dict of equally long sequences (lists, tuples, NumPy arrays, pandas Series), a pandas DataFrame and a pyarrow
+Table or RecordBatch are accepted. None of these libraries is imported here, they are recognised by their methods.
+"""
+import re
+from collections.abc import Mapping
+from typing import Dict, Iterable, List
+
+# plain decimal notation only: int() / float() would also take "1_000", surrounding whitespace and "nan"
+_integer = re.compile(r"[+-]?[0-9]+").fullmatch
+_decimal = re.compile(r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?").fullmatch
+
+
+def is_columnar(rows_or_columns) -> bool:
+    """
+    :return: whether converter input is columnar (a mapping, DataFrame or Arrow table) rather than row dicts
+    """
+    return isinstance(rows_or_columns, Mapping) or hasattr(rows_or_columns, "to_pydict") or (
+        hasattr(rows_or_columns, "columns") and hasattr(rows_or_columns, "to_numpy")
+    )
+
+
+def to_columns(columnar) -> Dict[str, list]:
+    """
+    :param columnar: dict of sequences, pandas DataFrame or pyarrow Table / RecordBatch
+    :return: dict of equally long lists of Python values
+    """
+    if hasattr(columnar, "to_pydict"):
+        columns = columnar.to_pydict()
+    elif hasattr(columnar, "columns") and hasattr(columnar, "to_numpy"):
+        columns = {name: columnar[name] for name in columnar.columns}
+    else:
+        columns = dict(columnar)
+    # NumPy arrays and pandas Series convert to Python values in one call
+    columns = {
+        name: column.tolist() if hasattr(column, "tolist") else list(column) for name, column in columns.items()
+    }
+    if len({len(column) for column in columns.values()}) > 1:
+        lengths = ", ".join(f"{name}={len(column)}" for name, column in columns.items())
+        raise ValueError(f"columns differ in length: {lengths}")
+    return columns
+
+
+def column_length(columns: Dict[str, list]) -> int:
+    return len(next(iter(columns.values()), ()))
+
+
+def parse_numbers(column: list) -> list:
+    """
+    Parse a numeric column: numeric text (plain decimal notation) becomes ``int`` or ``float``, empty or blank text
+    and NaN become ``None``, numbers and anything else are kept as they are.
+    """
+    # whole-column fast paths, integer text and already numeric columns (NumPy, Arrow) are the common cases
+    if all(type(value) is str and _integer(value) for value in column):
+        return list(map(int, column))
+    if all(type(value) is int for value in column):
+        return column
+    return [_parse_number(value) for value in column]
+
+
+def _parse_number(value):
+    if isinstance(value, float):
+        return None if value != value else value
+    if not isinstance(value, str):
+        return value
+    if not value.strip():
+        return None
+    if _integer(value):
+        return int(value)
+    if _decimal(value):
+        return float(value)
+    return value
+
+
+def construct_many(model, rows: Iterable[dict]) -> List:
+    """
+    ``model.construct(**row)`` for every row, with the field defaults resolved once instead of once per row.
+    :param model: fhir.resources model class
+    :param rows: field values by field name (not alias), each row becomes ``__fields_set__`` of its model
+    :return: list of models
+    """
+    defaults = model.construct().__dict__
+    new = model.__new__
+    init_private = bool(model.__private_attributes__)
+    models = []
+    for row in rows:
+        values = defaults.copy()
+        values.update(row)
+        instance = new(model)
+        object.__setattr__(instance, "__dict__", values)
+        object.__setattr__(instance, "__fields_set__", set(row))
+        if init_private:
+            instance._init_private_attributes()
+        models.append(instance)
+    return models
@@ -1,7 +1,4 @@
-import uuid
-
 from fhir.resources.codeableconcept import CodeableConcept
-from fhir.resources.coding import Coding
 from fhir.resources.composition import CompositionSection
 from fhir.resources.contactpoint import ContactPoint
 from fhir.resources.organization import Organization
@@ -9,7 +6,12 @@ from fhir.resources.patient import Patient
 from fhir.resources.practitioner import Practitioner
 from fhir.resources.reference import Reference
 
+from fhir_converter.ids import new_id
+from fhir_converter.pool import pooled
+from fhir_converter.templates import identifier_type, profile_meta, snomed_codings
+
 
+@pooled("Patient", "patient_id")
 def get_patient_construct(patient_info):
     name = patient_info["name"]
     gender = patient_info["gender"]
@@ -19,15 +21,7 @@ def get_patient_construct(patient_info):
 
     identifier = [
         {
-            "type": {
-                "coding": [
-                    {
-                        "system": "http://terminology.hl7.org/CodeSystem/v2-0203",
-                        "code": "MR",
-                        "display": "Medical record number",
-                    }
-                ]
-            },
+            "type": identifier_type("MR"),
             "system": "https://healthid.ndhm.gov.in",
             "value": patient_id,
         }
@@ -36,15 +30,7 @@ def get_patient_construct(patient_info):
     if abha_no:
         identifier.append(
             {
-                "type": {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/v2-0203",
-                            "code": "AN",
-                            "display": "Account number",
-                        }
-                    ]
-                },
+                "type": identifier_type("AN"),
                 "system": "https://healthid.ndhm.gov.in",
                 "value": abha_no,
             }
@@ -59,17 +45,18 @@ def get_patient_construct(patient_info):
 
 
 
-    patient_ref_id = str(uuid.uuid4())
+    patient_ref_id = new_id()
     patient_construct = Patient.construct(
         id=patient_ref_id,
         name=[{"text": name}],
         gender=gender,
-        meta={"profile": ["https://nrces.in/ndhm/fhir/r4/StructureDefinition/Patient"]},
+        meta=profile_meta("Patient"),
         identifier=identifier,
         **extra_args
     )
     return patient_construct
 
+@pooled("Practitioner", "practitioner_id")
 def get_practitioner_construct(practitioner_info: dict):
     """
     :param practitioner_info:
@@ -87,22 +74,14 @@ def get_practitioner_construct(practitioner_info: dict):
             use="mobile"
         )
 
-    practitioner_ref_id = str(uuid.uuid4())
+    practitioner_ref_id = new_id()
     practitioner_construct = Practitioner.construct(
         id=practitioner_ref_id,
         name=[{"text": name}],
-        meta={"profile": ["https://nrces.in/ndhm/fhir/r4/StructureDefinition/Practitioner"]},
+        meta=profile_meta("Practitioner"),
         identifier=[
             {
-                "type": {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/v2-0203",
-                            "code": "PRN",
-                            "display": "Provider number",
-                        }
-                    ]
-                },
+                "type": identifier_type("PRN"),
                 "system": "https://healthid.ndhm.gov.in",
                 "value": practitioner_id,
             }
@@ -110,27 +89,20 @@ def get_practitioner_construct(practitioner_info: dict):
     )
     return practitioner_construct
 
+@pooled("Organization", "organization_id")
 def get_organization_construct(organization_info: dict):
     """
     :param practitioner_info:
     :return:
     """
-    organization_id = str(uuid.uuid4())
+    organization_id = new_id()
     organization_construct = Organization.construct(
         id=organization_id,
         name=[{"text": organization_info.get("name", "No Name")}],
-        meta={"profile": ["https://nrces.in/ndhm/fhir/r4/StructureDefinition/Practitioner"]},
+        meta=profile_meta("Practitioner"),
         identifier=[
             {
-                "type": {
-                    "coding": [
-                        {
-                            "system": "http://terminology.hl7.org/CodeSystem/v2-0203",
-                            "code": "PRN",
-                            "display": "Provider number",
-                        }
-                    ]
-                },
+                "type": identifier_type("PRN"),
                 "system": "https://facility.ndhm.gov.in",
                 "value": organization_info.get("organization_id", "1234567890"),
             }
@@ -143,11 +115,7 @@ def create_section(title, code, display, text, references):
         title=title,
         code=CodeableConcept.construct(
             text=text,
-            coding=[
-                Coding.construct(
-                    system="http://snomed.info/sct", code=code, display=display
-                )
-            ],
+            coding=snomed_codings(code, display),
         ),
         text=text,
         entry=[
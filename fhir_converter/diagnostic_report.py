@@ -1,5 +1,4 @@
 import datetime
-import uuid
 from pydantic.v1 import Field
 from fhir.resources import datatype
 from fhir.resources.R4B.diagnosticreport import DiagnosticReport
@@ -9,15 +8,21 @@ from fhir.resources.attachment import Attachment
 from fhir.resources.backboneelement import BackboneElement
 from fhir.resources.bundle import Bundle, BundleEntry
 from fhir.resources.codeableconcept import CodeableConcept
-from fhir.resources.coding import Coding
 from fhir.resources.composition import Composition
 from fhir.resources.medicationrequest import MedicationRequest
 from fhir.resources.observation import Observation
 from fhir.resources.quantity import Quantity
 from fhir.resources.reference import Reference
 
+from fhir_converter.attachment import attachment_data
+from fhir_converter.columnar import column_length, construct_many, is_columnar, parse_numbers, to_columns
 from fhir_converter.common import get_patient_construct, create_section, get_practitioner_construct, \
     get_organization_construct
+from fhir_converter.ids import new_id
+from fhir_converter.instrumentation import mark_stage
+from fhir_converter.pipeline import bundle_builder, converter
+from fhir_converter.serializer import serialize_bundle
+from fhir_converter.templates import snomed_concept
 
 
 class MediaType(datatype.DataType):
@@ -41,7 +46,40 @@ class MediaType(datatype.DataType):
         """
         return ["link"]
 
-def create_diagnostic_report(input_json: dict):
+def get_observation_constructs(columns: dict, subject, issued, performer):
+    """
+    Observations for columnar ``observations`` input, values and reference ranges are parsed as numbers.
+    :param columns: ``columnar.to_columns`` of the input observations
+    """
+    length = column_length(columns)
+    missing = [None] * length
+    names = columns.get("observation_name", missing)
+    units = columns.get("observation_unit", missing)
+    values, lows, highs = (
+        parse_numbers(columns.get(name, missing)) for name in ("observation_value", "ref_low", "ref_high")
+    )
+    codes = construct_many(CodeableConcept, ({"text": name} for name in names))
+    quantities = construct_many(Quantity, ({"value": value, "unit": unit} for value, unit in zip(values, units)))
+    return construct_many(Observation, (
+        {
+            "id": new_id(),
+            "status": "final",
+            "code": code,
+            "subject": subject,
+            "issued": issued,
+            "performer": performer,
+            "valueQuantity": quantity,
+            "referenceRange": [{
+                "low": {"value": low, "unit": unit},
+                "high": {"value": high, "unit": unit},
+            }],
+        }
+        for code, quantity, low, high, unit in zip(codes, quantities, lows, highs, units)
+    ))
+
+
+@bundle_builder("diagnostic_report")
+def build_diagnostic_report_bundle(input_json: dict):
     reference_data = []
 
     patient_info = input_json.get("patient", {})
@@ -50,6 +88,7 @@ def create_diagnostic_report(input_json: dict):
     practitioner = get_practitioner_construct(practitioner_info)
     performer_info = input_json.get("performer", {})
     performer = get_organization_construct(performer_info)
+    mark_stage("participants")
     performer_ref = Reference.construct(
         reference=f"urn:uuid:{performer.id}", display=performer.name[0]["text"]
     )
@@ -60,7 +99,7 @@ def create_diagnostic_report(input_json: dict):
         reference=f"urn:uuid:{patient.id}", display=patient.name[0]["text"]
     )
     service_request = ServiceRequest.construct(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         status="active",
         intent="original-order",
         code=CodeableConcept.construct(
@@ -71,23 +110,13 @@ def create_diagnostic_report(input_json: dict):
         occurrenceDateTime=input_json.get("request").get("request_date")
     )
     service_request_ref = Reference.construct(
-        reference=f"urn:uuid:/{service_request.id}", display=f"ServiceRequest/{service_request.code.text}"
+        reference=f"urn:uuid:{service_request.id}", display=f"ServiceRequest/{service_request.code.text}"
     )
 
     status = "final"
-    resource_type = CodeableConcept.construct(
-        text="Diagnostic Report- Lab",
-        coding=[
-            Coding.construct(
-                system="http://snomed.info/sct",
-                code="721981007",
-                display="Diagnostic studies report",
-            )
-        ],
-    )
+    resource_type = snomed_concept("Diagnostic Report- Lab", "721981007", "Diagnostic studies report")
     report_date = input_json.get("report_date")
 
-    reference_data.append(patient)
     reference_data.append(practitioner)
     reference_data.append(performer)
     reference_data.append(service_request)
@@ -96,43 +125,53 @@ def create_diagnostic_report(input_json: dict):
 
     observations = []
     observation_reports = input_json.get("observations", [])
-    for observation in observation_reports:
-        request_id = str(uuid.uuid4())
-        observation_construct = Observation.construct(
-            id=request_id,
-            status="final",
-            code=CodeableConcept.construct(
-                text=observation.get("observation_name")
-            ),
-            subject=patient_ref,
-            issued=report_date,
-            performer=performer_ref,
-            valueQuantity=Quantity.construct(
-                value=observation.get("observation_value"),
-                unit=observation.get("observation_unit")
-            ),
-            referenceRange=[{
-                "low": {
-                    "value": observation.get("ref_low"),
-                    "unit": observation.get("observation_unit")
-                },
-                "high": {
-                    "value": observation.get("ref_high"),
-                    "unit": observation.get("observation_unit")
-                }
-            }]
+    if is_columnar(observation_reports):
+        observations = get_observation_constructs(
+            to_columns(observation_reports), patient_ref, report_date, performer_ref
         )
-        observations.append(observation_construct)
-        reference_data.append(observation_construct)
+        reference_data.extend(observations)
+    else:
+        for observation in observation_reports:
+            request_id = new_id()
+            observation_construct = Observation.construct(
+                id=request_id,
+                status="final",
+                code=CodeableConcept.construct(
+                    text=observation.get("observation_name")
+                ),
+                subject=patient_ref,
+                issued=report_date,
+                performer=performer_ref,
+                valueQuantity=Quantity.construct(
+                    value=observation.get("observation_value"),
+                    unit=observation.get("observation_unit")
+                ),
+                referenceRange=[{
+                    "low": {
+                        "value": observation.get("ref_low"),
+                        "unit": observation.get("observation_unit")
+                    },
+                    "high": {
+                        "value": observation.get("ref_high"),
+                        "unit": observation.get("observation_unit")
+                    }
+                }]
+            )
+            observations.append(observation_construct)
+            reference_data.append(observation_construct)
+
+    observation_refs = [Reference.construct(
+        reference=f"urn:uuid:{observation.id}", display=f"Observation/{observation.code.text}"
+    ) for observation in observations]
 
-    request_id = str(uuid.uuid4())
+    request_id = new_id()
     if input_json.get("imaging"):
         link_media = Media.construct(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             status="completed",
             content=Attachment.construct(
                 contentType=input_json["imaging"]["type"],
-                data=input_json["imaging"]["data"]
+                data=attachment_data(input_json["imaging"])
             )
         )
         reference_data.append(link_media)
@@ -143,12 +182,14 @@ def create_diagnostic_report(input_json: dict):
         diagnostic_report_construct = DiagnosticReport.construct(
             id=request_id,
             status="final",
+            basedOn=[service_request_ref],
             code=CodeableConcept.construct(
                 text=input_json.get("report_name")
             ),
             subject=patient_ref,
             issued=report_date,
             performer=performer_ref,
+            result=observation_refs,
             media = [
                 MediaType.construct(
                     link=link_media_ref
@@ -169,14 +210,12 @@ def create_diagnostic_report(input_json: dict):
             requester=practitioner_ref,
             performer=performer_ref,
             results_interpretation=[practitioner_ref],
-            results=[Reference.construct(
-                reference=f"urn:uuid:/{observation.id}", display=f"Observation/{observation.code.text}"
-            ) for observation in observations],
+            result=observation_refs,
             conclusion=input_json.get("conclusion", "No Conclusion")
         )
     reference_data.append(diagnostic_report_construct)
 
-    composition_id = str(uuid.uuid4())
+    composition_id = new_id()
     prescription = Composition.construct(
         id=composition_id,
         type=resource_type,
@@ -207,7 +246,17 @@ def create_diagnostic_report(input_json: dict):
             BundleEntry.construct(fullUrl=f"urn:uuid:{resource.id}", resource=resource)
         )
 
-    return bundle.json(indent=2)
+    return bundle
+
+
+@converter("diagnostic_report")
+def create_diagnostic_report(input_json: dict, output="json"):
+    """
+    :param input_json:
+    :param output: one of ``serializer.output_formats``, indented JSON text by default
+    :return: the serialized FHIR bundle
+    """
+    return serialize_bundle(build_diagnostic_report_bundle(input_json), output)
 
 if __name__ == "__main__":
     input_json = {
@@ -1,8 +1,8 @@
+import base64
 from typing import List
-import uuid
+from fhir.resources.appointment import Appointment
 from fhir.resources.bundle import Bundle
 from fhir.resources.bundle import BundleEntry
-from fhir.resources.coding import Coding
 
 # from fhir.resources.coding import Coding
 from fhir.resources.patient import Patient
@@ -10,6 +10,9 @@ from fhir.resources.observation import Observation
 from fhir.resources.condition import Condition
 from fhir.resources.allergyintolerance import AllergyIntolerance
 from fhir.resources.procedure import Procedure
+from fhir.resources.medicationstatement import MedicationStatement
+from fhir.resources.servicerequest import ServiceRequest
+from fhir.resources.documentreference import DocumentReference
 from fhir.resources.composition import Composition
 from fhir.resources.familymemberhistory import FamilyMemberHistory
 from fhir.resources.familymemberhistory import FamilyMemberHistoryCondition
@@ -19,6 +22,12 @@ from fhir.resources.reference import Reference
 import json
 
 from fhir_converter.common import get_patient_construct, create_section
+from fhir_converter.ids import new_id
+from fhir_converter.instrumentation import mark_stage
+from fhir_converter.pipeline import bundle_builder, converter
+from fhir_converter.serializer import serialize_bundle
+from fhir_converter.templates import snomed_codings, snomed_concept
+from fhir_converter.terminology import text_codings
 
 # from .utils import discharge_summary_section_details as section_details
 
@@ -48,16 +57,10 @@ section_details = {
 
 
 def get_condition_construct(condition_info_text, subject):
-    condition_id = str(uuid.uuid4())
-
-    # TODO: apt snowmed code and descriptions to be extracted from the condition_info_text and added to the condition construct. below is a sample
-    coding = [
-        Coding.construct(
-            system="http://snomed.info/sct",
-            code="",
-            display="",
-        )
-    ]
+    condition_id = new_id()
+
+    # SNOMED code from the active terminology index, empty without one
+    coding = text_codings(condition_info_text)
 
     condition_construct = Condition.construct(
         id=condition_id,
@@ -69,21 +72,15 @@ def get_condition_construct(condition_info_text, subject):
             "status": "generated",
             "div": f'<div xmlns="http://www.w3.org/1999/xhtml"><p>{condition_info_text}</p></div>',
         },
-        subject=Reference.construct(reference=f"urn:uuid:/{subject.id}"),
+        subject=Reference.construct(reference=f"urn:uuid:{subject.id}"),
     )
     return condition_construct
 
 
 def get_observation_construct(observation_info_text, subject):
-    observation_id = str(uuid.uuid4())
+    observation_id = new_id()
 
-    coding = [
-        Coding.construct(
-            system="http://snomed.info/sct",
-            code="",
-            display="",
-        )
-    ]
+    coding = text_codings(observation_info_text)
 
     observation_construct = Observation.construct(
         id=observation_id,
@@ -102,19 +99,13 @@ def get_observation_construct(observation_info_text, subject):
 
 
 def get_allergy_intolerance_construct(allergy_info_text, subject):
-    allergy_id = str(uuid.uuid4())
+    allergy_id = new_id()
 
     allergy_construct = AllergyIntolerance.construct(
         id=allergy_id,
         code=CodeableConcept.construct(
             text=allergy_info_text,
-            coding=[
-                Coding.construct(
-                    system="http://snomed.info/sct",
-                    code="",
-                    display="",
-                )
-            ],
+            coding=text_codings(allergy_info_text),
         ),
         text={
             "status": "generated",
@@ -126,19 +117,13 @@ def get_allergy_intolerance_construct(allergy_info_text, subject):
 
 
 def get_procedure_construct(procedure_info_text, subject):
-    procedure_id = str(uuid.uuid4())
+    procedure_id = new_id()
 
     procedure_construct = Procedure.construct(
         id=procedure_id,
         code=CodeableConcept.construct(
             text=procedure_info_text,
-            coding=[
-                Coding.construct(
-                    system="http://snomed.info/sct",
-                    code="",
-                    display="",
-                )
-            ],
+            coding=text_codings(procedure_info_text),
         ),
         text={
             "status": "generated",
@@ -151,7 +136,7 @@ def get_procedure_construct(procedure_info_text, subject):
 
 
 def get_familymemberhistory_construct(familymemberhistory_info_text, subject):
-    id = str(uuid.uuid4())
+    id = new_id()
 
     familymemberhistory_construct = FamilyMemberHistory.construct(
         id=id,
@@ -159,57 +144,128 @@ def get_familymemberhistory_construct(familymemberhistory_info_text, subject):
         patient=Reference.construct(reference=f"urn:uuid:{subject.id}"),
         relationship=CodeableConcept.construct(
             text=familymemberhistory_info_text,
-            coding=[
-                Coding.construct(
-                    system="http://snomed.info/sct",
-                    code="",
-                    display="",
-                )
-            ],
+            coding=snomed_codings("", ""),
         ),
         condition=[
             FamilyMemberHistoryCondition.construct(
                 code=CodeableConcept.construct(
                     text=familymemberhistory_info_text,
-                    coding=[
-                        Coding.construct(
-                            system="http://snomed.info/sct",
-                            code="",
-                            display="",
-                        )
-                    ],
+                    coding=text_codings(familymemberhistory_info_text),
                 ),
-                note=familymemberhistory_info_text,
+                note=[{"text": familymemberhistory_info_text}],
             )
         ],
     )
+    return familymemberhistory_construct
+
+
+def get_service_request_construct(service_request_info_text, subject):
+    service_request_construct = ServiceRequest.construct(
+        id=new_id(),
+        status="active",  # draft | active | on-hold | revoked | completed | entered-in-error | unknown
+        intent="order",
+        code={
+            "concept": CodeableConcept.construct(
+                text=service_request_info_text,
+                coding=text_codings(service_request_info_text),
+            )
+        },
+        text={
+            "status": "generated",
+            "div": f'<div xmlns="http://www.w3.org/1999/xhtml"><p>{service_request_info_text}</p></div>',
+        },
+        subject=Reference.construct(reference=f"urn:uuid:{subject.id}"),
+    )
+    return service_request_construct
+
+
+def get_medication_statement_construct(medication_info_text, subject):
+    medication_statement_construct = MedicationStatement.construct(
+        id=new_id(),
+        status="recorded",  # recorded | entered-in-error | draft
+        medication={"concept": CodeableConcept.construct(text=medication_info_text)},
+        text={
+            "status": "generated",
+            "div": f'<div xmlns="http://www.w3.org/1999/xhtml"><p>{medication_info_text}</p></div>',
+        },
+        subject=Reference.construct(reference=f"urn:uuid:{subject.id}"),
+    )
+    return medication_statement_construct
+
+
+def get_appointment_construct(follow_up_info_text, subject):
+    subject_ref = Reference.construct(reference=f"urn:uuid:{subject.id}")
+    appointment_construct = Appointment.construct(
+        id=new_id(),
+        status="proposed",  # proposed | pending | booked | arrived | fulfilled | cancelled | noshow | ...
+        description=follow_up_info_text,
+        text={
+            "status": "generated",
+            "div": f'<div xmlns="http://www.w3.org/1999/xhtml"><p>{follow_up_info_text}</p></div>',
+        },
+        subject=subject_ref,
+        participant=[{"actor": subject_ref, "status": "needs-action"}],
+    )
+    return appointment_construct
 
 
-def create_fhir_bundle_discharge_summary(input_json):
+def get_document_reference_construct(document_info_text, subject):
+    document_reference_construct = DocumentReference.construct(
+        id=new_id(),
+        status="current",  # current | superseded | entered-in-error
+        description=document_info_text,
+        subject=Reference.construct(reference=f"urn:uuid:{subject.id}"),
+        content=[{
+            "attachment": {
+                "contentType": "text/plain",
+                "data": base64.b64encode(document_info_text.encode("utf-8")).decode("ascii"),
+            }
+        }],
+    )
+    return document_reference_construct
+
+
+# input key -> builder of the section entry, called with the section text and the patient
+section_builders = {
+    "chief_complaints": get_condition_construct,
+    "physical_examination": get_observation_construct,
+    "allergies": get_allergy_intolerance_construct,
+    "medical_history": get_condition_construct,
+    "family_history": get_familymemberhistory_construct,
+    "investigation_advice": get_service_request_construct,
+    "medications": get_medication_statement_construct,
+    "follow_up": get_appointment_construct,
+    "procedure": get_procedure_construct,
+    "referral": get_service_request_construct,
+    "other_observations": get_observation_construct,
+    "document_reference": get_document_reference_construct,
+}
+
+# (input key, title, code, display, entry builder) in section order, a conversion is one pass over it
+section_plan = [(key, *details, section_builders[key]) for key, details in section_details.items()]
+
+
+@bundle_builder("discharge_summary")
+def build_discharge_summary_bundle(input_json):
     patient_info = input_json.get("patient", {})
     meta_data = input_json.get("meta", {})
     input_section = input_json.get("section", {})
 
     patient = get_patient_construct(patient_info)
-
-    section_config = {}
-
-    # chief complaints section
-    if input_section.get("chief_complaints"):
-        chief_complaints = get_condition_construct(
-            input_section.get("chief_complaints", ""), patient
-        )
-        section_config["chief_complaints"] = [chief_complaints]
-
-    # physical examination section
-    if input_section.get("physical_examination"):
-        physical_examination = get_condition_construct(
-            input_section.get("physical_examination", ""), patient
-        )
-        section_config["physical_examination"] = [physical_examination]
+    mark_stage("participants")
+
+    sections = []
+    section_resources = []
+    for key, title, code, display, build in section_plan:
+        text = input_section.get(key)
+        if not text:
+            continue
+        resource = build(text, patient)
+        section_resources.append(resource)
+        sections.append(create_section(title, code, display, text, [resource]))
 
     # final composition
-    composition_id = str(uuid.uuid4())
+    composition_id = new_id()
     composition = Composition.construct(
         id=composition_id,
         title="Discharge Summary",
@@ -217,39 +273,13 @@ def create_fhir_bundle_discharge_summary(input_json):
         status=meta_data.get(
             "status", ""
         ),  # final | amended | entered-in-error | preliminary,
-        type=CodeableConcept.construct(
-            text="Discharge Summary",
-            coding=[
-                Coding.construct(
-                    system="http://snomed.info/sct",
-                    code="371530004",
-                    display="Clinical consultation report",
-                )
-            ],
-        ),
+        type=snomed_concept("Discharge Summary", "371530004", "Clinical consultation report"),
         subject=Reference.construct(
             reference=f"urn:uuid:{patient.id}", display=patient.name[0]["text"]
         ),
-        section=[
-            create_section(
-                *section_details.get(title),
-                input_json.get(title),
-                section_config.get(title),
-            )
-            for title in section_config
-        ],
+        section=sections,
     )
 
-    unique_resources = []
-    unique_resources_id = set()
-
-    section_resources = section_config.items()
-    for _, resources in section_resources:
-        for resource in resources:
-            if resource.id not in unique_resources_id:
-                unique_resources.append(resource)
-                unique_resources_id.add(resource.id)
-
     bundle = Bundle.construct()
     bundle.type = "collection"
     bundle.entry = [
@@ -258,12 +288,22 @@ def create_fhir_bundle_discharge_summary(input_json):
         ),
         BundleEntry.construct(fullUrl=f"urn:uuid:{patient.id}", resource=patient),
     ]
-    for resource in unique_resources:
+    for resource in section_resources:
         bundle.entry.append(
             BundleEntry.construct(fullUrl=f"urn:uuid:{resource.id}", resource=resource)
         )
 
-    return bundle.json(indent=2)
+    return bundle
+
+
+@converter("discharge_summary")
+def create_fhir_bundle_discharge_summary(input_json, output="json"):
+    """
+    :param input_json:
+    :param output: one of ``serializer.output_formats``, indented JSON text by default
+    :return: the serialized FHIR bundle
+    """
+    return serialize_bundle(build_discharge_summary_bundle(input_json), output)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import contextlib
+import contextvars
+import functools
+import hashlib
+import itertools
+import json
+import os
+import uuid
+
+# random: uuid4 per resource (default), counter: uuid of the prefix and the process with a process wide counter in the
+# last 48 bits, deterministic: uuid derived from the document type, the input content and the position of the resource
+id_modes = ("random", "counter", "deterministic")
+
+_default_mode = ("random", None)
+_mode = contextvars.ContextVar("fhir_converter_id_mode", default=None)
+_generator = contextvars.ContextVar("fhir_converter_id_generator", default=None)
+
+_counter = itertools.count()
+# distinguishes the counters of processes, e.g. of batch workers, given the same prefix
+_process_token = uuid.uuid4().hex[:12]
+
+_namespace = uuid.UUID("3f0b3c1e-7d56-5a4a-9a0e-5f1d2c6b8e47")
+
+
+def _reset_counter():
+    global _counter, _process_token
+    _counter = itertools.count()
+    _process_token = uuid.uuid4().hex[:12]
+
+
+# forked batch workers must not hand out the ids of their parent
+os.register_at_fork(after_in_child=_reset_counter)
+
+
+def _random_id():
+    return str(uuid.uuid4())
+
+
+def _check_mode(mode):
+    if mode not in id_modes:
+        raise ValueError(f"Unknown id mode {mode!r}, expected one of {id_modes}")
+
+
+def set_id_mode(mode: str, prefix: str = None):
+    """
+    Set the process wide id mode used by the converters.
+    :param mode: one of ``id_modes``
+    :param prefix: run name hashed into the ``counter`` ids, together with a random per-process token
+    """
+    global _default_mode
+    _check_mode(mode)
+    _default_mode = (mode, prefix)
+
+
+def get_id_mode() -> str:
+    """
+    :return: the id mode active in the current thread / task
+    """
+    return (_mode.get() or _default_mode)[0]
+
+
+@contextlib.contextmanager
+def id_mode(mode: str, prefix: str = None):
+    """
+    Use another id mode for the conversions inside the ``with`` block (current thread / task only).
+    :param mode: one of ``id_modes``
+    :param prefix: run name hashed into the ``counter`` ids, together with a random per-process token
+    """
+    _check_mode(mode)
+    token = _mode.set((mode, prefix))
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def input_digest(document_type: str, input_json: dict) -> str:
+    """
+    Hash of the canonical JSON form of an input, key order and whitespace do not change it.
+    :param document_type: one of ``registry.document_converters``
+    :param input_json: converter input
+    :return: sha256 hex digest
+    """
+    canonical = json.dumps(input_json, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    digest = hashlib.sha256(document_type.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=64)
+def _counter_seed(prefix, process_token):
+    # first 80 bits of a uuid5, ``fullUrl`` must stay a valid ``urn:uuid``
+    return str(uuid.uuid5(_namespace, f"counter\0{prefix or ''}\0{process_token}"))[:24]
+
+
+def id_generator(document_type: str, input_json: dict):
+    """
+    Create the id generator for one conversion according to the active id mode.
+    :param document_type: one of ``registry.document_converters``
+    :param input_json: converter input
+    :return: callable returning a new resource id on each call
+    """
+    mode, prefix = _mode.get() or _default_mode
+    if mode == "counter":
+        seed = _counter_seed(prefix, _process_token)
+        return lambda: f"{seed}{next(_counter) & 0xFFFFFFFFFFFF:012x}"
+    if mode == "deterministic":
+        # uuid5 of the input with the last 48 bits replaced by the position of the resource
+        seed = str(uuid.uuid5(_namespace, input_digest(document_type, input_json)))[:24]
+        positions = itertools.count()
+        return lambda: f"{seed}{next(positions):012x}"
+    return _random_id
+
+
+@contextlib.contextmanager
+def id_scope(document_type: str, input_json: dict):
+    """
+    Route the ``new_id`` calls made while converting ``input_json`` to a generator for that conversion.
+    """
+    token = _generator.set(id_generator(document_type, input_json))
+    try:
+        yield
+    finally:
+        _generator.reset(token)
+
+
+def new_id() -> str:
+    """
+    :return: id for a new resource, a random uuid4 outside of a conversion
+    """
+    generator = _generator.get()
+    return generator() if generator is not None else str(uuid.uuid4())
@@ -0,0 +1,232 @@
+"""
+Opt-in per-conversion instrumentation.
+
+Every ``create_*`` call produces a ``ConversionRecord`` with the time spent per stage (``participants``,
+``resources``, ``serialize``), the number of resources per type and the output size, as soon as a hook is
+registered or an ``instrument()`` block is active. Without either, the converters only pay for a couple of
+attribute lookups.
+
+    records_seen = []
+    add_hook(records_seen.append)
+
+    with instrument() as records:
+        create_prescription(input_json)
+    print(records[0].stages)
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+stages = ("participants", "resources", "serialize")
+
+_hooks: List[Callable] = []
+_collector = contextvars.ContextVar("fhir_converter_instrumentation_collector", default=None)
+_current = contextvars.ContextVar("fhir_converter_instrumentation_record", default=None)
+
+
+class ConversionRecord:
+    __slots__ = ("document_type", "stages", "resource_counts", "output_bytes", "duration", "error_type", "_mark")
+
+    def __init__(self, document_type: str):
+        self.document_type = document_type
+        self.stages: Dict[str, float] = {}
+        self.resource_counts: Dict[str, int] = {}
+        self.output_bytes: Optional[int] = None
+        self.duration: Optional[float] = None
+        self.error_type: Optional[str] = None
+        self._mark = time.perf_counter()
+
+    def mark(self, stage: str):
+        """
+        Attribute the time since the previous mark to ``stage``.
+        """
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def __repr__(self):
+        return (
+            f"ConversionRecord(document_type={self.document_type!r}, stages={self.stages!r}, "
+            f"resource_counts={self.resource_counts!r}, output_bytes={self.output_bytes!r}, "
+            f"duration={self.duration!r}, error_type={self.error_type!r})"
+        )
+
+
+def add_hook(hook: Callable[[ConversionRecord], None]):
+    """
+    Call ``hook(record)`` after every conversion, in the converting thread.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[ConversionRecord], None]):
+    _hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def instrument():
+    """
+    Collect the records of the conversions inside the ``with`` block (current thread / task).
+    :return: list the records are appended to
+    """
+    records = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def is_enabled() -> bool:
+    return bool(_hooks) or _collector.get() is not None
+
+
+def start(document_type: str) -> Optional[ConversionRecord]:
+    """
+    :return: the record for a new conversion, ``None`` when instrumentation is disabled or a record is open already
+    """
+    if not _hooks and _collector.get() is None or _current.get() is not None:
+        return None
+    return ConversionRecord(document_type)
+
+
+@contextlib.contextmanager
+def recording(record: ConversionRecord):
+    token = _current.set(record)
+    try:
+        yield record
+    finally:
+        _current.reset(token)
+
+
+def mark_stage(stage: str):
+    """
+    Attribute the time since the previous mark of the current conversion to ``stage``, no-op when not recording.
+    """
+    record = _current.get()
+    if record is not None:
+        record.mark(stage)
+
+
+def count_resources(bundle):
+    record = _current.get()
+    if record is not None:
+        record.resource_counts = dict(Counter(entry.resource.resource_type for entry in bundle.entry or []))
+
+
+def output_size(result) -> Optional[int]:
+    if isinstance(result, bytes):
+        return len(result)
+    if isinstance(result, str):
+        return len(result) if result.isascii() else len(result.encode("utf-8"))
+    return None
+
+
+def finish(record: ConversionRecord, started: float):
+    record.duration = time.perf_counter() - started
+    collector = _collector.get()
+    if collector is not None:
+        collector.append(record)
+    for hook in list(_hooks):
+        try:
+            hook(record)
+        except Exception:
+            logger.exception("instrumentation hook %r failed", hook)
+
+
+def logging_hook(log: logging.Logger = logger, level: int = logging.INFO) -> Callable[[ConversionRecord], None]:
+    """
+    :return: hook writing one log line per conversion
+    """
+    def hook(record):
+        stage_times = " ".join(f"{stage}={seconds * 1000:.2f}ms" for stage, seconds in record.stages.items())
+        log.log(
+            level,
+            "converted %s in %.2fms (%s) resources=%s output_bytes=%s%s",
+            record.document_type,
+            record.duration * 1000,
+            stage_times,
+            sum(record.resource_counts.values()),
+            record.output_bytes,
+            f" error={record.error_type}" if record.error_type else "",
+        )
+
+    return hook
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class PrometheusHook:
+    """
+    Hook aggregating records into counters rendered in the Prometheus text exposition format.
+
+        hook = PrometheusHook()
+        add_hook(hook)
+        ...
+        print(hook.exposition())
+    """
+
+    def __init__(self, prefix: str = "fhir_converter"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._conversions = Counter()
+        self._errors = Counter()
+        self._stage_seconds = defaultdict(float)
+        self._resources = Counter()
+        self._output_bytes = Counter()
+
+    def __call__(self, record: ConversionRecord):
+        with self._lock:
+            self._conversions[record.document_type] += 1
+            if record.error_type:
+                self._errors[(record.document_type, record.error_type)] += 1
+            for stage, seconds in record.stages.items():
+                self._stage_seconds[(record.document_type, stage)] += seconds
+            for resource_type, count in record.resource_counts.items():
+                self._resources[(record.document_type, resource_type)] += count
+            if record.output_bytes is not None:
+                self._output_bytes[record.document_type] += record.output_bytes
+
+    def exposition(self) -> str:
+        prefix = self.prefix
+        with self._lock:
+            metrics = [
+                ("conversions_total", "Conversions", [({"document_type": document_type}, value)
+                                                      for document_type, value in self._conversions.items()]),
+                ("conversion_errors_total", "Failed conversions", [
+                    ({"document_type": document_type, "error_type": error_type}, value)
+                    for (document_type, error_type), value in self._errors.items()
+                ]),
+                ("conversion_stage_seconds_total", "Time spent per conversion stage", [
+                    ({"document_type": document_type, "stage": stage}, value)
+                    for (document_type, stage), value in self._stage_seconds.items()
+                ]),
+                ("resources_total", "Resources converted", [
+                    ({"document_type": document_type, "resource_type": resource_type}, value)
+                    for (document_type, resource_type), value in self._resources.items()
+                ]),
+                ("output_bytes_total", "Serialized output size", [({"document_type": document_type}, value)
+                                                                 for document_type, value in self._output_bytes.items()]),
+            ]
+        lines = []
+        for name, help_text, samples in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.extend(f"{prefix}_{name}{format_labels(labels)} {value}" for labels, value in sorted(
+                samples, key=lambda sample: sorted(sample[0].items())
+            ))
+        return "\n".join(lines) + "\n"
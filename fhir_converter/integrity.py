@@ -0,0 +1,227 @@
+"""
+Bundle reference integrity: every ``Reference.reference`` resolves to an entry, ``fullUrl`` values are unique and
+every entry is reachable from the first one (the Composition) or from another Composition (packed bundles). One pass
+builds the ``fullUrl`` index, a second one walks the references, so the check is linear in the size of the bundle.
+
+As a post-step of every converter:
+
+    integrity.set_check_mode("raise")  # or "warn", or `with integrity.check_mode("raise"):`
+
+As a batch tool over NDJSON files with one bundle per line:
+
+    python -m fhir_converter.integrity bundles.ndjson more-bundles.ndjson
+"""
+import argparse
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import sys
+from collections import deque
+from typing import List, NamedTuple, Optional
+
+from fhir_converter.serializer import loads
+
+logger = logging.getLogger(__name__)
+
+check_modes = ("off", "warn", "raise")
+
+_check_mode = "off"
+_context_check_mode = contextvars.ContextVar("fhir_converter_integrity_check_mode", default=None)
+
+
+class IntegrityIssue(NamedTuple):
+    # "unresolved", "duplicate" or "orphan"
+    kind: str
+    # entry position in the bundle
+    entry: int
+    detail: str
+
+
+class IntegrityError(ValueError):
+    def __init__(self, document_type: str, issues: List[IntegrityIssue]):
+        self.document_type = document_type
+        self.issues = issues
+        summary = "; ".join(f"entry {issue.entry}: {issue.detail}" for issue in issues[:5])
+        more = f" (and {len(issues) - 5} more)" if len(issues) > 5 else ""
+        super().__init__(f"{document_type} bundle has {len(issues)} integrity issues: {summary}{more}")
+
+
+def _field(value, name):
+    return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+
+
+def _resource_type(resource):
+    return resource.get("resourceType") if isinstance(resource, dict) else resource.resource_type
+
+
+@functools.lru_cache(maxsize=None)
+def _element_fields(model) -> tuple:
+    # the fields the model serializes, values construct() accepted for unknown fields are not part of the output
+    aliases = model.get_alias_mapping()
+    return tuple(aliases[name] for name in model.elements_sequence())
+
+
+def _iter_references(value):
+    """
+    :param value: resource as a model or dict
+    :return: iterator of the ``reference`` strings anywhere inside
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            items = value.items()
+        elif hasattr(value, "__fields_set__"):
+            fields = value.__dict__
+            items = [(name, fields.get(name)) for name in _element_fields(type(value))]
+        elif isinstance(value, list):
+            stack.extend(value)
+            continue
+        else:
+            continue
+        for key, item in items:
+            if key == "reference" and isinstance(item, str):
+                yield item
+            elif item is not None and not isinstance(item, (str, int, float)):
+                stack.append(item)
+
+
+def check_bundle(bundle) -> List[IntegrityIssue]:
+    """
+    :param bundle: ``Bundle`` model or bundle dict
+    :return: integrity issues, empty for a consistent bundle
+    """
+    entries = _field(bundle, "entry") or []
+    issues = []
+    index = {}
+    for position, entry in enumerate(entries):
+        full_url = _field(entry, "fullUrl")
+        if full_url in index:
+            detail = f"fullUrl {full_url} is used by entry {index[full_url]}"
+            issues.append(IntegrityIssue("duplicate", position, detail))
+        elif full_url:
+            index[full_url] = position
+        resource = _field(entry, "resource")
+        if resource is not None and _field(resource, "id"):
+            # target of relative Type/id references
+            index.setdefault(f"{_resource_type(resource)}/{_field(resource, 'id')}", position)
+
+    referenced = [[] for _ in entries]
+    for position, entry in enumerate(entries):
+        for reference in _iter_references(_field(entry, "resource")):
+            if reference.startswith("#"):
+                continue
+            target = index.get(reference)
+            if target is None and "/" in reference and not reference.startswith("urn:"):
+                # absolute URL of a resource whose entry carries a relative or different fullUrl
+                target = index.get("/".join(reference.rsplit("/", 2)[-2:]))
+            if target is None:
+                issues.append(IntegrityIssue("unresolved", position, f"reference {reference} matches no entry"))
+            else:
+                referenced[position].append(target)
+
+    if entries:
+        reachable = [False] * len(entries)
+        roots = [0] + [
+            position for position, entry in enumerate(entries)
+            if position and _field(entry, "resource") is not None
+            and _resource_type(_field(entry, "resource")) == "Composition"
+        ]
+        for root in roots:
+            reachable[root] = True
+        queue = deque(roots)
+        while queue:
+            for target in referenced[queue.popleft()]:
+                if not reachable[target]:
+                    reachable[target] = True
+                    queue.append(target)
+        for position, seen in enumerate(reachable):
+            if not seen:
+                full_url = _field(entries[position], "fullUrl")
+                detail = f"entry {full_url} is not referenced from a Composition"
+                issues.append(IntegrityIssue("orphan", position, detail))
+    return issues
+
+
+def set_check_mode(mode: str):
+    """
+    Check every built bundle: ``off``, ``warn`` (log the issues) or ``raise`` (``IntegrityError``).
+    """
+    global _check_mode
+    if mode not in check_modes:
+        raise ValueError(f"Unknown integrity check mode {mode!r}, expected one of {check_modes}")
+    _check_mode = mode
+
+
+def get_check_mode() -> str:
+    return _context_check_mode.get() or _check_mode
+
+
+@contextlib.contextmanager
+def check_mode(mode: str):
+    """
+    Check mode for the conversions inside the ``with`` block (current thread / task).
+    """
+    if mode not in check_modes:
+        raise ValueError(f"Unknown integrity check mode {mode!r}, expected one of {check_modes}")
+    token = _context_check_mode.set(mode)
+    try:
+        yield
+    finally:
+        _context_check_mode.reset(token)
+
+
+def post_check(document_type: str, bundle):
+    """
+    Converter post-step, checks ``bundle`` according to the active check mode.
+    """
+    mode = get_check_mode()
+    if mode == "off":
+        return
+    issues = check_bundle(bundle)
+    if not issues:
+        return
+    if mode == "raise":
+        raise IntegrityError(document_type, issues)
+    logger.warning("%s", IntegrityError(document_type, issues))
+
+
+def check_ndjson(fp, name: str = "-", out=None) -> int:
+    """
+    Check one bundle per line, write one JSON line per inconsistent bundle to ``out``.
+    :return: number of inconsistent bundles
+    """
+    out = out or sys.stdout
+    failed = 0
+    for line_number, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        try:
+            issues = [issue._asdict() for issue in check_bundle(loads(line))]
+        except ValueError as e:
+            issues = [{"kind": "invalid_json", "entry": None, "detail": str(e)}]
+        if issues:
+            failed += 1
+            out.write(json.dumps({"file": name, "line": line_number, "issues": issues}) + "\n")
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the reference integrity of NDJSON bundle files")
+    parser.add_argument("files", nargs="*", default=["-"], help="NDJSON files, - reads stdin")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for name in args.files:
+        if name == "-":
+            failed += check_ndjson(sys.stdin.buffer, name)
+        else:
+            with open(name, "rb") as fp:
+                failed += check_ndjson(fp, name)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Conversion metrics: conversion counts, error counts by exception type and latency / output size histograms per
+document type, rendered in the Prometheus text exposition format.
+
+    from fhir_converter import metrics
+
+    metrics.enable()  # observe every conversion of this process in metrics.default_registry
+    ...
+    print(metrics.default_registry.exposition())
+
+Every thread records into its own shard, so observing a conversion takes no lock; the shards are merged when the
+registry is scraped. Other processes contribute through ``snapshot()`` / ``merge()``, the conversion server ships
+the record of every conversion from its workers and serves the merged view on ``GET /metrics``.
+"""
+import bisect
+import os
+import threading
+import weakref
+from typing import Optional, Sequence
+
+from fhir_converter import instrumentation
+from fhir_converter.instrumentation import ConversionRecord, format_labels
+
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+size_buckets = tuple(1024 * 4 ** power for power in range(10))  # 1 KiB .. 256 MiB
+
+_registries = weakref.WeakSet()
+
+
+class _Shard:
+    __slots__ = ("conversions", "errors", "duration", "output_bytes")
+
+    def __init__(self):
+        # document type -> conversions, failed ones included
+        self.conversions = {}
+        # (document type, exception type) -> failed conversions
+        self.errors = {}
+        # document type -> per bucket counts, +Inf count, sum
+        self.duration = {}
+        self.output_bytes = {}
+
+    def merge(self, other: dict):
+        for name in ("conversions", "errors"):
+            counters = getattr(self, name)
+            for key, value in other[name].items():
+                counters[key] = counters.get(key, 0) + value
+        for name in ("duration", "output_bytes"):
+            histograms = getattr(self, name)
+            for document_type, values in other[name].items():
+                histogram = histograms.get(document_type)
+                if histogram is None:
+                    histograms[document_type] = list(values)
+                else:
+                    for position, value in enumerate(values):
+                        histogram[position] += value
+
+    def snapshot(self) -> dict:
+        # plain copies, the owning thread keeps writing into the shard
+        return {
+            "conversions": self.conversions.copy(),
+            "errors": self.errors.copy(),
+            "duration": {document_type: list(values) for document_type, values in self.duration.copy().items()},
+            "output_bytes": {document_type: list(values) for document_type, values in self.output_bytes.copy().items()},
+        }
+
+
+def _observe(histograms: dict, document_type: str, buckets: Sequence[float], value: float):
+    histogram = histograms.get(document_type)
+    if histogram is None:
+        histogram = histograms[document_type] = [0] * (len(buckets) + 1) + [0.0]
+    histogram[bisect.bisect_left(buckets, value)] += 1
+    histogram[-1] += value
+
+
+class MetricsRegistry:
+    """
+    Conversion metrics of one process, also usable as an ``instrumentation`` hook.
+    """
+
+    def __init__(
+        self,
+        prefix: str = "fhir_converter",
+        latency_buckets: Sequence[float] = latency_buckets,
+        size_buckets: Sequence[float] = size_buckets,
+    ):
+        """
+        :param prefix: metric name prefix
+        :param latency_buckets: upper bounds of the conversion duration buckets in seconds
+        :param size_buckets: upper bounds of the output size buckets in bytes
+        """
+        self.prefix = prefix
+        self.latency_buckets = tuple(sorted(latency_buckets))
+        self.size_buckets = tuple(sorted(size_buckets))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        # shards of finished threads and merged snapshots of other processes
+        self._retired = _Shard()
+        _registries.add(self)
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._retire_finished()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_finished(self):
+        # a finished thread no longer writes into its shard, fold it so that short-lived threads do not pile up
+        for thread, shard in [item for item in self._shards if not item[0].is_alive()]:
+            self._retired.merge(shard.snapshot())
+            self._shards.remove((thread, shard))
+
+    def observe(self, record: ConversionRecord):
+        """
+        Count a conversion and add it to the histograms, failed conversions included.
+        """
+        shard = self._shard()
+        document_type = record.document_type
+        shard.conversions[document_type] = shard.conversions.get(document_type, 0) + 1
+        if record.error_type:
+            key = (document_type, record.error_type)
+            shard.errors[key] = shard.errors.get(key, 0) + 1
+        if record.duration is not None:
+            _observe(shard.duration, document_type, self.latency_buckets, record.duration)
+        if record.output_bytes is not None:
+            _observe(shard.output_bytes, document_type, self.size_buckets, record.output_bytes)
+
+    __call__ = observe
+
+    def snapshot(self) -> dict:
+        """
+        :return: picklable merged state of all threads, pass it to ``merge`` of another process's registry
+        """
+        with self._lock:
+            self._retire_finished()
+            merged = _Shard()
+            merged.merge(self._retired.snapshot())
+            for _, shard in self._shards:
+                merged.merge(shard.snapshot())
+        return merged.snapshot()
+
+    def merge(self, snapshot: dict):
+        """
+        Add the ``snapshot()`` of another registry with the same buckets, e.g. of a worker process.
+        """
+        with self._lock:
+            self._retired.merge(snapshot)
+
+    def reset(self):
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._retired = _Shard()
+
+    def exposition(self) -> str:
+        """
+        :return: the counters and histograms in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        prefix = self.prefix
+        lines = _counter_lines(f"{prefix}_conversions_total", "Conversions", [
+            ({"document_type": document_type}, value) for document_type, value in snapshot["conversions"].items()
+        ])
+        lines += _counter_lines(f"{prefix}_conversion_errors_total", "Failed conversions by exception type", [
+            ({"document_type": document_type, "exception_type": exception_type}, value)
+            for (document_type, exception_type), value in snapshot["errors"].items()
+        ])
+        lines += _histogram_lines(
+            f"{prefix}_conversion_duration_seconds", "Conversion latency", self.latency_buckets, snapshot["duration"]
+        )
+        lines += _histogram_lines(
+            f"{prefix}_output_bytes", "Serialized bundle size", self.size_buckets, snapshot["output_bytes"]
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _counter_lines(name, help_text, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for labels, value in sorted(samples, key=lambda sample: sorted(sample[0].items())):
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    return lines
+
+
+def _histogram_lines(name, help_text, buckets, histograms):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for document_type, values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip([*map(repr, map(float, buckets)), "+Inf"], values):
+            cumulative += count
+            labels = format_labels({"document_type": document_type, "le": bound})
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = format_labels({"document_type": document_type})
+        lines.append(f"{name}_sum{labels} {values[-1]}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+    return lines
+
+
+def _reset_after_fork():
+    # a forked worker starts with the parent's counts, they would be counted twice when merged
+    for registry in list(_registries):
+        registry._lock = threading.Lock()
+        registry.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+default_registry = MetricsRegistry()
+
+
+def enable(registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """
+    Observe every conversion of this process in ``registry``, ``default_registry`` by default.
+    """
+    registry = registry or default_registry
+    instrumentation.add_hook(registry)
+    return registry
+
+
+def disable(registry: Optional[MetricsRegistry] = None):
+    instrumentation.remove_hook(registry or default_registry)
@@ -1,36 +1,49 @@
-import uuid
-
 from fhir.resources.bundle import Bundle
 from fhir.resources.bundle import BundleEntry
-from fhir.resources.coding import Coding
 from fhir.resources.composition import Composition
 from fhir.resources.composition import CompositionSection
-from fhir.resources.codeableconcept import CodeableConcept
 from fhir.resources.encounter import Encounter
 from fhir.resources.reference import Reference
 
 from fhir_converter.common import get_patient_construct, get_practitioner_construct
+from fhir_converter.ids import new_id
+from fhir_converter.instrumentation import mark_stage
+from fhir_converter.pipeline import bundle_builder, converter
+from fhir_converter.serializer import serialize_bundle
+from fhir_converter.templates import encounter_class, snomed_concept
+
+section_details = {
+    "Chief Complaints": ("422843007", "Chief complaint section"),
+    "Physical Examination": ("422843007", "Physical Examination section"),
+    "Allergies": ("722446000", "Allergy record"),
+    "Medical History": ("371529009", "History and physical report"),
+    "Family History": ("422432008", "Family history section"),
+    "Investigation Advice": ("721963009", "Order document"),
+    "Medications": ("721912009", "Medication summary document"),
+    "Follow Up": ("390906007", "Follow-up encounter"),
+    "Procedure": ("371525003", "Procedure report"),
+    "Referral": ("306206005", "Clinical procedure report"),
+    "Other Observations": ("404684003", "Clinical finding"),
+    "Document Reference": ("371530004", "Clinical consultation report"),
+}
+
+# (title, input key, code, display)
+section_plan = [(title, title.replace(" ", ""), *details) for title, details in section_details.items()]
 
 
 def create_section(title, code, display, text):
-    ref_id = str(uuid.uuid4())
+    ref_id = new_id()
     section = CompositionSection.construct(
         id=ref_id,
         title=title,
-        code=CodeableConcept.construct(
-            text=display,
-            coding=Coding.construct(
-                system="http://snomed.info/sct",
-                code=code,
-                display=display
-            )
-        ),
+        code=snomed_concept(display, code, display, as_list=False),
         text=text
     )
     return section
 
 
-def create_opconsult_record(input_json):
+@bundle_builder("op_consult")
+def build_opconsult_bundle(input_json):
     patient_info = input_json.get("patient", {})
 
     patient = get_patient_construct(patient_info)
@@ -40,42 +53,23 @@ def create_opconsult_record(input_json):
 
     practitioner_info = input_json.get("practitioner", {})
     practitioner = get_practitioner_construct(practitioner_info)
+    mark_stage("participants")
     practitioner_ref = Reference.construct(
         reference=f"urn:uuid:{practitioner.id}", display=practitioner.name[0]["text"]
     )
 
     encounter = Encounter.construct(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         status="finished",
         subject=patient_ref,
-        class_fhir=Coding.construct(
-            system="http://terminology.hl7.org/CodeSystem/v3-ActCode",
-            code="IMP",
-            display="inpatient encounter"
-        )
+        class_fhir=encounter_class("IMP")
     )
     encounter_ref = Reference.construct(reference=f"urn:uuid:{encounter.id}", display="Encounter/OP Consult Record")
 
     ref_data = [patient, practitioner,encounter]
 
-    section_details = {
-        "Chief Complaints": ("422843007", "Chief complaint section"),
-        "Physical Examination": ("422843007", "Physical Examination section"),
-        "Allergies": ("722446000", "Allergy record"),
-        "Medical History": ("371529009", "History and physical report"),
-        "Family History": ("422432008", "Family history section"),
-        "Investigation Advice": ("721963009", "Order document"),
-        "Medications": ("721912009", "Medication summary document"),
-        "Follow Up": ("390906007", "Follow-up encounter"),
-        "Procedure": ("371525003", "Procedure report"),
-        "Referral": ("306206005", "Clinical procedure report"),
-        "Other Observations": ("404684003", "Clinical finding"),
-        "Document Reference": ("371530004", "Clinical consultation report"),
-    }
-
     sections = [
-        create_section(title, *details, input_json.get(title.replace(" ", ""), "")) for title, details in
-        section_details.items()
+        create_section(title, code, display, input_json.get(key, "")) for title, key, code, display in section_plan
     ]
 
     ref_data.extend(sections)
@@ -84,17 +78,11 @@ def create_opconsult_record(input_json):
 
     # Create Composition resource for OP Consult Record
     composition = Composition.construct(
+        id=new_id(),
         title="OP Consult Record",
         date=input_json["date"],
         status="final",  # final | amended | entered-in-error | preliminary,
-        type=CodeableConcept.construct(
-            text="OP Consult Record",
-            coding=Coding.construct(
-                system="http://snomed.info/sct",
-                code="371530004",
-                display="Clinical consultation report"
-            )
-        ),
+        type=snomed_concept("OP Consult Record", "371530004", "Clinical consultation report", as_list=False),
         encounter=encounter_ref,
         author=[practitioner_ref],
         subject=patient_ref,
@@ -106,9 +94,19 @@ def create_opconsult_record(input_json):
     bundle.entry = [
         BundleEntry.construct(fullUrl=f"urn:uuid:{composition.id}", resource=composition)
     ]
-    bundle.entry.extend([BundleEntry.construct(fullUrl=f"urn:uuid:{composition.id}", resource=ref) for ref in ref_data])
+    bundle.entry.extend([BundleEntry.construct(fullUrl=f"urn:uuid:{ref.id}", resource=ref) for ref in ref_data])
+
+    return bundle
+
 
-    return bundle.json(indent=2)
+@converter("op_consult")
+def create_opconsult_record(input_json, output="json"):
+    """
+    :param input_json:
+    :param output: one of ``serializer.output_formats``, indented JSON text by default
+    :return: the serialized FHIR bundle
+    """
+    return serialize_bundle(build_opconsult_bundle(input_json), output)
 
 if __name__ == "__main__":
     print("FHIR Bundle for OP Consult Record")
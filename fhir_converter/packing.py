@@ -0,0 +1,153 @@
+"""
+Packing several documents of one patient (e.g. the care contexts of one ABDM health information push) into one
+bundle, or into bundles sharing the participant resources:
+
+    bundle = pack_documents([("prescription", prescription), ("op_consult", consult), lab_report])
+
+The documents are built with a shared ``pool.ResourcePool``, so the Patient, Practitioner and Organization get one id
+across all of them. Entries are then deduplicated by ``fullUrl`` and by content: resources equal apart from their id
+are kept once and references to the dropped copies are pointed at the kept one.
+"""
+import hashlib
+import json
+from typing import Iterable, List, Tuple, Union
+
+from pydantic.v1.json import pydantic_encoder
+
+from fhir_converter.attachment import Base64Source
+from fhir_converter.pool import ResourcePool, active_pool
+from fhir_converter.registry import get_bundle_builder, infer_document_type
+from fhir_converter.serializer import serialize_data
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _key_default(value):
+    # lazily read attachments are keyed on their source object, not read just to be hashed
+    if isinstance(value, Base64Source):
+        return f"Base64Source:{id(value)}"
+    return pydantic_encoder(value)
+
+
+def content_key(resource: dict) -> bytes:
+    """
+    :param resource: resource dict (``resource.dict()``)
+    :return: digest of the resource content without its id
+    """
+    content = {key: value for key, value in resource.items() if key != "id"}
+    if orjson is not None:
+        data = orjson.dumps(content, default=_key_default)
+    else:
+        data = json.dumps(content, separators=(",", ":"), default=_key_default).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _references(value) -> Iterable[dict]:
+    """
+    :return: iterator of the dicts holding a ``reference`` string anywhere inside ``value``
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if isinstance(value.get("reference"), str):
+                yield value
+            stack.extend(item for item in value.values() if isinstance(item, (dict, list)))
+        elif isinstance(value, list):
+            stack.extend(item for item in value if isinstance(item, (dict, list)))
+
+
+def dedupe_entries(entries: List[dict]) -> List[dict]:
+    """
+    Keep the first of the entries sharing a ``fullUrl`` or equal content, rewriting the references to the others.
+    Resources are compared after their own references were rewritten, so e.g. two Compositions pointing to two equal
+    Practitioners are equal too. The entry dicts are changed in place.
+    :param entries: bundle entry dicts in bundle order
+    :return: remaining entries, in their original order
+    """
+    by_url = {}
+    for entry in entries:
+        by_url.setdefault(entry.get("fullUrl"), entry)
+    kept_urls = {}
+    by_key = {}
+    resolving = set()
+
+    def resolve(url):
+        kept = kept_urls.get(url)
+        if kept is not None:
+            return kept
+        entry = by_url.get(url)
+        if entry is None or url in resolving:
+            # not in the bundle, or a reference cycle: leave it as it is
+            return url
+        resolving.add(url)
+        resource = entry.get("resource") or {}
+        for holder in _references(resource):
+            holder["reference"] = resolve(holder["reference"])
+        kept = by_key.setdefault(content_key(resource), url)
+        kept_urls[url] = kept
+        resolving.discard(url)
+        return kept
+
+    remaining = []
+    emitted = set()
+    for entry in entries:
+        url = entry.get("fullUrl")
+        if url is None:
+            remaining.append(entry)
+        elif resolve(url) == url and url not in emitted:
+            emitted.add(url)
+            remaining.append(entry)
+    return remaining
+
+
+def typed_documents(documents):
+    """
+    :param documents: ``(document_type, input_json)`` pairs or input dicts
+    :return: iterator of ``(document_type, input_json)``, the document type of dicts is inferred
+    """
+    for document in documents:
+        if isinstance(document, dict):
+            yield infer_document_type(document), document
+        else:
+            yield document
+
+
+def pack_documents(
+    documents: Iterable[Union[Tuple[str, dict], dict]],
+    combined: bool = True,
+    output: str = "json",
+    pool: ResourcePool = None,
+):
+    """
+    :param documents: converter inputs of one patient, ``(document_type, input_json)`` pairs or input dicts whose
+    document type is inferred
+    :param combined: one ``collection`` bundle holding every Composition and its resources, otherwise one bundle per
+    document with the participants sharing their ids
+    :param output: one of ``serializer.output_formats``
+    :param pool: pool sharing the participants, the active one or a new one by default; pass the same pool to
+    share them across calls
+    :return: the serialized bundle, or a list of them when not ``combined``
+    """
+    if pool is None:
+        # explicit None checks, an empty pool is falsy
+        pool = active_pool()
+        if pool is None:
+            pool = ResourcePool()
+    with pool.activate():
+        bundles = [
+            get_bundle_builder(document_type)(input_json).dict()
+            for document_type, input_json in typed_documents(documents)
+        ]
+    if not combined:
+        for bundle in bundles:
+            bundle["entry"] = dedupe_entries(bundle.get("entry", []))
+        return [serialize_data(bundle, output) for bundle in bundles]
+    if not bundles:
+        raise ValueError("No documents to pack")
+    packed = bundles[0]
+    packed["entry"] = dedupe_entries([entry for bundle in bundles for entry in bundle.get("entry", [])])
+    return serialize_data(packed, output)
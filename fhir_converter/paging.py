@@ -0,0 +1,118 @@
+"""
+Size-aware paging of converted documents for endpoints with a payload limit (e.g. an ABDM health information push):
+
+    for page in paginate(documents, max_bytes=1024 * 1024):
+        push(page.data)
+
+Every page is a compact JSON ``collection`` bundle of at most ``max_bytes``. A document (its Composition and the
+other entries of its bundle) is never split across pages. Each entry is serialized once, as it is added: the page
+size is the exact sum of the serialized entries and the page is their concatenation, nothing is serialized again to
+find out that it does not fit. Participants shared by the documents (built with one ``ResourcePool``) are included
+once per page and serialized once overall.
+"""
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from fhir_converter.pool import ResourcePool
+from fhir_converter.registry import get_bundle_builder, infer_document_type
+from fhir_converter.serializer import dumps_bytes
+
+# resource types the pool shares between documents, their serialized entries are kept for the following pages
+_shared_types = ("Patient", "Practitioner", "Organization")
+
+_head = dumps_bytes({"resourceType": "Bundle", "type": "collection"})[:-1] + b',"entry":['
+_tail = b"]}"
+
+
+class Page(NamedTuple):
+    # compact JSON bundle
+    data: bytes
+    # positions of the documents on this page in the input
+    documents: List[int]
+    entries: int
+
+
+class PageSizeError(ValueError):
+    def __init__(self, document: int, size: int, max_bytes: int):
+        self.document = document
+        self.size = size
+        self.max_bytes = max_bytes
+        super().__init__(f"Document {document} alone is {size} bytes as a page, more than the {max_bytes} bytes limit")
+
+
+def _bundle_entries(document, pool: ResourcePool) -> list:
+    """
+    :param document: ``(document_type, input_json)``, converter input dict, ``Bundle`` or bundle dict
+    :return: entry dicts of the document's bundle
+    """
+    if isinstance(document, dict) and document.get("resourceType") == "Bundle":
+        return document.get("entry") or []
+    if hasattr(document, "entry"):
+        return document.dict().get("entry") or []
+    document_type, input_json = (infer_document_type(document), document) if isinstance(document, dict) else document
+    with pool.activate():
+        bundle = get_bundle_builder(document_type)(input_json)
+    return bundle.dict().get("entry") or []
+
+
+def paginate(
+    documents: Iterable,
+    max_bytes: int,
+    pool: Optional[ResourcePool] = None,
+    strict: bool = True,
+) -> Iterator[Page]:
+    """
+    Split documents into pages in input order, starting a new page when the next document does not fit.
+    :param documents: ``(document_type, input_json)`` pairs, converter input dicts (document type inferred), or
+    already built ``Bundle`` models / bundle dicts
+    :param max_bytes: page size limit in bytes
+    :param pool: pool sharing the participants of the documents built here, a new one by default
+    :param strict: raise ``PageSizeError`` for a document larger than ``max_bytes`` on its own, otherwise it gets a
+    page of its own exceeding the limit
+    :return: iterator of ``Page``, built lazily
+    """
+    if pool is None:
+        pool = ResourcePool()
+    shared = {}
+    parts, urls, page_documents = [], set(), []
+    # serialized entry bytes on the page, without the envelope and separators
+    content = 0
+
+    def page_size(count, length):
+        return len(_head) + length + max(count - 1, 0) + len(_tail)
+
+    for position, document in enumerate(documents):
+        serialized = []
+        seen = set()
+        for entry in _bundle_entries(document, pool):
+            url = entry.get("fullUrl")
+            if url is not None:
+                if url in seen:
+                    continue
+                seen.add(url)
+            data = shared.get(url)
+            if data is None:
+                data = dumps_bytes(entry)
+                if url and (entry.get("resource") or {}).get("resourceType") in _shared_types:
+                    shared[url] = data
+            serialized.append((url, data))
+
+        # participants already on the page are not repeated
+        added = [(url, data) for url, data in serialized if url is None or url not in urls]
+        length = content + sum(len(data) for _, data in added)
+        if page_documents and page_size(len(parts) + len(added), length) > max_bytes:
+            yield Page(_head + b",".join(parts) + _tail, page_documents, len(parts))
+            parts, urls, page_documents = [], set(), []
+            content = 0
+            added = serialized
+            length = sum(len(data) for _, data in added)
+        size = page_size(len(parts) + len(added), length)
+        if size > max_bytes and strict:
+            raise PageSizeError(position, size, max_bytes)
+
+        parts.extend(data for _, data in added)
+        urls.update(url for url, _ in added if url is not None)
+        page_documents.append(position)
+        content = length
+
+    if page_documents:
+        yield Page(_head + b",".join(parts) + _tail, page_documents, len(parts))
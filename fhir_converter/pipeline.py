@@ -0,0 +1,65 @@
+import functools
+import time
+
+from fhir_converter import instrumentation, integrity, validation
+from fhir_converter.ids import id_scope
+
+
+def bundle_builder(document_type: str):
+    """
+    Decorator for the ``build_*_bundle`` functions, runs every conversion inside its per-conversion scope and checks
+    the built bundle with ``integrity.post_check``.
+    :param document_type: one of ``registry.document_converters``
+    """
+    def decorator(build):
+        @functools.wraps(build)
+        def wrapper(input_json, *args, **kwargs):
+            with id_scope(document_type, input_json):
+                bundle = build(input_json, *args, **kwargs)
+            instrumentation.mark_stage("resources")
+            instrumentation.count_resources(bundle)
+            integrity.post_check(document_type, bundle)
+            return bundle
+
+        return wrapper
+
+    return decorator
+
+
+def converter(document_type: str):
+    """
+    Decorator for the ``create_*`` functions, reports every conversion to ``instrumentation`` when it is enabled and
+    offers the output to the active ``validation`` sampler.
+    :param document_type: one of ``registry.document_converters``
+    """
+    def decorator(convert):
+        @functools.wraps(convert)
+        def wrapper(input_json, *args, **kwargs):
+            record = instrumentation.start(document_type)
+            if record is None:
+                result = convert(input_json, *args, **kwargs)
+            else:
+                result = _instrumented(record, convert, input_json, *args, **kwargs)
+            validator = validation.active_validator()
+            if validator is not None:
+                validator.offer(document_type, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _instrumented(record, convert, input_json, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        with instrumentation.recording(record):
+            result = convert(input_json, *args, **kwargs)
+            instrumentation.mark_stage("serialize")
+        record.output_bytes = instrumentation.output_size(result)
+        return result
+    except Exception as e:
+        record.error_type = type(e).__name__
+        raise
+    finally:
+        instrumentation.finish(record, started)
@@ -0,0 +1,98 @@
+import contextlib
+import contextvars
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+_active_pool = contextvars.ContextVar("fhir_converter_resource_pool", default=None)
+
+
+class ResourcePool:
+    """
+    Shares Patient, Practitioner and Organization resources between the conversions of a session.
+
+    While the pool is active (``with pool.activate():``) the participant helpers in ``common`` return the resource
+    built for the first document with the same ``patient_id`` / ``practitioner_id`` / ``organization_id``: same id,
+    same object. Participants are keyed on their business id only, call ``invalidate`` when their details change.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        """
+        :param max_size: number of resources kept, least recently used ones are dropped first
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._resources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: str, build: Callable):
+        """
+        :param kind: resource type, e.g. ``Patient``
+        :param key: business id of the participant
+        :param build: called without arguments to build the resource when it is not pooled yet
+        :return: pooled resource
+        """
+        with self._lock:
+            resource = self._resources.get((kind, key))
+            if resource is not None:
+                self._resources.move_to_end((kind, key))
+                self.hits += 1
+                return resource
+        resource = build()
+        with self._lock:
+            # another thread may have built it meanwhile, keep the first one
+            resource = self._resources.setdefault((kind, key), resource)
+            self.misses += 1
+            while len(self._resources) > self.max_size:
+                self._resources.popitem(last=False)
+        return resource
+
+    def invalidate(self, kind: Optional[str] = None, key: Optional[str] = None):
+        """
+        Drop pooled resources, all of them by default or those matching ``kind`` and/or ``key``.
+        """
+        with self._lock:
+            for pooled_kind, pooled_key in list(self._resources):
+                if kind in (None, pooled_kind) and key in (None, pooled_key):
+                    del self._resources[(pooled_kind, pooled_key)]
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._resources)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """
+        Make this the pool used by the conversions inside the ``with`` block (current thread / task only).
+        """
+        token = _active_pool.set(self)
+        try:
+            yield self
+        finally:
+            _active_pool.reset(token)
+
+
+def active_pool() -> Optional[ResourcePool]:
+    return _active_pool.get()
+
+
+def pooled(kind: str, key_field: str):
+    """
+    Decorator for the participant helpers, looks the resource up in the active pool by ``info[key_field]``.
+    """
+    def decorator(build):
+        @functools.wraps(build)
+        def wrapper(info):
+            pool = _active_pool.get()
+            key = info.get(key_field)
+            if pool is None or not key:
+                return build(info)
+            return pool.get(kind, key, lambda: build(info))
+
+        return wrapper
+
+    return decorator
@@ -1,49 +1,44 @@
 import datetime
-import uuid
 
 from fhir.resources.bundle import Bundle, BundleEntry
 from fhir.resources.codeableconcept import CodeableConcept
-from fhir.resources.coding import Coding
 from fhir.resources.composition import Composition
 from fhir.resources.medicationrequest import MedicationRequest
 from fhir.resources.reference import Reference
 
 from fhir_converter.common import get_patient_construct, create_section, get_practitioner_construct
+from fhir_converter.ids import new_id
+from fhir_converter.instrumentation import mark_stage
+from fhir_converter.pipeline import bundle_builder, converter
+from fhir_converter.serializer import serialize_bundle
+from fhir_converter.templates import snomed_concept
 
 
-def create_prescription(input_json: dict):
+@bundle_builder("prescription")
+def build_prescription_bundle(input_json: dict):
     reference_data = []
 
     patient_info = input_json.get("patient", {})
     patient = get_patient_construct(patient_info)
     practitioner_info = input_json.get("practitioner", {})
     practitioner = get_practitioner_construct(practitioner_info)
+    mark_stage("participants")
     practitioner_ref = Reference.construct(
-        reference=f"urn:uuid:/{practitioner.id}", display=practitioner.name[0]["text"]
+        reference=f"urn:uuid:{practitioner.id}", display=practitioner.name[0]["text"]
     )
     patient_ref = Reference.construct(
-        reference=f"urn:uuid:/{patient.id}", display=patient.name[0]["text"]
+        reference=f"urn:uuid:{patient.id}", display=patient.name[0]["text"]
     )
     status = "final"
-    resource_type = CodeableConcept.construct(
-        text="Prescription record",
-        coding=[
-            Coding.construct(
-                system="http://snomed.info/sct",
-                code="440545006",
-                display="Prescription record",
-            )
-        ],
-    )
+    resource_type = snomed_concept("Prescription record", "440545006", "Prescription record")
     prescription_date = input_json.get("prescription_date", datetime.datetime.now().isoformat())
 
-    reference_data.append(patient)
     reference_data.append(practitioner)
     medication_requests = []
 
     medications = input_json.get("medications", [])
     for medication in medications:
-        medication_request_id = str(uuid.uuid4())
+        medication_request_id = new_id()
         medication_request_construct = MedicationRequest.construct(
             id=medication_request_id,
             status="active",
@@ -64,7 +59,7 @@ def create_prescription(input_json: dict):
         reference_data.append(medication_request_construct)
 
 
-    composition_id = str(uuid.uuid4())
+    composition_id = new_id()
     prescription = Composition.construct(
         id=composition_id,
         type=resource_type,
@@ -95,7 +90,17 @@ def create_prescription(input_json: dict):
             BundleEntry.construct(fullUrl=f"urn:uuid:{resource.id}", resource=resource)
         )
 
-    return bundle.json(indent=2)
+    return bundle
+
+
+@converter("prescription")
+def create_prescription(input_json: dict, output="json"):
+    """
+    :param input_json:
+    :param output: one of ``serializer.output_formats``, indented JSON text by default
+    :return: the serialized FHIR bundle
+    """
+    return serialize_bundle(build_prescription_bundle(input_json), output)
 
 if __name__ == "__main__":
     input_json = {
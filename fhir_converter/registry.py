@@ -0,0 +1,68 @@
+import importlib
+
+# document type -> (module, converter function, bundle builder function)
+document_converters = {
+    "prescription": ("fhir_converter.prescription", "create_prescription", "build_prescription_bundle"),
+    "diagnostic_report": (
+        "fhir_converter.diagnostic_report",
+        "create_diagnostic_report",
+        "build_diagnostic_report_bundle",
+    ),
+    "op_consult": ("fhir_converter.op_consult", "create_opconsult_record", "build_opconsult_bundle"),
+    "discharge_summary": (
+        "fhir_converter.discharge_summary",
+        "create_fhir_bundle_discharge_summary",
+        "build_discharge_summary_bundle",
+    ),
+}
+
+
+# document type -> input keys that only inputs of that document type have
+document_markers = {
+    "prescription": ("medications", "prescription_date"),
+    "diagnostic_report": ("observations", "report_name", "report_title", "request"),
+    "op_consult": ("ChiefComplaints", "PhysicalExamination", "MedicalHistory", "FollowUp"),
+    "discharge_summary": ("section", "meta"),
+}
+
+
+def infer_document_type(input_json: dict) -> str:
+    """
+    Guess the document type of a converter input from its keys, an explicit ``document_type`` key wins.
+    :return: one of ``document_converters``
+    """
+    document_type = input_json.get("document_type")
+    if document_type in document_converters:
+        return document_type
+    for document_type, markers in document_markers.items():
+        if any(marker in input_json for marker in markers):
+            return document_type
+    raise ValueError(f"Cannot infer the document type from the input keys {sorted(input_json)}")
+
+
+def _resolve(document_type, position):
+    try:
+        details = document_converters[document_type]
+    except KeyError:
+        raise ValueError(
+            f"Unknown document type {document_type!r}, expected one of {sorted(document_converters)}"
+        ) from None
+    return getattr(importlib.import_module(details[0]), details[position])
+
+
+def get_converter(document_type: str):
+    """
+    Resolve the converter function for a document type, importing its module on first use.
+    :param document_type: one of ``document_converters``
+    :return: the ``create_*`` function
+    """
+    return _resolve(document_type, 1)
+
+
+def get_bundle_builder(document_type: str):
+    """
+    Resolve the function building the (unserialized) ``Bundle`` for a document type.
+    :param document_type: one of ``document_converters``
+    :return: the ``build_*_bundle`` function
+    """
+    return _resolve(document_type, 2)
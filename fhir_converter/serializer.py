@@ -0,0 +1,199 @@
+import json
+import uuid
+from typing import Iterator, Optional, TextIO, Union
+
+from pydantic.v1.json import pydantic_encoder
+
+from fhir_converter.attachment import Base64Source, find_sources
+from fhir_converter.registry import get_bundle_builder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# json: indented str (the historical output), compact: str without whitespace, bytes: compact UTF-8, dict: no JSON
+output_formats = ("json", "compact", "bytes", "dict")
+
+json_backends = ("orjson", "json") if orjson else ("json",)
+_json_backend = json_backends[0]
+
+
+def set_json_backend(name: str):
+    """
+    Select the JSON encoder used by the serializers. ``orjson`` is picked by default when installed.
+    :param name: one of ``json_backends``
+    """
+    global _json_backend
+    if name not in json_backends:
+        raise ValueError(f"JSON backend {name!r} is not available, expected one of {json_backends}")
+    _json_backend = name
+
+
+def get_json_backend() -> str:
+    return _json_backend
+
+
+def _default(value):
+    if isinstance(value, Base64Source):
+        return value.read_base64()
+    return pydantic_encoder(value)
+
+
+def dumps_bytes(value, indent: Optional[int] = None) -> bytes:
+    """
+    Encode ``value`` as UTF-8 JSON with the selected backend.
+    :param value: JSON compatible value, e.g. ``bundle.dict()``
+    :param indent: pretty-print indent, ``None`` for compact output
+    :return: JSON bytes
+    """
+    # orjson only knows how to indent by two spaces
+    if _json_backend == "orjson" and indent in (None, 2):
+        return orjson.dumps(value, default=_default, option=orjson.OPT_INDENT_2 if indent else 0)
+    return dumps(value, indent).encode("utf-8")
+
+
+def dumps(value, indent: Optional[int] = None) -> str:
+    """
+    Encode ``value`` as JSON text with the selected backend.
+    :param value: JSON compatible value, e.g. ``bundle.dict()``
+    :param indent: pretty-print indent, ``None`` for compact output
+    :return: JSON text
+    """
+    if _json_backend == "orjson" and indent in (None, 2):
+        return dumps_bytes(value, indent).decode("utf-8")
+    if indent:
+        return json.dumps(value, indent=indent, ensure_ascii=False, default=_default)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def loads(data: Union[str, bytes]):
+    """
+    Decode JSON text or bytes with the selected backend.
+    """
+    if _json_backend == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(value, indent: Optional[int] = None, level: int = 0) -> str:
+    text = dumps(value, indent)
+    if indent and level:
+        text = text.replace("\n", "\n" + " " * (indent * level))
+    return text
+
+
+def serialize_bundle(bundle, output: str = "json") -> Union[str, bytes, dict]:
+    """
+    Render a built ``Bundle`` in one of the ``output_formats``.
+    :param bundle: ``Bundle`` construct
+    :param output: ``json`` (indented str), ``compact`` (str), ``bytes`` (compact UTF-8) or ``dict``
+    :return: serialized bundle
+    """
+    return serialize_data(bundle.dict(), output)
+
+
+def serialize_data(data: dict, output: str = "json") -> Union[str, bytes, dict]:
+    """
+    Render a bundle that is already a dict (``bundle.dict()``) in one of the ``output_formats``.
+    """
+    if output == "json":
+        return dumps(data, indent=2)
+    if output == "compact":
+        return dumps(data)
+    if output == "bytes":
+        return dumps_bytes(data)
+    if output == "dict":
+        for entry in data.get("entry", []):
+            for attachment, source in find_sources(entry.get("resource", {})):
+                attachment["data"] = source.read_base64()
+        return data
+    raise ValueError(f"Unknown output format {output!r}, expected one of {output_formats}")
+
+
+def iter_bundle_json(bundle, indent: Optional[int] = 2) -> Iterator[str]:
+    """
+    Serialize an already built ``Bundle`` piece by piece: the envelope first, then one chunk per
+    ``BundleEntry``. Only one entry is serialized at a time, the output matches ``bundle.json(indent=indent)``.
+    :param bundle: ``Bundle`` construct
+    :param indent: pretty-print indent, ``None`` for compact output
+    :return: iterator of JSON text chunks
+    """
+    envelope = bundle.copy(exclude={"entry"}).dict()
+    entries = bundle.entry or []
+    sequence = type(bundle).elements_sequence()
+    after_entry = set(sequence[sequence.index("entry") + 1:])
+    head = [(key, value) for key, value in envelope.items() if key not in after_entry]
+    tail = [(key, value) for key, value in envelope.items() if key in after_entry]
+
+    newline = "\n" if indent else ""
+    pad = " " * indent if indent else ""
+    key_separator = ": " if indent else ":"
+
+    members = [f"{pad}{_dumps(key)}{key_separator}{_dumps(value, indent, 1)}" for key, value in head]
+    yield "{" + newline + f",{newline}".join(members)
+
+    if entries:
+        separator = "," + newline if members else ""
+        yield f'{separator}{pad}"entry"{key_separator}['
+        for position, entry in enumerate(entries):
+            yield ("," if position else "") + newline + pad * 2
+            yield from _iter_entry_json(entry.dict(), indent)
+        yield newline + pad + "]"
+        members.append("entry")
+
+    for key, value in tail:
+        separator = "," + newline if members else ""
+        yield f"{separator}{pad}{_dumps(key)}{key_separator}{_dumps(value, indent, 1)}"
+        members.append(key)
+
+    yield newline + "}"
+
+
+def _iter_entry_json(entry: dict, indent: Optional[int]) -> Iterator[str]:
+    sources = find_sources(entry.get("resource", {}))
+    if not sources:
+        yield _dumps(entry, indent, 2)
+        return
+
+    # serialize the entry with placeholders and encode the attachments into their place chunk by chunk
+    placeholders = {}
+    for attachment, source in sources:
+        placeholder = f"fhir-converter-attachment-{uuid.uuid4().hex}"
+        placeholders[f'"{placeholder}"'] = source
+        attachment["data"] = placeholder
+    text = _dumps(entry, indent, 2)
+    for placeholder, source in placeholders.items():
+        before, text = text.split(placeholder, 1)
+        yield before + '"'
+        yield from source.iter_base64()
+        text = '"' + text
+    yield text
+
+
+def iter_bundle_chunks(document_type: str, input_json: dict, indent: Optional[int] = 2) -> Iterator[str]:
+    """
+    Convert ``input_json`` and serialize the resulting bundle one entry at a time.
+    :param document_type: one of ``registry.document_converters``
+    :param input_json: converter input
+    :param indent: pretty-print indent, ``None`` for compact output
+    :return: iterator of JSON text chunks
+    """
+    bundle = get_bundle_builder(document_type)(input_json)
+    return iter_bundle_json(bundle, indent)
+
+
+def write_bundle(fp: TextIO, document_type: str, input_json: dict, indent: Optional[int] = 2) -> int:
+    """
+    Convert ``input_json`` and stream the bundle into a text file-like object instead of building one string.
+    :param fp: object with a ``write(str)`` method, e.g. a text file or a compressing ``sinks.Sink``
+    :param document_type: one of ``registry.document_converters``
+    :param input_json: converter input
+    :param indent: pretty-print indent, ``None`` for compact output
+    :return: number of characters written
+    """
+    written = 0
+    for chunk in iter_bundle_chunks(document_type, input_json, indent):
+        fp.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,172 @@
+"""
+Long-lived conversion server: keeps converters imported and warm in a pool of worker processes.
+
+    python -m fhir_converter.serve --port 8080 --workers 4
+    python -m fhir_converter.serve --unix /run/fhir-converter.sock
+
+Requests are ``POST /convert/<document_type>`` with the converter input JSON as body, the response body is
+the bundle JSON. ``?output=json`` returns indented JSON, compact JSON is returned otherwise. ``GET /metrics``
+returns the conversion metrics of the server and its workers in the Prometheus text format.
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fhir_converter import instrumentation
+from fhir_converter.metrics import MetricsRegistry
+from fhir_converter.registry import document_converters, get_converter
+
+
+def _warm_up():
+    for document_type in document_converters:
+        get_converter(document_type)
+
+
+def _convert(document_type, body, output):
+    """
+    :return: status, response body or error dict, instrumentation records of the conversion
+    """
+    try:
+        input_json = json.loads(body)
+    except ValueError as e:
+        return HTTPStatus.BAD_REQUEST, {"error_type": type(e).__name__, "error": str(e)}, []
+    # the records travel back with the result, the server process owns the metrics of all workers
+    with instrumentation.instrument() as records:
+        try:
+            result = get_converter(document_type)(input_json, output)
+        except Exception as e:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {"error_type": type(e).__name__, "error": str(e)}, records
+    return HTTPStatus.OK, result.encode("utf-8") if isinstance(result, str) else result, records
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._respond(HTTPStatus.OK, b"ok", "text/plain")
+        elif path == "/metrics":
+            text = self.server.metrics.exposition()
+            self._respond(HTTPStatus.OK, text.encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._respond_error(HTTPStatus.NOT_FOUND, "NotFound", f"No route for GET {self.path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        prefix, _, document_type = url.path.rpartition("/")
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if prefix != "/convert" or document_type not in document_converters:
+            self._respond_error(HTTPStatus.NOT_FOUND, "NotFound", f"No converter for {url.path}")
+            return
+        output = "json" if parse_qs(url.query).get("output") == ["json"] else "bytes"
+
+        if self.server.executor is None:
+            status, result, records = _convert(document_type, body, output)
+        else:
+            status, result, records = self.server.executor.submit(_convert, document_type, body, output).result()
+        for record in records:
+            self.server.metrics.observe(record)
+        if status != HTTPStatus.OK:
+            self._respond_error(status, result["error_type"], result["error"])
+            return
+        self._respond(status, result, "application/fhir+json")
+
+    def _respond_error(self, status, error_type, error):
+        body = json.dumps({"error_type": error_type, "error": error}).encode("utf-8")
+        self._respond(status, body, "application/json")
+
+    def _respond(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket peers have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ConversionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, executor=None, verbose=False):
+        super().__init__(address, ConversionRequestHandler)
+        self.executor = executor
+        self.verbose = verbose
+        self.metrics = MetricsRegistry()
+
+
+class ConversionUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, executor=None, verbose=False):
+        super().__init__(path, ConversionRequestHandler)
+        self.executor = executor
+        self.verbose = verbose
+        self.metrics = MetricsRegistry()
+
+
+def make_server(host="127.0.0.1", port=8080, unix_socket=None, workers=None, verbose=False):
+    """
+    Create a conversion server, converters are preloaded in this process and in every worker.
+    :param host: interface to listen on, ignored for unix sockets
+    :param port: TCP port, ``0`` picks a free one
+    :param unix_socket: path of a unix socket to listen on instead of TCP
+    :param workers: number of worker processes, defaults to ``os.cpu_count()``; ``0`` converts in the server threads
+    :param verbose: log every request to stderr
+    :return: server, call ``serve_forever()`` on it and ``server.executor.shutdown()`` when done
+    """
+    _warm_up()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up) if workers else None
+    if executor is not None:
+        # start all workers now instead of on the first requests
+        for future in [executor.submit(_warm_up) for _ in range(workers)]:
+            future.result()
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        return ConversionUnixServer(unix_socket, executor, verbose)
+    return ConversionHTTPServer((host, port), executor, verbose)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve FHIR conversions over localhost HTTP or a unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", dest="unix_socket", help="listen on this unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, 0 converts in-process")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.unix_socket, args.workers, args.verbose)
+    # exit through the finally block on SIGTERM too, otherwise the worker processes are left behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.executor is not None:
+            server.executor.shutdown()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Compressed output sinks. Converted bundles repeat the same profile URLs, code systems and identifier codings in every
+entry and compress well; a sink compresses while a bundle is written, the uncompressed document is never built:
+
+    with open_sink("bundles.ndjson.zst") as sink:
+        for input_json in input_jsons:
+            write_bundle(sink, "prescription", input_json, indent=None)
+            sink.write(b"\\n")
+
+gzip comes from the standard library, zstd needs ``zstandard`` (``pip install "fhir_converter[zstd]"``). zstd can use
+a dictionary trained on sample bundles, which pays off when bundles are compressed one by one (one file or message per
+bundle) and have no earlier bundles to share strings with.
+"""
+import gzip
+import io
+from typing import BinaryIO, Iterable, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compressions = ("none", "gzip", "zstd") if zstandard else ("none", "gzip")
+extensions = {"gzip": ".gz", "zstd": ".zst"}
+default_levels = {"gzip": 6, "zstd": 3}
+
+_BUFFER_SIZE = 64 * 1024
+
+
+def compression_for(path: str) -> str:
+    """
+    :return: the compression implied by the file extension of ``path``, ``none`` for other files
+    """
+    for compression, extension in extensions.items():
+        if path.endswith(extension):
+            return compression
+    return "none"
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError('zstd compression needs the zstandard package: pip install "fhir_converter[zstd]"')
+
+
+class Sink(io.RawIOBase):
+    """
+    Binary writer over a file object. ``write`` also takes text, encoded as UTF-8, so text producers such as
+    ``serializer.write_bundle`` stream into it; small writes are collected and compressed in 64 KiB blocks.
+    """
+
+    def __init__(self, fileobj: BinaryIO, close_fileobj: bool = False):
+        super().__init__()
+        self.fileobj = fileobj
+        self.close_fileobj = close_fileobj
+        # uncompressed bytes written so far
+        self.bytes_in = 0
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data: Union[bytes, str]) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        self.bytes_in += len(data)
+        if len(self._buffer) >= _BUFFER_SIZE:
+            self._drain()
+        return len(data)
+
+    def _drain(self):
+        if self._buffer:
+            self._compress(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _compress(self, data: bytes):
+        self.fileobj.write(data)
+
+    def _end_frame(self):
+        pass
+
+    def end_frame(self):
+        """
+        Complete the current gzip member / zstd frame and flush the file object: everything written so far can be
+        decompressed from the file alone, e.g. after truncating it to its current size. The next write starts a new
+        member / frame, readers see the concatenation as one stream.
+        """
+        self._drain()
+        self._end_frame()
+        self.fileobj.flush()
+
+    def flush(self):
+        # only the file object, compressors are not flushed mid-frame (that would cost compression ratio)
+        if not self.closed:
+            self.fileobj.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.end_frame()
+            super().close()
+        finally:
+            if self.close_fileobj:
+                self.fileobj.close()
+
+
+class GzipSink(Sink):
+    def __init__(self, fileobj: BinaryIO, level: int = default_levels["gzip"], close_fileobj: bool = False):
+        super().__init__(fileobj, close_fileobj)
+        self.level = level
+        self._member = None
+
+    def _compress(self, data: bytes):
+        if self._member is None:
+            # mtime=0 keeps the output reproducible
+            self._member = gzip.GzipFile(fileobj=self.fileobj, mode="wb", compresslevel=self.level, mtime=0)
+        self._member.write(data)
+
+    def _end_frame(self):
+        if self._member is not None:
+            self._member.close()
+            self._member = None
+
+
+class ZstdSink(Sink):
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        level: int = default_levels["zstd"],
+        dictionary: Union[bytes, "zstandard.ZstdCompressionDict", None] = None,
+        threads: int = 0,
+        close_fileobj: bool = False,
+    ):
+        """
+        :param dictionary: dictionary from ``train_dictionary``, readers need the same one
+        :param threads: zstd worker threads, ``0`` compresses on the calling thread
+        """
+        _require_zstandard()
+        super().__init__(fileobj, close_fileobj)
+        self._compressor = zstandard.ZstdCompressor(
+            level=level, dict_data=as_dictionary(dictionary), threads=threads
+        )
+        self._writer = None
+
+    def _compress(self, data: bytes):
+        if self._writer is None:
+            self._writer = self._compressor.stream_writer(self.fileobj, closefd=False)
+        self._writer.write(data)
+
+    def _end_frame(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def open_sink(
+    target: Union[str, BinaryIO],
+    compression: Optional[str] = None,
+    level: Optional[int] = None,
+    dictionary=None,
+    append: bool = False,
+) -> Sink:
+    """
+    :param target: file path or binary file object
+    :param compression: one of ``compressions``, defaults to the one implied by the path extension
+    :param level: compression level, ``default_levels`` otherwise
+    :param dictionary: zstd dictionary, see ``train_dictionary``
+    :param append: append to an existing file instead of replacing it
+    :return: sink, closing it also closes files it opened
+    """
+    close_fileobj = isinstance(target, str)
+    if compression is None:
+        compression = compression_for(target) if close_fileobj else "none"
+    if compression not in ("none", "gzip", "zstd"):
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {compressions}")
+    if compression == "zstd":
+        _require_zstandard()
+    fileobj = open(target, "ab" if append else "wb") if close_fileobj else target
+    if level is None:
+        # 0 is a level of its own (gzip: stored, zstd: the library default)
+        level = default_levels.get(compression)
+    if compression == "gzip":
+        return GzipSink(fileobj, level, close_fileobj)
+    if compression == "zstd":
+        return ZstdSink(fileobj, level, dictionary, close_fileobj=close_fileobj)
+    return Sink(fileobj, close_fileobj)
+
+
+def open_source(target: Union[str, BinaryIO], compression: Optional[str] = None, dictionary=None) -> BinaryIO:
+    """
+    Read back what a sink wrote, across all of its members / frames.
+    :param target: file path or binary file object
+    :param compression: one of ``compressions``, defaults to the one implied by the path extension
+    :return: binary file object with the uncompressed content
+    """
+    if compression is None:
+        compression = compression_for(target) if isinstance(target, str) else "none"
+    fileobj = open(target, "rb") if isinstance(target, str) else target
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if compression == "zstd":
+        _require_zstandard()
+        decompressor = zstandard.ZstdDecompressor(dict_data=as_dictionary(dictionary))
+        reader = decompressor.stream_reader(fileobj, read_across_frames=True, closefd=isinstance(target, str))
+        return io.BufferedReader(reader)
+    if compression != "none":
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {compressions}")
+    return fileobj
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = 64 * 1024) -> bytes:
+    """
+    Train a zstd dictionary on serialized sample bundles (a few hundred of each document type written later).
+    :param size: dictionary size in bytes
+    :return: dictionary bytes, store them next to the data, e.g. with ``save_dictionary``
+    """
+    _require_zstandard()
+    return zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+
+def save_dictionary(path: str, dictionary: bytes):
+    with open(path, "wb") as fp:
+        fp.write(dictionary)
+
+
+def load_dictionary(path: str) -> "zstandard.ZstdCompressionDict":
+    _require_zstandard()
+    with open(path, "rb") as fp:
+        return as_dictionary(fp.read())
+
+
+def as_dictionary(dictionary):
+    if dictionary is None or not isinstance(dictionary, (bytes, bytearray)):
+        return dictionary
+    _require_zstandard()
+    return zstandard.ZstdCompressionDict(bytes(dictionary))
@@ -0,0 +1,139 @@
+"""
+Constant FHIR fragments, built once and shared by every bundle.
+
+The built fragments are frozen (read-only mappings, tuples instead of lists) and never handed out: every call returns
+a fresh mutable copy of one, so a caller editing a bundle (e.g. appending to ``meta.profile``) cannot change the
+fragments of later bundles. Copying skips the validation and defaults a new model would go through.
+"""
+import functools
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from fhir.resources.codeableconcept import CodeableConcept
+from fhir.resources.coding import Coding
+from pydantic.v1 import BaseModel
+
+SNOMED_SYSTEM = "http://snomed.info/sct"
+IDENTIFIER_TYPE_SYSTEM = "http://terminology.hl7.org/CodeSystem/v2-0203"
+ACT_CODE_SYSTEM = "http://terminology.hl7.org/CodeSystem/v3-ActCode"
+PROFILE_BASE_URL = "https://nrces.in/ndhm/fhir/r4/StructureDefinition/"
+
+identifier_type_displays = {
+    "MR": "Medical record number",
+    "AN": "Account number",
+    "PRN": "Provider number",
+}
+
+encounter_class_displays = {
+    "IMP": "inpatient encounter",
+}
+
+
+def _freeze(value):
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    """
+    :return: mutable copy of a frozen fragment, models and mappings copied, tuples turned into lists
+    """
+    if isinstance(value, BaseModel):
+        model = value.__class__.__new__(value.__class__)
+        object.__setattr__(model, "__dict__", {key: _thaw(item) for key, item in value.__dict__.items()})
+        object.__setattr__(model, "__fields_set__", set(value.__fields_set__))
+        return model
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def _identifier_type(code: str):
+    return _freeze({
+        "coding": [
+            {
+                "system": IDENTIFIER_TYPE_SYSTEM,
+                "code": code,
+                "display": identifier_type_displays[code],
+            }
+        ]
+    })
+
+
+def identifier_type(code: str) -> dict:
+    """
+    :param code: ``v2-0203`` identifier type code, one of ``identifier_type_displays``
+    :return: ``Identifier.type`` value
+    """
+    return _thaw(_identifier_type(code))
+
+
+@functools.lru_cache(maxsize=None)
+def _profile_url(profile: str) -> str:
+    return PROFILE_BASE_URL + profile
+
+
+def profile_meta(profile: str) -> dict:
+    """
+    :param profile: NRCeS structure definition name, e.g. ``Patient``
+    :return: ``meta`` value declaring the profile
+    """
+    return {"profile": [_profile_url(profile)]}
+
+
+@functools.lru_cache(maxsize=1024)
+def _snomed_coding(code: str, display: str) -> Coding:
+    return Coding.construct(system=SNOMED_SYSTEM, code=code, display=display)
+
+
+def snomed_coding(code: str, display: str) -> Coding:
+    return _thaw(_snomed_coding(code, display))
+
+
+def snomed_codings(code: str, display: str) -> list:
+    """
+    :return: single element ``coding`` list
+    """
+    return [_thaw(_snomed_coding(code, display))]
+
+
+@functools.lru_cache(maxsize=1024)
+def _snomed_concept(text: str, code: str, display: str, as_list: bool) -> CodeableConcept:
+    coding = _snomed_coding(code, display)
+    return CodeableConcept.construct(text=text, coding=(coding,) if as_list else coding)
+
+
+def snomed_concept(text: str, code: str, display: str, as_list: bool = True) -> CodeableConcept:
+    """
+    :param text: ``CodeableConcept.text``
+    :param as_list: ``coding`` as a list (FHIR), ``False`` keeps the single ``Coding`` op_consult has always emitted
+    :return: ``CodeableConcept`` with one SNOMED coding
+    """
+    return _thaw(_snomed_concept(text, code, display, as_list))
+
+
+@functools.lru_cache(maxsize=None)
+def _encounter_class(code: str) -> Coding:
+    return Coding.construct(system=ACT_CODE_SYSTEM, code=code, display=encounter_class_displays[code])
+
+
+def encounter_class(code: str) -> Coding:
+    """
+    :param code: ``v3-ActCode`` encounter class code, one of ``encounter_class_displays``
+    :return: ``Encounter.class`` value
+    """
+    return _thaw(_encounter_class(code))
+
+
+def clear():
+    """
+    Drop all built fragments, they are rebuilt on next use.
+    """
+    for template in (_identifier_type, _profile_url, _snomed_coding, _snomed_concept, _encounter_class):
+        template.cache_clear()
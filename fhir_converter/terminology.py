@@ -0,0 +1,367 @@
+"""
+Offline terminology index: maps clinical free text to SNOMED CT codes without a terminology server.
+
+The index is built from a user-supplied file, a FHIR ValueSet (``expansion.contains`` or ``compose.include.concept``,
+e.g. the ABDM value sets), an RF2 description file or a ``code<TAB>term`` / ``code,term`` table, and saved in a
+compact binary form that is memory-mapped on open:
+
+    index = TerminologyIndex.build(load_terms("snomed-descriptions.txt"))
+    index.save("snomed.idx")
+
+    terminology.set_index(TerminologyIndex.open("snomed.idx"))
+    create_fhir_bundle_discharge_summary(input_json)  # discharge summary codings are filled from the index
+
+Terms are normalised to lower-case word tokens. ``lookup`` returns the longest term occurring as a phrase in the text
+(found by extending prefixes over the sorted terms), or with ``min_score < 1`` the term sharing the largest share of
+its words with the text (from the word index); repeated texts are answered from an LRU cache.
+"""
+import bisect
+import contextlib
+import contextvars
+import csv
+import functools
+import hashlib
+import json
+import mmap
+import re
+import struct
+import sys
+from collections import Counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from fhir_converter.templates import snomed_codings
+
+MAGIC = b"FCTIDX01"
+# magic, term count, token count, posting count, string blob size
+_header = struct.Struct("<8sIIII")
+# normalised term offset / length, code offset / length, display offset / length, token count
+_TERM_FIELDS = 7
+# token offset / length, first posting, posting count
+_TOKEN_FIELDS = 4
+_SPARSE_STEP = 64
+
+_token_pattern = re.compile(r"[^\W_]+")
+
+_index = None
+_context_index = contextvars.ContextVar("fhir_converter_terminology_index", default=None)
+
+
+class TermMatch(NamedTuple):
+    code: str
+    display: str
+    # share of the matched term's words found in the text, 1.0 for whole-word matches
+    score: float
+
+
+def tokens(text: str) -> List[str]:
+    return _token_pattern.findall(text.lower())
+
+
+def normalize(text: str) -> str:
+    return " ".join(tokens(text))
+
+
+def load_terms(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Read ``(code, term)`` pairs from a FHIR ValueSet JSON file, an RF2 description file (active rows only) or a
+    two column TSV / CSV table with an optional ``code`` / ``term`` or ``display`` header.
+    """
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as fp:
+            yield from _value_set_terms(json.load(fp))
+        return
+    with open(path, encoding="utf-8", newline="") as fp:
+        sample = fp.readline()
+        fp.seek(0)
+        delimiter = "\t" if "\t" in sample else ","
+        rows = csv.reader(fp, delimiter=delimiter, quoting=csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL)
+        first = next(rows, [])
+        header = [name.strip().lower() for name in first]
+        if "conceptid" in header and "term" in header:
+            concept, term, active = header.index("conceptid"), header.index("term"), header.index("active")
+            yield from ((row[concept], row[term]) for row in rows if row and row[active] == "1")
+            return
+        if "code" in header:
+            term = header.index("term") if "term" in header else header.index("display")
+            code = header.index("code")
+        else:
+            code, term = 0, 1
+            rows = _chain([first], rows)
+        yield from ((row[code], row[term]) for row in rows if len(row) > max(code, term))
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+def _value_set_terms(value_set: dict) -> Iterator[Tuple[str, str]]:
+    def contains(items):
+        for item in items:
+            if item.get("code") and item.get("display"):
+                yield item["code"], item["display"]
+                for designation in item.get("designation", []):
+                    if designation.get("value"):
+                        yield item["code"], designation["value"]
+            yield from contains(item.get("contains", []))
+
+    yield from contains(value_set.get("expansion", {}).get("contains", []))
+    for include in value_set.get("compose", {}).get("include", []):
+        yield from contains(include.get("concept", []))
+
+
+class TerminologyIndex:
+    """
+    Read-only term index over a ``bytes`` buffer or a memory-mapped index file.
+    """
+
+    def __init__(self, buffer, cache_size: int = 65536, max_postings: int = 50000):
+        """
+        :param buffer: index bytes as written by ``save``
+        :param cache_size: texts kept in the ``lookup`` LRU cache
+        :param max_postings: words used by more terms than this (e.g. "of", "left") are ignored by partial matches
+        """
+        magic, self.term_count, self.token_count, posting_count, blob_size = _header.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("not a terminology index file")
+        if sys.byteorder != "little":
+            raise ValueError("terminology index files are little-endian")
+        self._buffer = buffer
+        view = memoryview(buffer)
+        offset = _header.size
+        size = self.term_count * _TERM_FIELDS * 4
+        self._terms = view[offset:offset + size].cast("I")
+        offset += size
+        size = self.token_count * _TOKEN_FIELDS * 4
+        self._tokens = view[offset:offset + size].cast("I")
+        offset += size
+        size = posting_count * 4
+        self._postings = view[offset:offset + size].cast("I")
+        offset += size
+        self._blob = view[offset:offset + blob_size]
+        self.max_postings = max_postings
+        self._sparse = None
+        self._digest = None
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def build(cls, terms: Iterable[Tuple[str, str]], **kwargs) -> "TerminologyIndex":
+        """
+        :param terms: ``(code, term)`` pairs, the first code of a term wins
+        """
+        by_term = {}
+        for code, term in terms:
+            key = normalize(term)
+            if key and key not in by_term:
+                by_term[key] = (code, term.strip())
+        keys = sorted(by_term, key=lambda key: key.encode("utf-8"))
+
+        blob = bytearray()
+        strings = {}
+
+        def add(text):
+            # codes and displays repeat (synonyms), store each string once
+            data = text.encode("utf-8")
+            if data not in strings:
+                strings[data] = len(blob)
+                blob.extend(data)
+            return strings[data], len(data)
+
+        term_table = []
+        postings = {}
+        for position, key in enumerate(keys):
+            code, display = by_term[key]
+            words = key.split(" ")
+            term_table.extend((*add(key), *add(code), *add(display), len(words)))
+            for word in dict.fromkeys(words):
+                postings.setdefault(word, []).append(position)
+        token_table = []
+        posting_table = []
+        for word in sorted(postings, key=lambda word: word.encode("utf-8")):
+            token_table.extend((*add(word), len(posting_table), len(postings[word])))
+            posting_table.extend(postings[word])
+
+        data = bytearray(_header.pack(MAGIC, len(keys), len(postings), len(posting_table), len(blob)))
+        for table in (term_table, token_table, posting_table):
+            data += struct.pack(f"<{len(table)}I", *table)
+        data += blob
+        return cls(bytes(data), **kwargs)
+
+    def save(self, path: str):
+        with open(path, "wb") as fp:
+            fp.write(self._buffer)
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> "TerminologyIndex":
+        """
+        Memory-map an index file, pages are only read when lookups touch them.
+        """
+        with open(path, "rb") as fp:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, **kwargs)
+
+    def __len__(self):
+        return self.term_count
+
+    @property
+    def digest(self) -> str:
+        """
+        Hash of the index content, computed on first use; equal for the same index opened twice.
+        """
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self._buffer, digest_size=16).hexdigest()
+        return self._digest
+
+    def _string(self, offset, length) -> bytes:
+        return bytes(self._blob[offset:offset + length])
+
+    def _term_key(self, position) -> bytes:
+        start = position * _TERM_FIELDS
+        return self._string(self._terms[start], self._terms[start + 1])
+
+    def _term_match(self, position, score) -> TermMatch:
+        start = position * _TERM_FIELDS
+        terms = self._terms
+        return TermMatch(
+            self._string(terms[start + 2], terms[start + 3]).decode("utf-8"),
+            self._string(terms[start + 4], terms[start + 5]).decode("utf-8"),
+            score,
+        )
+
+    def _find_term(self, key: bytes, low: int = 0) -> int:
+        """
+        :return: position of the first term not sorting before ``key``
+        """
+        if self._sparse is None:
+            # every 64th term in memory, the C bisect over it leaves a few steps on the index itself
+            self._sparse = [self._term_key(position) for position in range(0, self.term_count, _SPARSE_STEP)]
+        block = bisect.bisect_left(self._sparse, key)
+        low = max(low, (block - 1) * _SPARSE_STEP + 1 if block else 0)
+        high = min(block * _SPARSE_STEP, self.term_count)
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _postings_of(self, key: bytes):
+        tokens = self._tokens
+        low, high = 0, self.token_count
+        while low < high:
+            middle = (low + high) // 2
+            start = middle * _TOKEN_FIELDS
+            token = self._string(tokens[start], tokens[start + 1])
+            if token < key:
+                low = middle + 1
+            elif token > key:
+                high = middle
+            else:
+                first, count = tokens[start + 2], tokens[start + 3]
+                return self._postings[first:first + count]
+        return None
+
+    def _lookup(self, text: str, min_score: float = 1.0) -> Optional[TermMatch]:
+        words = [word.encode("utf-8") for word in tokens(text)]
+        key = b" ".join(words)
+        position = self._find_term(key)
+        if position < self.term_count and self._term_key(position) == key:
+            return self._term_match(position, 1.0)
+        best = None
+        for start in range(len(words)):
+            # extend the phrase word by word while some term still starts with it; words only contain word
+            # characters, so the terms continuing a phrase sort directly after it
+            key = b""
+            position = 0
+            for end in range(start, len(words)):
+                key = key + b" " + words[end] if key else words[end]
+                position = self._find_term(key, position)
+                if position == self.term_count:
+                    break
+                found = self._term_key(position)
+                if found == key:
+                    # longest phrase wins, the first one among equally long phrases
+                    if best is None or end - start + 1 > best[0]:
+                        best = (end - start + 1, position)
+                    position += 1
+                    if position == self.term_count or not self._term_key(position).startswith(key + b" "):
+                        break
+                elif not found.startswith(key + b" "):
+                    break
+        if best is not None:
+            return self._term_match(best[1], 1.0)
+        if min_score >= 1.0 or not words:
+            return None
+        return self._partial_match(set(words), min_score)
+
+    def _partial_match(self, words, min_score) -> Optional[TermMatch]:
+        # terms sharing words with the text, scored by the share of their words that occur in it
+        counts = Counter()
+        for word in words:
+            found = self._postings_of(word)
+            if found is not None and len(found) <= self.max_postings:
+                counts.update(found)
+        best = None
+        for position, matched in counts.items():
+            rank = (matched / self._terms[position * _TERM_FIELDS + 6], matched)
+            if best is None or rank > best[0]:
+                best = (rank, position)
+        if best is None or best[0][0] < min_score:
+            return None
+        return self._term_match(best[1], best[0][0])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[TermMatch]:
+        """
+        :return: up to ``limit`` terms starting with ``prefix``, in term order
+        """
+        key = normalize(prefix).encode("utf-8")
+        matches = []
+        position = self._find_term(key)
+        while position < self.term_count and len(matches) < limit and self._term_key(position).startswith(key):
+            matches.append(self._term_match(position, 1.0))
+            position += 1
+        return matches
+
+    def close(self):
+        self.lookup.cache_clear()
+        for view in (self._terms, self._tokens, self._postings, self._blob):
+            view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+def set_index(index: Optional[TerminologyIndex]):
+    """
+    Code clinical text with ``index`` in all threads, ``None`` leaves the codings empty.
+    """
+    global _index
+    _index = index
+
+
+@contextlib.contextmanager
+def using_index(index: TerminologyIndex):
+    """
+    Code clinical text with ``index`` inside the ``with`` block (current thread / task).
+    """
+    token = _context_index.set(index)
+    try:
+        yield index
+    finally:
+        _context_index.reset(token)
+
+
+def active_index() -> Optional[TerminologyIndex]:
+    index = _context_index.get()
+    return _index if index is None else index
+
+
+def text_codings(text: str) -> list:
+    """
+    :return: ``coding`` list for clinical free text, the SNOMED code of the active index or an empty coding
+    """
+    index = active_index()
+    match = index.lookup(text) if index is not None and text else None
+    if match is None:
+        return snomed_codings("", "")
+    return snomed_codings(match.code, match.display)
@@ -0,0 +1,490 @@
+"""
+ABDM health information transfer: converted bundles encrypted for an HIU with the ECDH / AES-GCM scheme of the ABDM
+data push, on a worker pool.
+
+    session = TransferSession.create(hiu_public_key, hiu_nonce)  # the HIU's keyMaterial values, base64
+    entries = encrypt_entries(session, bundles, care_context_references, workers=4)
+    push(data_push_url, data_push_body(session, entries, transaction_id))
+
+The key agreement is the one of ABDM's reference implementation (Fidelius, BouncyCastle ``curve25519``): ECDH on
+Curve25519 in short Weierstrass form, not X25519. Private keys are scalars below the group order, public keys are
+points, exchanged as X.509 SubjectPublicKeyInfo with explicit curve parameters holding the 65 byte uncompressed point
+(``keyValue``), and the shared secret is the 32 byte x-coordinate of the product. The AES-256-GCM key is the
+HKDF-SHA256 of the shared secret, salted with the first 20 bytes of the XOR of both nonces; the IV is its last 12
+bytes. The key is derived once per session and every entry of the push is encrypted with it. The scheme uses one key
+and IV for all entries of a push, which is what receivers expect: create a new session (new sender key and nonce)
+for every push and never reuse one across pushes.
+
+The curve arithmetic is plain Python (a few milliseconds per session) and not constant time.
+
+``Receiver`` and ``ReceiverServer`` are a local stand-in HIU, they decrypt pushes and verify the checksums.
+
+Needs ``cryptography`` (``pip install "fhir_converter[transfer]"``).
+"""
+import base64
+import datetime
+import functools
+import hashlib
+import json
+import os
+import secrets
+import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:
+    AESGCM = None
+
+CRYPTO_ALGORITHM = "ECDH"
+CURVE = "Curve25519"
+KEY_PARAMETERS = "Curve25519/32byte random key"
+MEDIA_TYPE = "application/fhir+json"
+
+_NONCE_SIZE = 32
+_SALT_SIZE = 20
+_IV_SIZE = 12
+
+# Curve25519 as y^2 = x^3 + a x + b: a Montgomery point (u, v) is the Weierstrass point (u + A / 3, v), A = 486662
+_P = 2 ** 255 - 19
+_MONTGOMERY_A = 486662
+_A = (3 - _MONTGOMERY_A ** 2) * pow(3, -1, _P) % _P
+_B = (2 * _MONTGOMERY_A ** 3 - 9 * _MONTGOMERY_A) * pow(27, -1, _P) % _P
+_U_OFFSET = _MONTGOMERY_A * pow(3, -1, _P) % _P
+# base point u = 9 and the order of its group, cofactor 8
+_G = (9 + _U_OFFSET, 0x20AE19A1B8A086B4E01EDD2C7748D14C923D4D7E6D7C61B229E9C5A27ECED3D9)
+_N = 2 ** 252 + 27742317777372353535851937790883648493
+_COFACTOR = 8
+
+Point = Tuple[int, int]
+
+
+def _require_cryptography():
+    if AESGCM is None:
+        raise ImportError('ABDM encryption needs the cryptography package: pip install "fhir_converter[transfer]"')
+
+
+def checksum(data: bytes) -> str:
+    """
+    :return: MD5 hex digest of the unencrypted entry content
+    """
+    return hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+
+def _double(point):
+    # Jacobian coordinates (X, Y, Z) for x = X / Z^2, y = Y / Z^3; Z == 0 is the point at infinity
+    x, y, z = point
+    if not y or not z:
+        return 0, 1, 0
+    yy = y * y % _P
+    zz = z * z % _P
+    s = 4 * x * yy % _P
+    m = (3 * x * x + _A * zz * zz) % _P
+    x3 = (m * m - 2 * s) % _P
+    return x3, (m * (s - x3) - 8 * yy * yy) % _P, 2 * y * z % _P
+
+
+def _add_affine(point, affine: Point):
+    x1, y1, z1 = point
+    if not z1:
+        return affine[0], affine[1], 1
+    zz = z1 * z1 % _P
+    h = (affine[0] * zz - x1) % _P
+    r = (affine[1] * zz * z1 - y1) % _P
+    if not h:
+        return _double(point) if not r else (0, 1, 0)
+    hh = h * h % _P
+    hhh = h * hh % _P
+    v = x1 * hh % _P
+    x3 = (r * r - hhh - 2 * v) % _P
+    return x3, (r * (v - x3) - y1 * hhh) % _P, z1 * h % _P
+
+
+def _multiply(scalar: int, point: Point) -> Optional[Point]:
+    """
+    :return: ``scalar * point`` in affine coordinates, None for the point at infinity
+    """
+    result = (0, 1, 0)
+    for bit in bin(scalar)[2:]:
+        result = _double(result)
+        if bit == "1":
+            result = _add_affine(result, point)
+    x, y, z = result
+    if not z:
+        return None
+    inverse = pow(z, -1, _P)
+    return x * inverse * inverse % _P, y * inverse * inverse * inverse % _P
+
+
+def _on_curve(point: Point) -> bool:
+    x, y = point
+    return 0 <= x < _P and 0 <= y < _P and (y * y - x * x * x - _A * x - _B) % _P == 0
+
+
+def _der(tag: int, content: bytes) -> bytes:
+    length = len(content)
+    if length < 0x80:
+        return bytes((tag, length)) + content
+    size = (length.bit_length() + 7) // 8
+    return bytes((tag, 0x80 | size)) + length.to_bytes(size, "big") + content
+
+
+def _der_integer(value: int) -> bytes:
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big"))
+
+
+def _encode_point(point: Point) -> bytes:
+    return b"\x04" + point[0].to_bytes(32, "big") + point[1].to_bytes(32, "big")
+
+
+# AlgorithmIdentifier of the keys: id-ecPublicKey with the explicit curve parameters, as BouncyCastle writes them
+_ALGORITHM_IDENTIFIER = _der(0x30, b"".join((
+    _der(0x06, bytes.fromhex("2a8648ce3d0201")),
+    _der(0x30, b"".join((
+        _der_integer(1),
+        _der(0x30, _der(0x06, bytes.fromhex("2a8648ce3d0101")) + _der_integer(_P)),
+        _der(0x30, _der(0x04, _A.to_bytes(32, "big")) + _der(0x04, _B.to_bytes(32, "big"))),
+        _der(0x04, _encode_point(_G)),
+        _der_integer(_N),
+        _der_integer(_COFACTOR),
+    ))),
+)))
+
+
+def _der_read(data: bytes, offset: int) -> Tuple[int, int, int]:
+    """
+    :return: tag, start and end of the content of the DER element at ``offset``
+    """
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("Truncated DER data")
+    return tag, offset, offset + length
+
+
+def _decode_point(data: bytes) -> Point:
+    if len(data) != 65 or data[0] != 4:
+        raise ValueError(f"Expected a 65 byte uncompressed curve25519 point, got {len(data)} bytes")
+    point = int.from_bytes(data[1:33], "big"), int.from_bytes(data[33:], "big")
+    if not _on_curve(point):
+        raise ValueError("The public key is not a point of curve25519")
+    return point
+
+
+class KeyMaterial(NamedTuple):
+    # scalar below the group order, 32 bytes big-endian
+    private_key: Optional[bytes]
+    # 65 byte uncompressed point
+    public_key: bytes
+    nonce: bytes
+
+    @classmethod
+    def generate(cls) -> "KeyMaterial":
+        return cls.from_private_key((secrets.randbelow(_N - 1) + 1).to_bytes(32, "big"), os.urandom(_NONCE_SIZE))
+
+    @classmethod
+    def from_private_key(cls, private_key: Union[str, bytes], nonce: Union[str, bytes]) -> "KeyMaterial":
+        """
+        Fixed key material, e.g. for test vectors.
+        :param private_key: big-endian scalar of any length (Fidelius' ``privateKey``), base64 text or bytes
+        :param nonce: 32 bytes, base64 text or bytes
+        """
+        data = base64.b64decode(private_key) if isinstance(private_key, str) else private_key
+        scalar = int.from_bytes(data, "big")
+        if not 0 < scalar < 2 ** 256:
+            raise ValueError("Private keys are positive scalars of at most 32 bytes")
+        return cls(scalar.to_bytes(32, "big"), _encode_point(_multiply(scalar, _G)), _nonce(nonce))
+
+    def public_key_value(self, encoding: str = "x509") -> str:
+        """
+        :param encoding: ``x509``: SubjectPublicKeyInfo DER, the ``keyValue`` of ``dhPublicKey``; ``raw``: the
+            uncompressed point (Fidelius' ``publicKey``)
+        :return: base64 public key
+        """
+        if encoding == "raw":
+            data = self.public_key
+        elif encoding == "x509":
+            data = _der(0x30, _ALGORITHM_IDENTIFIER + _der(0x03, b"\x00" + self.public_key))
+        else:
+            raise ValueError(f"Unknown public key encoding {encoding!r}, expected x509 or raw")
+        return base64.b64encode(data).decode("ascii")
+
+    def to_json(self, expiry: Optional[datetime.datetime] = None) -> dict:
+        """
+        :param expiry: key expiry, a day from now by default
+        :return: ``keyMaterial`` of a data push body or of a health information request
+        """
+        expiry = expiry or datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+        return {
+            "cryptoAlg": CRYPTO_ALGORITHM,
+            "curve": CURVE,
+            "dhPublicKey": {
+                "expiry": expiry.isoformat(),
+                "parameters": KEY_PARAMETERS,
+                "keyValue": self.public_key_value(),
+            },
+            "nonce": base64.b64encode(self.nonce).decode("ascii"),
+        }
+
+
+def load_public_key(value: Union[str, bytes]) -> Point:
+    """
+    :param value: ``keyValue``: X.509 SubjectPublicKeyInfo or 65 byte uncompressed point, base64 text or bytes
+    :return: the curve point
+    """
+    data = base64.b64decode(value) if isinstance(value, str) else bytes(value)
+    if data[:1] == b"\x30":
+        tag, start, end = _der_read(data, 0)
+        algorithm_tag, algorithm_start, algorithm_end = _der_read(data, start)
+        key_tag, key_start, key_end = _der_read(data, algorithm_end)
+        if tag != 0x30 or algorithm_tag != 0x30 or key_tag != 0x03 or data[key_start] != 0:
+            raise ValueError("Expected an X.509 SubjectPublicKeyInfo")
+        if bytes.fromhex("2a8648ce3d0201") not in data[algorithm_start:algorithm_end]:
+            raise ValueError("Expected an EC (id-ecPublicKey) public key")
+        data = data[key_start + 1:key_end]
+    return _decode_point(data)
+
+
+def shared_secret(private_key: bytes, peer_public_key: Point) -> bytes:
+    """
+    :return: x-coordinate of ``private_key * peer_public_key``, 32 bytes big-endian (BouncyCastle ``ECDH``)
+    """
+    product = _multiply(int.from_bytes(private_key, "big"), peer_public_key)
+    if product is None:
+        raise ValueError("Invalid public key, the shared secret is the point at infinity")
+    return product[0].to_bytes(32, "big")
+
+
+def _nonce(value: Union[str, bytes]) -> bytes:
+    data = value if isinstance(value, bytes) and len(value) == _NONCE_SIZE else base64.b64decode(value)
+    if len(data) != _NONCE_SIZE:
+        raise ValueError(f"Nonces are {_NONCE_SIZE} bytes, got {len(data)}")
+    return data
+
+
+class TransferSession:
+    """
+    Key material of one data push, shared by the sender and the receiver side: each side has its own ``KeyMaterial``
+    and the peer's public key and nonce, both derive the same AES key and IV.
+    """
+
+    def __init__(self, own: KeyMaterial, peer_public_key: Union[str, bytes], peer_nonce: Union[str, bytes]):
+        _require_cryptography()
+        self.own = own
+        self.peer_public_key = load_public_key(peer_public_key)
+        self.peer_nonce = _nonce(peer_nonce)
+        secret = shared_secret(own.private_key, self.peer_public_key)
+        mixed = bytes(a ^ b for a, b in zip(own.nonce, self.peer_nonce))
+        self.key = HKDF(algorithm=hashes.SHA256(), length=32, salt=mixed[:_SALT_SIZE], info=None).derive(secret)
+        self.iv = mixed[-_IV_SIZE:]
+        self._cipher = AESGCM(self.key)
+
+    @classmethod
+    def create(cls, requester_public_key: Union[str, bytes], requester_nonce: Union[str, bytes]) -> "TransferSession":
+        """
+        Sender session with a new key and nonce, for one push to the requester.
+        """
+        return cls(KeyMaterial.generate(), requester_public_key, requester_nonce)
+
+    def encrypt(self, data: bytes) -> str:
+        """
+        :return: base64 ciphertext, the ``content`` of a push entry
+        """
+        return base64.b64encode(self._cipher.encrypt(self.iv, data, None)).decode("ascii")
+
+    def decrypt(self, content: str) -> bytes:
+        return self._cipher.decrypt(self.iv, base64.b64decode(content), None)
+
+    def key_material(self, expiry: Optional[datetime.datetime] = None) -> dict:
+        return self.own.to_json(expiry)
+
+
+# worker state of process pools: the session cipher, built once per worker
+_worker_cipher = None
+
+
+def _init_worker(key):
+    global _worker_cipher
+    _worker_cipher = AESGCM(key)
+
+
+def _encrypt_chunk(cipher, iv, chunk):
+    cipher = cipher or _worker_cipher
+    return [
+        (base64.b64encode(cipher.encrypt(iv, data, None)).decode("ascii"), checksum(data))
+        for data in chunk
+    ]
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item.encode("utf-8") if isinstance(item, str) else bytes(item))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def encrypt_entries(
+    session: TransferSession,
+    bundles: Iterable[Union[bytes, str]],
+    care_context_references: Iterable[str],
+    workers: Optional[int] = None,
+    chunksize: int = 8,
+    processes: bool = False,
+) -> List[dict]:
+    """
+    Encrypt converted bundles into the ``entries`` of a data push, in order.
+    :param bundles: serialized bundles, ideally ``bytes`` (``output="bytes"``) which are encrypted as they are
+    :param care_context_references: care context reference of every bundle
+    :param workers: pool size, defaults to ``os.cpu_count()``; ``1`` encrypts on the calling thread
+    :param chunksize: bundles handed to a worker at once
+    :param processes: encrypt in worker processes instead of threads
+    :return: entry dicts with ``content``, ``media``, ``checksum`` and ``careContextReference``
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(bundles, chunksize)
+    if workers == 1:
+        encrypted = [item for chunk in chunks for item in _encrypt_chunk(session._cipher, session.iv, chunk)]
+    elif processes:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(session.key,)) as executor:
+            results = executor.map(functools.partial(_encrypt_chunk, None, session.iv), chunks)
+            encrypted = [item for result in results for item in result]
+    else:
+        with ThreadPoolExecutor(workers) as executor:
+            results = executor.map(functools.partial(_encrypt_chunk, session._cipher, session.iv), chunks)
+            encrypted = [item for result in results for item in result]
+
+    references = list(care_context_references)
+    if len(references) != len(encrypted):
+        raise ValueError(f"{len(encrypted)} bundles but {len(references)} care context references")
+    return [
+        {"content": content, "media": MEDIA_TYPE, "checksum": digest, "careContextReference": reference}
+        for (content, digest), reference in zip(encrypted, references)
+    ]
+
+
+def data_push_body(
+    session: TransferSession,
+    entries: List[dict],
+    transaction_id: str,
+    page_number: int = 0,
+    page_count: int = 1,
+    expiry: Optional[datetime.datetime] = None,
+) -> dict:
+    """
+    :return: body of the data push to the HIU's ``dataPushUrl``
+    """
+    return {
+        "pageNumber": page_number,
+        "pageCount": page_count,
+        "transactionId": transaction_id,
+        "entries": entries,
+        "keyMaterial": session.key_material(expiry),
+    }
+
+
+def push(url: str, body: dict, timeout: float = 30.0) -> int:
+    """
+    POST a data push body.
+    :return: HTTP status
+    """
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status
+
+
+class ChecksumError(ValueError):
+    def __init__(self, position: int, care_context_reference: Optional[str]):
+        self.position = position
+        self.care_context_reference = care_context_reference
+        super().__init__(f"Entry {position} ({care_context_reference}) does not match its checksum")
+
+
+class Receiver:
+    """
+    Receiving side of a push, for testing senders offline: holds the requester key material the sender encrypts for.
+    """
+
+    def __init__(self, key_material: Optional[KeyMaterial] = None):
+        self.key_material = key_material or KeyMaterial.generate()
+
+    def request_key_material(self, expiry: Optional[datetime.datetime] = None) -> dict:
+        """
+        :return: ``keyMaterial`` of the health information request, the sender's session is created from it
+        """
+        return self.key_material.to_json(expiry)
+
+    def open(self, body: dict) -> List[bytes]:
+        """
+        Decrypt the entries of a push body and verify their checksums.
+        :return: the unencrypted bundles
+        """
+        sender = body["keyMaterial"]
+        session = TransferSession(self.key_material, sender["dhPublicKey"]["keyValue"], sender["nonce"])
+        bundles = []
+        for position, entry in enumerate(body.get("entries", [])):
+            data = session.decrypt(entry["content"])
+            if checksum(data) != entry.get("checksum"):
+                raise ChecksumError(position, entry.get("careContextReference"))
+            bundles.append(data)
+        return bundles
+
+
+class ReceiverRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            push_body = json.loads(body)
+            bundles = self.server.receiver.open(push_body)
+        except Exception as e:
+            self._respond(HTTPStatus.BAD_REQUEST, {"error_type": type(e).__name__, "error": str(e)})
+            return
+        with self.server.lock:
+            self.server.received.append((push_body["transactionId"], bundles))
+        self._respond(HTTPStatus.ACCEPTED, {"entries": len(bundles)})
+
+    def _respond(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReceiverServer(ThreadingHTTPServer):
+    """
+    Local stand-in HIU: accepts data pushes on any path, keeps ``(transaction id, bundles)`` in ``received``.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), receiver: Optional[Receiver] = None):
+        super().__init__(address, ReceiverRequestHandler)
+        self.receiver = receiver or Receiver()
+        self.received = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/data/push"
@@ -0,0 +1,327 @@
+"""
+Bulk upload of converted documents to a FHIR server as ``transaction`` bundles:
+
+    with FhirClient("https://fhir.example.org/fhir", max_connections=8) as client:
+        for outcome in client.upload(bundles, max_entries=200):
+            if outcome.error:
+                print(outcome.document, outcome.resource_type, outcome.status, outcome.error)
+
+Documents are grouped into transactions of at most ``max_entries`` entries, a document is never split (its
+``urn:uuid`` references resolve inside the transaction) and participants shared by documents are sent once per
+transaction. Transactions are posted over pooled keep-alive connections, at most ``max_connections`` at a time. Every resource
+gets an ``UploadOutcome`` from the ``transaction-response``.
+
+Retries never risk creating a resource twice. A POST transaction is retried (with exponential backoff) only when the
+server did not apply it: on 429 and 503 responses, and on connection errors raised before the request was sent. With
+``method="PUT"`` every entry updates the resource at its converter assigned id, the transaction is idempotent and is
+also retried on 500, 502, 504 and on connection errors while waiting for the response.
+"""
+import contextlib
+import http.client
+import itertools
+import queue
+import random
+import select
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from fhir_converter.serializer import dumps_bytes, loads
+
+FHIR_JSON = "application/fhir+json"
+# worth retrying any request, the server did not apply it
+retry_statuses = frozenset({429, 503})
+# worth retrying idempotent requests only, the server may have applied the request before failing
+idempotent_retry_statuses = frozenset({500, 502, 504})
+
+
+class UploadOutcome(NamedTuple):
+    # position of the document in the upload
+    document: int
+    full_url: Optional[str]
+    resource_type: Optional[str]
+    # HTTP status of the resource in the transaction response, 0 when no response was received
+    status: int
+    # ``response.location`` of the created resource
+    location: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None and 200 <= self.status < 300
+
+
+class Transaction(NamedTuple):
+    # transaction bundle JSON
+    body: bytes
+    # (document, fullUrl, resourceType) of every request entry, in entry order
+    entries: List[Tuple[int, str, str]]
+    # entries of the documents that could not be sent: (document, fullUrl, resourceType, error)
+    rejected: List[Tuple[int, Optional[str], Optional[str], str]]
+    # request method of the entries, ``PUT`` transactions are idempotent
+    method: str = "POST"
+
+
+def transaction_batches(
+    outputs: Iterable[Union[str, bytes, dict]],
+    max_entries: int = 100,
+    method: str = "POST",
+) -> Iterator[Transaction]:
+    """
+    Group converter outputs into transaction bundles, in order.
+    :param outputs: converter outputs (JSON text, bytes or ``output="dict"``), one document each
+    :param max_entries: entries per transaction, a larger document gets a transaction of its own
+    :param method: ``POST`` creates every resource with a server assigned id, ``PUT`` creates or updates it at
+        ``<resourceType>/<id>`` (the server must accept client assigned ids)
+    :return: iterator of ``Transaction``
+    """
+    if method not in ("POST", "PUT"):
+        raise ValueError(f"Unsupported transaction method: {method}")
+    entries, described, urls, rejected = [], [], set(), []
+
+    def transaction():
+        return Transaction(dumps_bytes({"resourceType": "Bundle", "type": "transaction", "entry": entries}),
+                           described, rejected, method)
+
+    for document, output in enumerate(outputs):
+        bundle = output if isinstance(output, dict) else loads(output)
+        requests, errors = [], []
+        for entry in bundle.get("entry") or []:
+            url = entry.get("fullUrl")
+            resource = entry.get("resource") or {}
+            resource_type = resource.get("resourceType")
+            if not resource_type:
+                errors.append((document, url, None, "entry has no resourceType"))
+                continue
+            if method == "PUT" and not resource.get("id"):
+                errors.append((document, url, resource_type, "PUT needs a resource id"))
+                continue
+            request_url = f"{resource_type}/{resource['id']}" if method == "PUT" else resource_type
+            requests.append((url, resource_type, {
+                "fullUrl": url,
+                "resource": resource,
+                "request": {"method": method, "url": request_url},
+            }))
+        # participants already in the transaction are referenced, not sent again
+        new = [request for request in requests if request[0] is None or request[0] not in urls]
+        if entries and len(entries) + len(new) > max_entries:
+            yield transaction()
+            entries, described, urls, rejected = [], [], set(), []
+            new = requests
+        rejected.extend(errors)
+        for url, resource_type, entry in new:
+            entries.append(entry)
+            described.append((document, url, resource_type))
+            urls.add(url)
+    if entries or rejected:
+        yield transaction()
+
+
+class FhirClient:
+    """
+    FHIR REST client over a pool of keep-alive HTTP connections, safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 4,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        headers: Optional[dict] = None,
+    ):
+        """
+        :param base_url: FHIR base URL, transactions are posted to it
+        :param max_connections: connections kept open, and transactions in flight at a time
+        :param retries: retries of a request the server did not apply (see ``request``)
+        :param backoff: first retry delay in seconds, doubled on every retry (with jitter), ``Retry-After`` wins
+        :param headers: extra request headers, e.g. ``Authorization``
+        """
+        url = urlsplit(base_url)
+        self._connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host = url.hostname
+        self._port = url.port
+        self._path = url.path.rstrip("/") or "/"
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.headers = {"Content-Type": FHIR_JSON, "Accept": FHIR_JSON, **(headers or {})}
+        self._connections = queue.LifoQueue()
+        self._lock = threading.Lock()
+        # requests sent (retries included) and connections opened, for tuning
+        self.requests = 0
+        self.connects = 0
+
+    @contextlib.contextmanager
+    def _connection(self):
+        try:
+            connection = self._connections.get_nowait()
+            if _dropped(connection):
+                # closed by the server while idle, reconnect instead of sending into it
+                connection.close()
+        except queue.Empty:
+            connection = self._connection_class(self._host, self._port, timeout=self.timeout)
+            with self._lock:
+                self.connects += 1
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+        if self._connections.qsize() < self.max_connections:
+            self._connections.put(connection)
+        else:
+            connection.close()
+
+    def _send(self, method, path, body):
+        with self._connection() as connection:
+            with self._lock:
+                self.requests += 1
+            try:
+                connection.request(method, path, body=body, headers=self.headers)
+            except (OSError, http.client.HTTPException) as e:
+                # at most a partial request reached the server, it cannot have applied it
+                raise _NotSent() from e
+            response = connection.getresponse()
+            data = response.read()
+            if response.getheader("Connection", "").lower() == "close":
+                connection.close()
+            return response.status, response.getheader("Retry-After"), data
+
+    def request(
+        self,
+        method: str,
+        path: str = "",
+        body: Optional[bytes] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Tuple[int, bytes]:
+        """
+        Send a request, retried on ``retry_statuses`` and on connection errors before it was sent. An idempotent
+        request is also retried on ``idempotent_retry_statuses`` and on connection errors after it was sent.
+        :param path: relative to the base URL, e.g. ``Patient``
+        :param idempotent: whether sending the request twice is harmless, by default all but POST and PATCH are
+        :return: status and body of the final response
+        :raises OSError: connection error after the last retry, or one a non-idempotent request may have been
+            applied before
+        """
+        if idempotent is None:
+            idempotent = method not in ("POST", "PATCH")
+        path = self._path if not path else f"{self._path.rstrip('/')}/{path}"
+        for attempt in itertools.count():
+            try:
+                status, retry_after, data = self._send(method, path, body)
+            except _NotSent as e:
+                if attempt >= self.retries:
+                    raise e.__cause__
+                delay = None
+            except (OSError, http.client.HTTPException):
+                if not idempotent or attempt >= self.retries:
+                    raise
+                delay = None
+            else:
+                retry = status in retry_statuses or idempotent and status in idempotent_retry_statuses
+                if not retry or attempt >= self.retries:
+                    return status, data
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+            if delay is None:
+                delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+            time.sleep(delay)
+
+    def post_transaction(self, transaction: Transaction) -> List[UploadOutcome]:
+        outcomes = [UploadOutcome(document, url, resource_type, 0, error=error)
+                    for document, url, resource_type, error in transaction.rejected]
+        if not transaction.entries:
+            return outcomes
+        try:
+            status, data = self.request("POST", "", transaction.body, idempotent=transaction.method == "PUT")
+        except (OSError, http.client.HTTPException) as e:
+            error = f"{type(e).__name__}: {e}"
+            return outcomes + [UploadOutcome(document, url, resource_type, 0, error=error)
+                               for document, url, resource_type in transaction.entries]
+        response = _parse(data)
+        if status >= 300 or response.get("resourceType") != "Bundle":
+            error = _diagnostics(response) or f"HTTP {status}"
+            return outcomes + [UploadOutcome(document, url, resource_type, status, error=error)
+                               for document, url, resource_type in transaction.entries]
+        responses = [entry.get("response") or {} for entry in response.get("entry") or []]
+        for (document, url, resource_type), result in itertools.zip_longest(transaction.entries, responses):
+            if document is None:
+                break
+            if result is None:
+                outcomes.append(UploadOutcome(document, url, resource_type, 0, error="missing in the response"))
+                continue
+            entry_status = int((result.get("status") or "0").split(" ", 1)[0] or 0)
+            error = None if 200 <= entry_status < 300 else _diagnostics(result.get("outcome")) or result.get("status")
+            outcomes.append(UploadOutcome(document, url, resource_type, entry_status, result.get("location"), error))
+        return outcomes
+
+    def upload(
+        self,
+        outputs: Iterable[Union[str, bytes, dict]],
+        max_entries: int = 100,
+        method: str = "POST",
+    ) -> Iterator[UploadOutcome]:
+        """
+        Upload converter outputs as transactions, ``max_connections`` of them in flight at a time.
+        :param outputs: converter outputs, one document each, consumed lazily
+        :param max_entries: entries per transaction
+        :param method: entry request method, see ``transaction_batches``
+        :return: iterator of ``UploadOutcome``, transaction by transaction in input order
+        """
+        transactions = transaction_batches(outputs, max_entries, method)
+        with ThreadPoolExecutor(self.max_connections) as executor:
+            pending = []
+            for transaction in transactions:
+                pending.append(executor.submit(self.post_transaction, transaction))
+                if len(pending) >= self.max_connections * 2:
+                    wait(pending[:1], return_when=FIRST_COMPLETED)
+                    while pending and pending[0].done():
+                        yield from pending.pop(0).result()
+            for future in pending:
+                yield from future.result()
+
+    def close(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _NotSent(Exception):
+    """
+    The request did not reach the server, the connection error is the ``__cause__``.
+    """
+
+
+def _dropped(connection) -> bool:
+    """
+    :return: whether an idle pooled connection was closed by the server, it is readable (EOF) when it was
+    """
+    sock = connection.sock
+    return sock is not None and bool(select.select([sock], [], [], 0)[0])
+
+
+def _parse(data: bytes) -> dict:
+    try:
+        value = loads(data) if data else {}
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def _diagnostics(outcome) -> Optional[str]:
+    if not isinstance(outcome, dict) or outcome.get("resourceType") != "OperationOutcome":
+        return None
+    issues = outcome.get("issue") or []
+    return "; ".join(issue.get("diagnostics") or issue.get("code") or "" for issue in issues) or None
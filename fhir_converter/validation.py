@@ -0,0 +1,269 @@
+"""
+Sampled background validation of converter output.
+
+The converters build resources with ``construct()``, which skips validation. A ``BackgroundValidator`` fully
+validates a sample of the produced bundles on a worker pool and reports the failures through a callback, the
+conversion itself never waits for it:
+
+    validator = BackgroundValidator(on_failure=lambda failure: logger.warning("%s", failure), every=100)
+    set_validator(validator)
+    ...
+    validator.close()
+"""
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional
+
+from fhir_converter.integrity import check_bundle
+from fhir_converter.registry import get_bundle_builder
+from fhir_converter.serializer import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+_validator = None
+# Composition.type code -> document type, op_consult shares the discharge summary code and its model families
+_composition_types = {
+    "440545006": "prescription",
+    "721981007": "diagnostic_report",
+    "371530004": "discharge_summary",
+}
+_context_validator = contextvars.ContextVar("fhir_converter_validator", default=None)
+
+
+class ValidationFailure(NamedTuple):
+    document_type: str
+    errors: List[str]
+    # the serialized bundle, compact JSON bytes
+    output: bytes
+
+
+@functools.lru_cache(maxsize=None)
+def model_classes(document_type: str) -> dict:
+    """
+    :param document_type: one of ``registry.document_converters``
+    :return: model class by resource type for the ``fhir.resources`` models the document type's builder module
+        imports, e.g. the R4B DiagnosticReport of ``diagnostic_report``
+    """
+    from fhir.resources.core.fhirabstractmodel import FHIRAbstractModel
+
+    module = sys.modules[get_bundle_builder(document_type).__module__]
+    return {
+        value.get_resource_type(): value
+        for value in vars(module).values()
+        if isinstance(value, type) and issubclass(value, FHIRAbstractModel) and value.__module__.startswith("fhir.")
+    }
+
+
+def _errors(error, prefix: str) -> List[str]:
+    from pydantic.v1 import ValidationError
+
+    if isinstance(error, ValidationError):
+        return [f"{prefix}{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors()]
+    # e.g. LookupError for resource types the models do not know
+    return [f"{prefix.rstrip('.') or 'bundle'}: {type(error).__name__}: {error}"]
+
+
+def validate_bundle(output, document_type: Optional[str] = None) -> List[str]:
+    """
+    Fully validate converter output against the ``fhir.resources`` models and check its reference integrity.
+
+    Every entry is validated with the model family it was built from: the document type's builder may use other
+    FHIR versions than the default (R4B ``Media``, ``DiagnosticReport`` and ``ServiceRequest`` for
+    ``diagnostic_report``), which the default ``Bundle`` model cannot load.
+
+    :param output: JSON text / bytes or dict of a bundle
+    :param document_type: one of ``registry.document_converters``, inferred from the bundle when not given;
+        the default models are used for document types that cannot be inferred
+    :return: validation errors, empty when the bundle is valid
+    """
+    import fhir.resources
+    from fhir.resources.bundle import Bundle
+
+    bundle = json.loads(output) if isinstance(output, (str, bytes)) else output
+    if document_type is None:
+        document_type = bundle_document_type(bundle)
+    classes = model_classes(document_type) if document_type else {}
+    errors = []
+    entries = bundle.get("entry") or []
+    # the envelope on its own, every resource is validated with its own model below
+    envelope = dict(bundle, entry=[{key: value for key, value in entry.items() if key != "resource"}
+                                   for entry in entries])
+    try:
+        Bundle.parse_obj(envelope)
+    except Exception as e:
+        errors.extend(_errors(e, ""))
+    for position, entry in enumerate(entries):
+        resource = entry.get("resource")
+        if resource is None:
+            continue
+        prefix = f"entry.{position}.resource."
+        resource_type = resource.get("resourceType")
+        try:
+            model = classes.get(resource_type) or fhir.resources.get_fhir_model_class(resource_type)
+            model.parse_obj(resource)
+        except Exception as e:
+            errors.extend(_errors(e, prefix))
+    errors.extend(f"entry.{issue.entry}: {issue.detail}" for issue in check_bundle(bundle))
+    return errors
+
+
+def bundle_document_type(bundle: dict) -> Optional[str]:
+    """
+    :return: document type of the Composition's SNOMED type code, ``None`` when not recognised
+    """
+    for entry in bundle.get("entry") or []:
+        resource = entry.get("resource") or {}
+        if resource.get("resourceType") == "Composition":
+            codings = (resource.get("type") or {}).get("coding") or []
+            if isinstance(codings, dict):
+                codings = [codings]
+            for coding in codings:
+                document_type = _composition_types.get(coding.get("code"))
+                if document_type:
+                    return document_type
+            return None
+    return None
+
+
+def _validate_timed(output, document_type):
+    started = time.perf_counter()
+    errors = validate_bundle(output, document_type)
+    return errors, time.perf_counter() - started
+
+
+class BackgroundValidator:
+    """
+    Validates every ``every``-th conversion, or as many as fit in a share of wall time, on a worker pool.
+    """
+
+    def __init__(
+        self,
+        on_failure: Callable[[ValidationFailure], None],
+        every: Optional[int] = 100,
+        time_budget: Optional[float] = None,
+        max_workers: int = 1,
+        processes: bool = False,
+        max_pending: int = 64,
+    ):
+        """
+        :param on_failure: called with a ``ValidationFailure`` for every sampled bundle that is invalid, from a
+            worker thread
+        :param every: validate one in ``every`` conversions, ignored when ``time_budget`` is given
+        :param time_budget: share of wall time to spend validating, e.g. ``0.05``; a conversion is sampled while
+            the validation time so far is below the budget
+        :param max_workers: validation workers
+        :param processes: validate in worker processes, the output then is pickled to the worker
+        :param max_pending: samples queued at most, further samples are skipped until the workers catch up
+        """
+        if time_budget is None and (not every or every < 1):
+            raise ValueError("either every >= 1 or time_budget is required")
+        self.on_failure = on_failure
+        self.every = every
+        self.time_budget = time_budget
+        self.max_pending = max_pending
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._executor = executor_class(max_workers=max_workers)
+        self._counter = itertools.count()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.validation_time = 0.0
+        self.sampled = 0
+        self.validated = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _should_sample(self) -> bool:
+        if self.time_budget is not None:
+            if not self.validated:
+                return not self._pending
+            # queued samples are charged at the average validation time so far
+            committed = self.validation_time * (1 + self._pending / self.validated)
+            return committed <= self.time_budget * (time.perf_counter() - self._started)
+        return next(self._counter) % self.every == 0
+
+    def offer(self, document_type: str, output):
+        """
+        Called after every conversion, queues the output for validation when it is sampled.
+        :param output: converter output in any of ``serializer.output_formats``
+        """
+        if not self._should_sample():
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.skipped += 1
+                return
+            self._pending += 1
+            self.sampled += 1
+        if isinstance(output, dict):
+            # the caller owns the dict and may change it after the conversion returned
+            output = dumps_bytes(output)
+        elif isinstance(output, str):
+            output = output.encode("utf-8")
+        future = self._executor.submit(_validate_timed, output, document_type)
+        future.add_done_callback(lambda done: self._done(document_type, output, done))
+
+    def _done(self, document_type, output, future):
+        with self._lock:
+            self._pending -= 1
+        if future.cancelled():
+            return
+        try:
+            errors, seconds = future.result()
+        except Exception:
+            logger.exception("validation of a %s bundle failed to run", document_type)
+            return
+        with self._lock:
+            self.validation_time += seconds
+            self.validated += 1
+            if errors:
+                self.failed += 1
+        if errors:
+            try:
+                self.on_failure(ValidationFailure(document_type, errors, output))
+            except Exception:
+                logger.exception("validation failure callback %r failed", self.on_failure)
+
+    def close(self, wait: bool = True):
+        """
+        Stop validating, ``wait`` for the queued samples or drop them.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def set_validator(validator: Optional[BackgroundValidator]):
+    """
+    Sample the conversions of all threads with ``validator``, ``None`` stops sampling.
+    """
+    global _validator
+    _validator = validator
+
+
+@contextlib.contextmanager
+def validating(validator: BackgroundValidator):
+    """
+    Sample the conversions inside the ``with`` block (current thread / task) with ``validator``.
+    """
+    token = _context_validator.set(validator)
+    try:
+        yield validator
+    finally:
+        _context_validator.reset(token)
+
+
+def active_validator() -> Optional[BackgroundValidator]:
+    return _context_validator.get() or _validator
@@ -6,5 +6,7 @@ setup(
     version='0.0.5',
     description='Dashmed fhir converter',
     install_requires=["fhir.resources"],
+    extras_require={"fast": ["orjson"], "zstd": ["zstandard"], "transfer": ["cryptography"]},
+    entry_points={"console_scripts": ["fhir-convert=fhir_converter.cli:main"]},
     author='Vibhor',
 )
\ No newline at end of file
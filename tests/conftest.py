@@ -0,0 +1,30 @@
+import copy
+import threading
+
+import pytest
+
+from benchmarks.samples import sample_inputs
+from tests.fhir_server import LocalFhirServer
+
+
+@pytest.fixture
+def inputs():
+    """Fresh copies of the sample converter inputs by document type."""
+    return copy.deepcopy(sample_inputs)
+
+
+@pytest.fixture
+def fhir_server():
+    """Start a ``LocalFhirServer`` with the given options, shut down after the test."""
+    servers = []
+
+    def start(**options):
+        server = LocalFhirServer(**options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
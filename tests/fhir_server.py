@@ -0,0 +1,148 @@
+"""
+Local stand-in FHIR server for testing and benchmarking uploads offline.
+"""
+import itertools
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from fhir_converter.upload import FHIR_JSON
+
+
+class LocalFhirRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            fail = server.fail_requests > 0
+            if fail:
+                server.fail_requests -= 1
+        if fail:
+            self._respond(server.fail_status, _operation_outcome("transient", "try again"), {"Retry-After": "0"})
+            return
+        try:
+            resource = json.loads(body)
+        except ValueError as e:
+            self._respond(HTTPStatus.BAD_REQUEST, _operation_outcome("invalid", str(e)))
+            return
+        path = urlsplit(self.path).path.strip("/").rsplit("/", 1)[-1]
+        if resource.get("resourceType") == "Bundle" and resource.get("type") == "transaction":
+            status, payload = server.apply_transaction(resource)
+            with server.lock:
+                lose = status == HTTPStatus.OK and server.lose_responses > 0
+                if lose:
+                    server.lose_responses -= 1
+            if lose:
+                self._respond(HTTPStatus.BAD_GATEWAY, _operation_outcome("exception", "response lost"))
+            else:
+                self._respond(status, payload)
+        elif resource.get("resourceType") == path:
+            self._respond(HTTPStatus.CREATED, server.store(resource))
+        else:
+            self._respond(HTTPStatus.BAD_REQUEST, _operation_outcome("invalid", f"cannot POST to {self.path}"))
+
+    def _respond(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", FHIR_JSON)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _operation_outcome(code, diagnostics):
+    return {"resourceType": "OperationOutcome", "issue": [{"severity": "error", "code": code,
+                                                           "diagnostics": diagnostics}]}
+
+
+class LocalFhirServer(ThreadingHTTPServer):
+    """
+    Local stand-in FHIR server: stores POSTed resources and applies transactions in memory, resolving ``urn:uuid``
+    references to the assigned ids.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency: float = 0.0, fail_requests: int = 0,
+                 fail_status: int = HTTPStatus.SERVICE_UNAVAILABLE, lose_responses: int = 0,
+                 reject_types: Iterable[str] = (), idle_timeout: Optional[float] = None):
+        """
+        :param latency: seconds every request takes, to stand in for the network and the server
+        :param fail_requests: answer this many requests with ``fail_status`` first, without applying them
+        :param fail_status: status of the failed requests, e.g. 429 or 503
+        :param lose_responses: apply this many transactions, then answer them with 502 as a failing proxy would
+        :param reject_types: resource types whose transaction entries fail with 422 (the transaction fails as a whole)
+        :param idle_timeout: seconds a keep-alive connection may stay idle before the server closes it
+        """
+        super().__init__(address, LocalFhirRequestHandler)
+        self.latency = latency
+        self.fail_requests = fail_requests
+        self.fail_status = fail_status
+        self.lose_responses = lose_responses
+        self.reject_types = set(reject_types)
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.requests = 0
+        self.transactions = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/fhir"
+
+    def store(self, resource: dict) -> dict:
+        with self.lock:
+            resource = dict(resource, id=str(next(self._ids)))
+            self.resources[f"{resource['resourceType']}/{resource['id']}"] = resource
+        return resource
+
+    def apply_transaction(self, bundle: dict):
+        """
+        :return: HTTP status and the ``transaction-response``, or 422 and an ``OperationOutcome``
+        """
+        entries = bundle.get("entry") or []
+        rejected = [entry for entry in entries if entry["resource"].get("resourceType") in self.reject_types]
+        if rejected:
+            kind = rejected[0]["resource"]["resourceType"]
+            return HTTPStatus.UNPROCESSABLE_ENTITY, _operation_outcome("processing", f"{kind} is not accepted")
+        with self.lock:
+            assigned = {}
+            for entry in entries:
+                request = entry.get("request") or {}
+                if request.get("method") == "PUT":
+                    location = request["url"]
+                else:
+                    location = f"{entry['resource']['resourceType']}/{next(self._ids)}"
+                assigned[entry.get("fullUrl") or location] = location
+        text = json.dumps(entries)
+        for full_url, location in assigned.items():
+            if full_url != location:
+                text = text.replace(f'"{full_url}"', f'"{location}"')
+        response = []
+        with self.lock:
+            self.transactions += 1
+            for entry, location in zip(json.loads(text), assigned.values()):
+                created = location not in self.resources
+                self.resources[location] = dict(entry["resource"], id=location.split("/")[1])
+                status = "201 Created" if created else "200 OK"
+                response.append({"response": {"status": status, "location": f"{location}/_history/1"}})
+        return HTTPStatus.OK, {"resourceType": "Bundle", "type": "transaction-response", "entry": response}
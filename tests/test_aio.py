@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from fhir_converter.aio import AsyncConverter
+
+
+async def slow_producer(inputs, count, delay):
+    for _ in range(count):
+        yield inputs["prescription"]
+        await asyncio.sleep(delay)
+
+
+async def collect(converter, stream, **kwargs):
+    started = time.perf_counter()
+    arrivals = []
+    async for result in converter.convert_stream(stream, "prescription", **kwargs):
+        arrivals.append((result, time.perf_counter() - started))
+    return arrivals
+
+
+def test_results_not_held_back_by_slow_producer(inputs):
+    async def run():
+        async with AsyncConverter(max_workers=2) as converter:
+            return await collect(converter, slow_producer(inputs, 4, 0.5), max_concurrency=8)
+
+    arrivals = asyncio.run(run())
+    assert [result.index for result, _ in arrivals] == [0, 1, 2, 3]
+    assert all(result.ok for result, _ in arrivals)
+    # the first bundle arrives long before the producer is done (about 2 s)
+    assert arrivals[0][1] < 1.0
+
+
+def test_bounded_and_ordered(inputs):
+    async def run():
+        async with AsyncConverter(max_workers=2) as converter:
+            records = [inputs["prescription"]] * 10 + [{"broken": True}] + [inputs["prescription"]] * 5
+            ordered = await collect(converter, records, max_concurrency=3)
+            unordered = await collect(converter, records, max_concurrency=3, ordered=False)
+            return ordered, unordered
+
+    ordered, unordered = asyncio.run(run())
+    assert [result.index for result, _ in ordered] == list(range(16))
+    assert sorted(result.index for result, _ in unordered) == list(range(16))
+    assert [result.index for result, _ in ordered if not result.ok] == [10]
+
+
+def test_closing_the_stream_early(inputs):
+    async def run():
+        async with AsyncConverter(max_workers=2) as converter:
+            stream = converter.convert_stream(slow_producer(inputs, 100, 0.01), "prescription", max_concurrency=4)
+            results = []
+            async for result in stream:
+                results.append(result)
+                if len(results) == 3:
+                    break
+            await stream.aclose()
+            return results
+
+    assert [result.index for result in asyncio.run(run())] == [0, 1, 2]
@@ -0,0 +1,60 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from fhir_converter.cache import ConversionCache, MemoryCache
+from fhir_converter.pool import ResourcePool
+from fhir_converter.terminology import TerminologyIndex, using_index
+
+
+def test_counters_under_threads(inputs):
+    cache = ConversionCache(MemoryCache())
+    calls = 400
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: cache.convert("prescription", inputs["prescription"], "bytes"), range(calls)))
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == calls
+    assert stats["misses"] >= 1
+    assert stats["entries"] == 1
+
+
+def snomed_codes(bundle):
+    return [coding["code"] for entry in json.loads(bundle)["entry"]
+            for coding in (entry["resource"].get("code") or {}).get("coding") or [] if isinstance(coding, dict)]
+
+
+def test_terminology_index_is_part_of_the_key(inputs):
+    cache = ConversionCache(MemoryCache())
+    input_json = inputs["discharge_summary"]
+    without_index = cache.convert("discharge_summary", input_json)
+    assert "49727002" not in snomed_codes(without_index)
+
+    index = TerminologyIndex.build([("49727002", "Cough"), ("386661006", "Fever")])
+    with using_index(index):
+        with_index = cache.convert("discharge_summary", input_json)
+        assert "49727002" in snomed_codes(with_index)
+        assert cache.convert("discharge_summary", input_json) == with_index
+    # the same content opened again maps to the same entries
+    with using_index(TerminologyIndex(bytes(index._buffer))):
+        assert cache.convert("discharge_summary", input_json) == with_index
+    assert cache.convert("discharge_summary", input_json) == without_index
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_pool_and_file_inputs_bypass_the_cache(inputs, tmp_path):
+    cache = ConversionCache(MemoryCache())
+    with ResourcePool().activate():
+        cache.convert("prescription", inputs["prescription"])
+    image = tmp_path / "scan.jpg"
+    image.write_bytes(b"first")
+    input_json = dict(inputs["diagnostic_report"], imaging={"type": "image/jpeg", "path": str(image)})
+    first = cache.convert("diagnostic_report", input_json, "dict")
+    image.write_bytes(b"second")
+    second = cache.convert("diagnostic_report", input_json, "dict")
+
+    def media_data(bundle):
+        return [entry["resource"]["content"]["data"] for entry in bundle["entry"]
+                if entry["resource"]["resourceType"] == "Media"]
+
+    assert media_data(first) != media_data(second)
+    assert cache.stats()["bypassed"] == 3
+    assert len(cache.backend) == 0
@@ -0,0 +1,117 @@
+import gzip
+import json
+import os
+import signal
+
+import pytest
+
+from fhir_converter import cli
+
+
+@pytest.fixture(autouse=True)
+def restore_signals():
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+    yield
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+@pytest.fixture
+def run(tmp_path, inputs):
+    source = tmp_path / "inputs.jsonl"
+    # every third input fails
+    records = [inputs["prescription"] if number % 3 else {"patient": None} for number in range(12)]
+    source.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    def run(name, *options, id_mode="deterministic"):
+        output = tmp_path / name
+        argv = [str(source), "--output", str(output), "--workers", "1", "--id-mode", id_mode, "--quiet",
+                "--checkpoint", str(tmp_path / f"{name}.checkpoint"), "--checkpoint-interval", "0", *options]
+        return cli.main(argv), output
+
+    return run
+
+
+def lines(path):
+    with gzip.open(path, "rb") as fp:
+        return fp.read().splitlines()
+
+
+def interrupt_fifth_write(monkeypatch, action):
+    write = cli.NdjsonWriter.write
+    calls = []
+
+    def half_write(self, index, name, data):
+        calls.append(index)
+        if len(calls) != 5:
+            return write(self, index, name, data)
+        self._sink.write(data[:len(data) // 2])
+        action()
+        self._sink.write(data[len(data) // 2:])
+        self._sink.write(b"\n")
+
+    monkeypatch.setattr(cli.NdjsonWriter, "write", half_write)
+
+
+def test_sigterm_during_a_write_is_deferred(run, monkeypatch):
+    status, expected = run("expected.ndjson.gz")
+    assert status == 1
+
+    interrupt_fifth_write(monkeypatch, lambda: os.kill(os.getpid(), signal.SIGTERM))
+    with pytest.raises(SystemExit) as exited:
+        run("out.ndjson.gz")
+    assert exited.value.code == 143
+    monkeypatch.undo()
+
+    status, output = run("out.ndjson.gz", "--resume")
+    assert status == 1
+    assert lines(output) == lines(expected)
+
+
+def test_failed_write_keeps_the_previous_checkpoint(run, monkeypatch):
+    status, expected = run("expected.ndjson.gz")
+
+    def fail():
+        raise OSError("disk full")
+
+    interrupt_fifth_write(monkeypatch, fail)
+    with pytest.raises(OSError):
+        run("out.ndjson.gz")
+    monkeypatch.undo()
+
+    status, output = run("out.ndjson.gz", "--resume")
+    assert status == 1
+    assert lines(output) == lines(expected)
+
+
+def test_resume_truncates_errors_reported_after_the_checkpoint(run, tmp_path, monkeypatch):
+    status, expected = run("expected.ndjson.gz", "--errors", str(tmp_path / "expected.errors"))
+    expected_errors = (tmp_path / "expected.errors").read_text().splitlines()
+    assert status == 1 and len(expected_errors) == 4
+
+    # the run is killed after the checkpoint taken at the sixth input, the later records are on disk already
+    write_checkpoint = cli.write_checkpoint
+    saved = {}
+
+    def keep_sixth(path, state):
+        if state["completed"] == 6 and not saved:
+            saved.update(json.loads(json.dumps(state)))
+        write_checkpoint(path, state)
+
+    monkeypatch.setattr(cli, "write_checkpoint", keep_sixth)
+    run("out.ndjson.gz", "--errors", str(tmp_path / "out.errors"))
+    monkeypatch.undo()
+    write_checkpoint(str(tmp_path / "out.ndjson.gz.checkpoint"), saved)
+
+    status, output = run("out.ndjson.gz", "--errors", str(tmp_path / "out.errors"), "--resume")
+    assert status == 1
+    assert (tmp_path / "out.errors").read_text().splitlines() == expected_errors
+    assert lines(output) == lines(expected)
+
+
+@pytest.mark.parametrize("options, id_mode", [((), "random"), (("--pretty",), "deterministic")])
+def test_resume_refuses_another_id_mode_or_format(run, options, id_mode):
+    status, _ = run("out.ndjson.gz")
+    assert status == 1
+    status, _ = run("out.ndjson.gz", "--resume", *options, id_mode=id_mode)
+    assert status == 2
@@ -0,0 +1,38 @@
+from fhir_converter.columnar import is_columnar, parse_numbers
+from fhir_converter.registry import get_bundle_builder
+
+
+def observation_values(bundle):
+    return [entry.resource.valueQuantity.value for entry in bundle.entry
+            if entry.resource.resource_type == "Observation"]
+
+
+def test_generator_of_rows_is_not_columnar(inputs):
+    rows = inputs["diagnostic_report"]["observations"]
+    assert not is_columnar(row for row in rows)
+    assert is_columnar({"observation_name": []})
+
+    build = get_bundle_builder("diagnostic_report")
+    expected = build(inputs["diagnostic_report"])
+    inputs["diagnostic_report"]["observations"] = (row for row in rows)
+    bundle = build(inputs["diagnostic_report"])
+    assert len(bundle.entry) == len(expected.entry)
+    assert observation_values(bundle) == observation_values(expected) == [row["observation_value"] for row in rows]
+
+
+def test_parse_numbers():
+    assert parse_numbers(["1", "-20", "+3"]) == [1, -20, 3]
+    assert parse_numbers(["1_000", "2"]) == ["1_000", 2]
+    assert parse_numbers([" 12", "12 ", "12"]) == [" 12", "12 ", 12]
+    assert parse_numbers(["1.5", ".5", "1e3", "", "  ", "nan", "high"]) == [1.5, 0.5, 1000.0, None, None, "nan", "high"]
+    assert parse_numbers([1, 2.5, float("nan"), None]) == [1, 2.5, None, None]
+
+
+def test_columnar_observations(inputs):
+    inputs["diagnostic_report"]["observations"] = {
+        "observation_name": ["Glucose", "ALT", "Note"],
+        "observation_value": ["120", "1_000", "7.5"],
+        "observation_unit": ["mg/dL", "U/L", "U/L"],
+    }
+    bundle = get_bundle_builder("diagnostic_report")(inputs["diagnostic_report"])
+    assert observation_values(bundle) == [120, "1_000", 7.5]
@@ -0,0 +1,57 @@
+import json
+import uuid
+
+import pytest
+
+from fhir_converter import ids
+from fhir_converter.batch import convert_batch
+from fhir_converter.registry import get_converter
+
+
+@pytest.fixture
+def counter_mode():
+    ids.set_id_mode("counter", prefix="nightly")
+    yield
+    ids.set_id_mode("random")
+
+
+def resource_ids(bundle):
+    return [entry["resource"]["id"] for entry in json.loads(bundle)["entry"]]
+
+
+def full_urls(bundle):
+    return [entry["fullUrl"] for entry in json.loads(bundle)["entry"]]
+
+
+def test_counter_ids_unique_across_batch_workers(inputs, counter_mode):
+    records = [inputs["prescription"]] * 80
+    results = list(convert_batch(records, "prescription", workers=4, chunksize=4))
+    assert all(result.error is None for result in results)
+
+    all_ids = [resource_id for result in results for resource_id in resource_ids(result.output)]
+    assert len(all_ids) == len(set(all_ids))
+    # the high bits tell the workers apart
+    assert len({resource_id[:24] for resource_id in all_ids}) > 1
+    for result in results:
+        for url in full_urls(result.output):
+            assert url.startswith("urn:uuid:")
+            assert str(uuid.UUID(url[len("urn:uuid:"):])) == url[len("urn:uuid:"):]
+
+
+def test_counter_ids_in_process(inputs):
+    with ids.id_mode("counter", prefix="run"):
+        with ids.id_scope("prescription", inputs["prescription"]):
+            first, second = ids.new_id(), ids.new_id()
+    assert uuid.UUID(first) and uuid.UUID(second)
+    assert first[:24] == second[:24]
+    assert int(second[24:], 16) == int(first[24:], 16) + 1
+    with ids.id_mode("counter", prefix="other run"):
+        with ids.id_scope("prescription", inputs["prescription"]):
+            assert ids.new_id()[:24] != first[:24]
+
+
+def test_counter_mode_full_urls_are_uuids(inputs):
+    with ids.id_mode("counter"):
+        for document_type, input_json in inputs.items():
+            for url in full_urls(get_converter(document_type)(input_json)):
+                assert str(uuid.UUID(url[len("urn:uuid:"):])) == url[len("urn:uuid:"):]
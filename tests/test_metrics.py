@@ -0,0 +1,69 @@
+import json
+import pickle
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fhir_converter import instrumentation
+from fhir_converter.metrics import MetricsRegistry
+from fhir_converter.registry import get_converter
+from fhir_converter.serve import make_server
+
+
+@pytest.fixture
+def server(request):
+    server = make_server(port=0, workers=getattr(request, "param", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if line and not line.startswith("#"))
+
+
+@pytest.mark.parametrize("server", [0, 2], indirect=True, ids=["in-process", "workers"])
+def test_metrics_count_conversions_and_errors_by_type(server, inputs):
+    assert post(f"{server}/convert/prescription", inputs["prescription"]) == 200
+    assert post(f"{server}/convert/prescription", {"patient": None}) == 422
+    with urllib.request.urlopen(f"{server}/metrics") as response:
+        text = response.read().decode("utf-8")
+
+    families = [line.split()[2] for line in text.splitlines() if line.startswith("# TYPE ")]
+    assert len(families) == len(set(families))
+    values = samples(text)
+    assert values['fhir_converter_conversions_total{document_type="prescription"}'] == "2"
+    assert values['fhir_converter_conversion_duration_seconds_count{document_type="prescription"}'] == "2"
+    errors = {name: value for name, value in values.items() if name.startswith("fhir_converter_conversion_errors_total{")}
+    [(name, value)] = errors.items()
+    assert 'document_type="prescription"' in name and 'exception_type="' in name and value == "1"
+
+
+def test_registry_merges_counters_of_other_processes(inputs):
+    worker, registry = MetricsRegistry(), MetricsRegistry()
+    with instrumentation.instrument() as records:
+        get_converter("prescription")(inputs["prescription"])
+        with pytest.raises(Exception):
+            get_converter("prescription")({"patient": None})
+    for record in records:
+        worker.observe(record)
+    registry.observe(records[0])
+    registry.merge(pickle.loads(pickle.dumps(worker.snapshot())))
+
+    values = samples(registry.exposition())
+    assert values['fhir_converter_conversions_total{document_type="prescription"}'] == "3"
+    error_type = records[1].error_type
+    name = f'fhir_converter_conversion_errors_total{{document_type="prescription",exception_type="{error_type}"}}'
+    assert values[name] == "1"
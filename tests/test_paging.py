@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from benchmarks.samples import with_imaging
+from fhir_converter.integrity import check_bundle
+from fhir_converter.packing import _references
+from fhir_converter.paging import PageSizeError, paginate
+
+
+@pytest.fixture
+def documents(inputs):
+    """Mixed imaging and non-imaging reports and prescriptions of one patient and practitioner."""
+    patient = inputs["diagnostic_report"]["patient"]
+    practitioner = inputs["diagnostic_report"]["practitioner"]
+    documents = []
+    for number in range(24):
+        if number % 3 == 0:
+            input_json = with_imaging(2000 + 1500 * (number % 4))
+            document_type = "diagnostic_report"
+        elif number % 3 == 1:
+            input_json = dict(inputs["diagnostic_report"])
+            del input_json["imaging"]
+            document_type = "diagnostic_report"
+        else:
+            input_json = dict(inputs["prescription"])
+            document_type = "prescription"
+        input_json["patient"] = dict(patient)
+        input_json["practitioner"] = dict(practitioner)
+        documents.append((document_type, input_json))
+    return documents
+
+
+def test_pages_stay_within_budget_and_cover_every_document(documents):
+    pages = list(paginate(documents, max_bytes=16 * 1024))
+    assert len(pages) > 1
+    assert all(len(page.data) <= 16 * 1024 for page in pages)
+    assert [position for page in pages for position in page.documents] == list(range(len(documents)))
+    for page in pages:
+        bundle = json.loads(page.data)
+        assert len(bundle["entry"]) == page.entries
+        assert bundle["type"] == "collection"
+
+
+def test_compositions_stay_with_their_entries(documents):
+    for page in paginate(documents, max_bytes=12 * 1024):
+        bundle = json.loads(page.data)
+        assert check_bundle(bundle) == []
+        urls = {entry["fullUrl"] for entry in bundle["entry"]}
+        compositions = [entry["resource"] for entry in bundle["entry"]
+                        if entry["resource"]["resourceType"] == "Composition"]
+        assert len(compositions) == len(page.documents)
+        for composition in compositions:
+            references = [holder["reference"] for holder in _references(composition)]
+            assert references and all(reference in urls for reference in references)
+
+
+def test_shared_participants_once_per_page(documents):
+    pages = list(paginate(documents, max_bytes=16 * 1024))
+    patients = set()
+    for page in pages:
+        entries = json.loads(page.data)["entry"]
+        urls = [entry["fullUrl"] for entry in entries]
+        assert len(urls) == len(set(urls))
+        page_patients = [entry for entry in entries if entry["resource"]["resourceType"] == "Patient"]
+        assert len(page_patients) == 1
+        patients.add(json.dumps(page_patients[0], sort_keys=True))
+    # one Patient resource for all documents, repeated on every page
+    assert len(patients) == 1
+
+
+def test_imaging_larger_than_the_budget(documents):
+    documents.insert(3, ("diagnostic_report", with_imaging(64 * 1024)))
+    with pytest.raises(PageSizeError) as raised:
+        list(paginate(documents, max_bytes=16 * 1024))
+    assert raised.value.document == 3
+    assert raised.value.size > 16 * 1024
+
+    pages = list(paginate(documents, max_bytes=16 * 1024, strict=False))
+    oversized = [page for page in pages if len(page.data) > 16 * 1024]
+    assert [page.documents for page in oversized] == [[3]]
+    assert [position for page in pages for position in page.documents] == list(range(len(documents)))
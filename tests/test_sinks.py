@@ -0,0 +1,18 @@
+import gzip
+import io
+
+from fhir_converter.sinks import open_sink
+
+
+def compressed(level):
+    buffer = io.BytesIO()
+    with open_sink(buffer, "gzip", level) as sink:
+        sink.write(b'{"resourceType": "Bundle"}' * 200)
+        sink.end_frame()
+        return buffer.getvalue()
+
+
+def test_gzip_level_zero_stores():
+    stored, default = compressed(0), compressed(None)
+    assert gzip.decompress(stored) == gzip.decompress(default)
+    assert len(stored) > 200 * len(b'{"resourceType": "Bundle"}') > len(default)
@@ -0,0 +1,45 @@
+from fhir_converter import ids, templates
+from fhir_converter.registry import get_bundle_builder
+
+
+def test_fragments_are_copies():
+    meta = templates.profile_meta("Patient")
+    meta["profile"].append("changed")
+    identifier_type = templates.identifier_type("MR")
+    identifier_type["coding"][0]["code"] = "changed"
+    concept = templates.snomed_concept("Prescription record", "440545006", "Prescription record")
+    concept.coding.append(templates.snomed_coding("1", "other"))
+    concept.coding[0].code = "changed"
+
+    assert templates.profile_meta("Patient") == {"profile": [templates.PROFILE_BASE_URL + "Patient"]}
+    assert templates.identifier_type("MR")["coding"][0]["code"] == "MR"
+    fresh = templates.snomed_concept("Prescription record", "440545006", "Prescription record")
+    assert [coding.code for coding in fresh.coding] == ["440545006"]
+
+
+def test_editing_a_bundle_does_not_leak(inputs):
+    build = get_bundle_builder("prescription")
+    with ids.id_mode("deterministic"):
+        first = build(inputs["prescription"]).dict()
+        edited = build(inputs["prescription"])
+        for entry in edited.entry:
+            meta = entry.resource.meta
+            if meta is not None:
+                (meta["profile"] if isinstance(meta, dict) else meta.profile).append("https://example.org/extra")
+            concept = getattr(entry.resource, "type", None)
+            for coding in getattr(concept, "coding", None) or []:
+                coding.display = "changed"
+        again = build(inputs["prescription"]).dict()
+    assert again == first
+
+
+def test_editing_an_encounter_class_does_not_leak(inputs):
+    build = get_bundle_builder("op_consult")
+    with ids.id_mode("deterministic"):
+        first = build(inputs["op_consult"]).dict()
+        edited = build(inputs["op_consult"])
+        [encounter] = [entry.resource for entry in edited.entry if entry.resource.resource_type == "Encounter"]
+        encounter.class_fhir.code = "AMB"
+        encounter.class_fhir.display = "ambulatory"
+        again = build(inputs["op_consult"]).dict()
+    assert again == first
@@ -0,0 +1,124 @@
+import base64
+import hashlib
+import hmac
+import json
+import pathlib
+import threading
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey  # noqa: E402
+
+from fhir_converter import transfer  # noqa: E402
+from fhir_converter.transfer import (  # noqa: E402
+    KeyMaterial, ReceiverServer, TransferSession, data_push_body, encrypt_entries, load_public_key, push,
+    shared_secret,
+)
+
+vector = json.loads((pathlib.Path(__file__).parent / "vectors" / "abdm_transfer.json").read_text())
+
+# RFC 7748 section 6.1
+alice = bytes.fromhex("77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a")
+bob_public = bytes.fromhex("de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f")
+rfc_shared = bytes.fromhex("4a5d9d5ba4ce2de1728e3bf480350f25e07e21c947d19e3376f09b3c1e161742")
+
+
+def clamped(private_key: bytes) -> bytes:
+    scalar = int.from_bytes(private_key, "little") & ~7 & ~(1 << 255) | 1 << 254
+    return scalar.to_bytes(32, "big")
+
+
+def weierstrass_x(u: bytes) -> int:
+    return (int.from_bytes(u, "little") + transfer._U_OFFSET) % transfer._P
+
+
+def test_curve_parameters():
+    assert transfer._A == 0x2AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA984914A144
+    assert transfer._B == 0x7B425ED097B425ED097B425ED097B425ED097B425ED097B4260B5E9C7710C864
+    assert transfer._G[0] == 0x2AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAD245A
+    assert transfer._on_curve(transfer._G)
+    assert transfer._multiply(transfer._N, transfer._G) is None
+
+
+def test_rfc7748_known_answer():
+    requester = KeyMaterial.from_private_key(clamped(alice), bytes(32))
+    # Bob's public u-coordinate as a Weierstrass x, either y gives the same x of the product
+    x = weierstrass_x(bob_public)
+    y = pow((x ** 3 + transfer._A * x + transfer._B) % transfer._P, (transfer._P + 3) // 8, transfer._P)
+    if (y * y - (x ** 3 + transfer._A * x + transfer._B)) % transfer._P:
+        y = y * pow(2, (transfer._P - 1) // 4, transfer._P) % transfer._P
+    secret = shared_secret(requester.private_key, (x, y))
+    assert int.from_bytes(secret, "big") == weierstrass_x(rfc_shared)
+
+
+def test_agrees_with_x25519_for_clamped_scalars():
+    for _ in range(5):
+        first, second = X25519PrivateKey.generate(), X25519PrivateKey.generate()
+        expected = first.exchange(second.public_key())
+        raw = [key.private_bytes_raw() for key in (first, second)]
+        own = KeyMaterial.from_private_key(clamped(raw[0]), bytes(32))
+        peer = KeyMaterial.from_private_key(clamped(raw[1]), bytes(32))
+        secret = shared_secret(own.private_key, load_public_key(peer.public_key))
+        assert int.from_bytes(secret, "big") == weierstrass_x(expected)
+
+
+def test_vector_decrypts():
+    requester = KeyMaterial.from_private_key(vector["requesterPrivateKey"], vector["requesterNonce"])
+    assert requester.public_key_value("raw") == vector["requesterPublicKey"]
+    assert requester.public_key_value() == vector["requesterX509PublicKey"]
+    for sender_key in (vector["senderX509PublicKey"], vector["senderPublicKey"]):
+        session = TransferSession(requester, sender_key, vector["senderNonce"])
+        plain = session.decrypt(vector["encryptedData"])
+        assert plain.decode("utf-8") == vector["stringToEncrypt"]
+        assert transfer.checksum(plain) == vector["checksum"]
+
+
+def test_vector_encrypts():
+    sender = KeyMaterial.from_private_key(vector["senderPrivateKey"], vector["senderNonce"])
+    session = TransferSession(sender, vector["requesterX509PublicKey"], vector["requesterNonce"])
+    assert session.key.hex() == vector["aesKey"]
+    assert session.iv.hex() == vector["iv"]
+    assert session.encrypt(vector["stringToEncrypt"].encode("utf-8")) == vector["encryptedData"]
+
+    # HKDF-SHA256 (RFC 5869) by hand, empty info, salted with the first 20 bytes of the nonce XOR
+    mixed = bytes(a ^ b for a, b in zip(base64.b64decode(vector["senderNonce"]),
+                                       base64.b64decode(vector["requesterNonce"])))
+    prk = hmac.new(mixed[:20], bytes.fromhex(vector["sharedSecret"]), hashlib.sha256).digest()
+    assert hmac.new(prk, b"\x01", hashlib.sha256).digest().hex() == vector["aesKey"]
+    assert mixed[-12:].hex() == vector["iv"]
+
+
+def test_public_key_encodings():
+    key_material = KeyMaterial.generate()
+    x509 = base64.b64decode(key_material.public_key_value())
+    assert len(x509) == 309 and x509.endswith(key_material.public_key)
+    assert key_material.public_key_value().startswith("MIIBMTCB6gYHKoZIzj0CATCB3gIBATAr")
+    assert load_public_key(x509) == load_public_key(key_material.public_key)
+    broken = bytearray(key_material.public_key)
+    broken[-1] ^= 1
+    with pytest.raises(ValueError):
+        load_public_key(bytes(broken))
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_push_round_trip(processes):
+    server = ReceiverServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        key_material = server.receiver.request_key_material()
+        session = TransferSession.create(key_material["dhPublicKey"]["keyValue"], key_material["nonce"])
+        bundles = [json.dumps({"resourceType": "Bundle", "id": str(number)}).encode() for number in range(20)]
+        entries = encrypt_entries(session, bundles, [f"cc-{number}" for number in range(20)], workers=2,
+                                  chunksize=3, processes=processes)
+        assert push(server.url, data_push_body(session, entries, "transaction-1")) == 202
+        assert server.received == [("transaction-1", bundles)]
+
+        entries[3]["checksum"] = "0" * 32
+        with pytest.raises(Exception) as raised:
+            push(server.url, data_push_body(session, entries, "transaction-2"))
+        assert getattr(raised.value, "code", None) == 400
+    finally:
+        server.shutdown()
+        server.server_close()
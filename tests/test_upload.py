@@ -0,0 +1,158 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from benchmarks.bench_packing import patient_documents
+from fhir_converter.packing import pack_documents
+from fhir_converter.upload import FhirClient, transaction_batches
+
+
+@pytest.fixture(scope="module")
+def bundles():
+    """Converter outputs of one patient and practitioner, one bundle per document."""
+    # op_consult bundles list their sections as entries without a resourceType, those never upload
+    documents = [document for document in patient_documents(8) if document[0] != "op_consult"]
+    return pack_documents(documents, combined=False, output="bytes")
+
+
+def test_transactions_keep_documents_whole_and_send_participants_once(bundles):
+    transactions = list(transaction_batches(bundles, max_entries=20))
+    assert len(transactions) > 1
+    documents = [document for transaction in transactions for document, _, _ in transaction.entries]
+    assert sorted(set(documents)) == list(range(len(bundles)))
+    for transaction in transactions:
+        body = json.loads(transaction.body)
+        urls = [entry["fullUrl"] for entry in body["entry"]]
+        assert len(urls) <= 20
+        assert len(urls) == len(set(urls))
+        assert [url for _, url, _ in transaction.entries] == urls
+        # every reference resolves inside the transaction
+        referenced = {value for value in json.dumps(body).split('"') if value.startswith("urn:uuid:")}
+        assert referenced <= set(urls)
+    # a document spans one transaction only
+    spans = {}
+    for number, transaction in enumerate(transactions):
+        for document, _, _ in transaction.entries:
+            spans.setdefault(document, set()).add(number)
+    assert all(len(numbers) == 1 for numbers in spans.values())
+
+
+def test_put_transactions_address_resources_by_id(bundles):
+    transaction = next(transaction_batches(bundles[:1], method="PUT"))
+    assert transaction.method == "PUT"
+    for entry in json.loads(transaction.body)["entry"]:
+        assert entry["request"] == {"method": "PUT",
+                                    "url": f"{entry['resource']['resourceType']}/{entry['resource']['id']}"}
+
+
+def test_upload_reports_every_entry(bundles, fhir_server):
+    server = fhir_server()
+    malformed = b'{"resourceType": "Bundle", "entry": [{"fullUrl": "urn:uuid:x", "resource": {}}]}'
+    with FhirClient(server.url, max_connections=2) as client:
+        outcomes = list(client.upload(bundles + [malformed], max_entries=20))
+    ok = [outcome for outcome in outcomes if outcome.ok]
+    assert len(ok) == len(server.resources)
+    assert {outcome.location.rsplit("/_history", 1)[0] for outcome in ok} == set(server.resources)
+    assert all(outcome.status == 201 for outcome in ok)
+    assert sorted({outcome.document for outcome in ok}) == list(range(len(bundles)))
+    [failed] = [outcome for outcome in outcomes if not outcome.ok]
+    assert (failed.document, failed.full_url, failed.status, failed.error) == \
+        (len(bundles), "urn:uuid:x", 0, "entry has no resourceType")
+    assert "urn:uuid:" not in json.dumps(server.resources)
+
+
+def test_rejected_transaction_fails_as_a_whole(bundles, fhir_server):
+    server = fhir_server(reject_types={"MedicationRequest"})
+    with FhirClient(server.url, retries=0) as client:
+        outcomes = list(client.upload(bundles, max_entries=20))
+    rejected = [outcome for outcome in outcomes if not outcome.ok]
+    assert rejected and len(rejected) < len(outcomes)
+    assert all(outcome.status == 422 and outcome.error == "MedicationRequest is not accepted" for outcome in rejected)
+    # the documents of a rejected transaction have no applied entries
+    assert not {outcome.document for outcome in rejected} & {outcome.document for outcome in outcomes if outcome.ok}
+    assert len(server.resources) == len(outcomes) - len(rejected)
+    assert server.requests == len(list(transaction_batches(bundles, max_entries=20)))
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_unapplied_transactions_are_retried(bundles, fhir_server, status):
+    server = fhir_server(fail_requests=2, fail_status=status)
+    with FhirClient(server.url, max_connections=1, backoff=0) as client:
+        outcomes = list(client.upload(bundles[:2]))
+    assert all(outcome.ok for outcome in outcomes)
+    assert server.requests == 3
+    assert server.transactions == 1
+
+
+def test_applied_post_transaction_is_not_retried(bundles, fhir_server):
+    server = fhir_server(lose_responses=1)
+    with FhirClient(server.url, backoff=0) as client:
+        outcomes = list(client.upload(bundles[:2]))
+    assert all(outcome.status == 502 and not outcome.ok for outcome in outcomes)
+    assert server.requests == 1
+    assert len(server.resources) == len(outcomes)
+
+
+def test_applied_put_transaction_is_retried_without_duplicates(bundles, fhir_server):
+    server = fhir_server(lose_responses=1)
+    with FhirClient(server.url, backoff=0) as client:
+        outcomes = list(client.upload(bundles[:2], method="PUT"))
+    assert all(outcome.ok and outcome.status == 200 for outcome in outcomes)
+    assert server.requests == 2
+    assert len(server.resources) == len(outcomes)
+    assert {outcome.location.rsplit("/_history", 1)[0] for outcome in outcomes} == set(server.resources)
+
+
+def test_connections_closed_while_idle_are_reopened(bundles, fhir_server):
+    server = fhir_server(idle_timeout=0.05)
+    with FhirClient(server.url, max_connections=1, retries=0) as client:
+        assert all(outcome.ok for outcome in client.upload(bundles[:1]))
+        time.sleep(0.3)
+        assert all(outcome.ok for outcome in client.upload(bundles[1:2]))
+    assert server.requests == client.requests == 2
+
+
+def test_connection_errors_before_sending_are_retried(bundles):
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    with FhirClient(f"http://127.0.0.1:{port}/fhir", retries=2, backoff=0) as client:
+        outcomes = list(client.upload(bundles[:1]))
+    assert all(outcome.status == 0 and "ConnectionRefusedError" in outcome.error for outcome in outcomes)
+    assert client.requests == 3
+
+
+@pytest.fixture
+def hanging_up():
+    """URL of a server that reads each request and closes the connection without answering."""
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            with connection:
+                data = b""
+                while b"\r\n\r\n" not in data:
+                    data += connection.recv(65536)
+                head, _, body = data.partition(b"\r\n\r\n")
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                while len(body) < length:
+                    body += connection.recv(65536)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}/fhir"
+    listener.close()
+
+
+@pytest.mark.parametrize("method, requests", [("POST", 1), ("PUT", 3)])
+def test_connection_errors_after_sending_retry_put_only(bundles, hanging_up, method, requests):
+    with FhirClient(hanging_up, retries=2, backoff=0) as client:
+        outcomes = list(client.upload(bundles[:1], method=method))
+    assert all(outcome.status == 0 and outcome.error for outcome in outcomes)
+    assert client.requests == requests
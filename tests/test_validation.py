@@ -0,0 +1,26 @@
+import json
+
+from fhir_converter.registry import get_converter
+from fhir_converter.validation import bundle_document_type, model_classes, validate_bundle
+
+
+def test_diagnostic_report_entries_use_their_model_family(inputs):
+    output = get_converter("diagnostic_report")(inputs["diagnostic_report"])
+    errors = validate_bundle(output)
+    assert not [error for error in errors if "LookupError" in error]
+    assert errors == validate_bundle(output, "diagnostic_report")
+    assert model_classes("diagnostic_report")["Media"].__module__ == "fhir.resources.R4B.media"
+    assert model_classes("discharge_summary")["ServiceRequest"].__module__ == "fhir.resources.servicerequest"
+
+
+def test_entry_errors_are_reported(inputs):
+    bundle = json.loads(get_converter("diagnostic_report")(inputs["diagnostic_report"]))
+    assert bundle_document_type(bundle) == "diagnostic_report"
+    position, media = next((position, entry["resource"]) for position, entry in enumerate(bundle["entry"])
+                           if entry["resource"]["resourceType"] == "Media")
+    baseline = set(validate_bundle(bundle))
+    media["content"] = "not an attachment"
+    media["unknownField"] = True
+    new = set(validate_bundle(bundle)) - baseline
+    assert f"entry.{position}.resource.unknownField: extra fields not permitted" in new
+    assert any(error.startswith(f"entry.{position}.resource.content") for error in new)